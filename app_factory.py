@@ -0,0 +1,537 @@
+"""
+Builds the webhook server.
+
+main.py, main_port80.py and main_port8080.py only pass their port, log file
+and worker model to create_app(), so every entry point (gunicorn, the batch
+scripts, the Windows service) runs the same parsing, filtering and delivery
+pipeline.
+"""
+
+import atexit
+import datetime
+import hmac
+import json
+import logging
+import signal
+import sys
+import threading
+from flask import Flask, Response, request, jsonify
+from google_sheets import (
+    append_row_to_sheet, append_rows_to_sheet, build_row, circuit_breaker, get_cache_stats, get_guard_state,
+    probe_sheets, rate_limiter
+)
+from slack_notify import digest as slack_digest, probe_slack, send_slack_alert
+from slack_templates import templates as slack_templates
+from filter_rules import engine as filter_engine
+from logging_setup import configure_logging
+from idempotency import IdempotencyCache
+from webhook_intake import admit_call, settle_call
+from delivery_queue import DeliveryQueue
+from sheet_batcher import BatchWriter
+from spool import CallSpool, SPOOL_SUPPORTED
+from sheet_router import route_call, router as sheet_router
+from archiver import SheetArchiver
+from health_probe import DependencyProber
+from graceful import GracefulShutdown
+from call_store import CallStore, GRANULARITIES
+from profiling import SampledProfiler, SlowRequestTracer
+from metrics import CONTENT_TYPE, Gauge, render_metrics, stage_duration, webhook_duration, webhook_requests
+from config import (
+    RINGBA_FILTERS, GOOGLE_SHEET_ID, FLASK_DEBUG, HOST, PORT, WORKER_MODEL,
+    DELIVERY_QUEUE_PATH, DELIVERY_WORKERS, DELIVERY_MAX_ATTEMPTS, DELIVERY_BACKOFF_SECONDS,
+    SHEETS_BATCH_ENABLED, SHEETS_BATCH_MAX_ROWS, SHEETS_BATCH_MAX_WAIT_MS, SHEETS_BATCH_MAX_PARALLEL, LOG_FILE,
+    SPOOL_ENABLED, SPOOL_DIR, SPOOL_SEGMENT_MAX_BYTES, SPOOL_REPLAY_BATCH, SPOOL_RETRY_SECONDS,
+    ARCHIVE_INTERVAL_SECONDS, ARCHIVE_TABS, READY_PROBE_INTERVAL_SECONDS, READY_REQUIRED_PROBES, SHUTDOWN_DRAIN_SECONDS,
+    IDEMPOTENCY_ENABLED, IDEMPOTENCY_MAX_ENTRIES, IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_DB_PATH,
+    CALL_STORE_ENABLED, CALL_STORE_PATH, CALL_STORE_RETENTION_DAYS,
+    SLOW_REQUEST_MS, SLOW_REQUEST_BUFFER, ADMIN_TOKEN, PROFILE_SIGNAL_ENABLED, PROFILE_SECONDS
+)
+
+WORKER_MODELS = ("sync", "threaded", "async")
+
+# Settings create_app() understands; entry points override what differs
+DEFAULT_CONFIG = {
+    "SERVICE_NAME": "Ringba Webhook Handler",
+    "SERVER_LABEL": "render",
+    "WORKER_MODEL": WORKER_MODEL,
+    "HOST": HOST,
+    "PORT": PORT,
+    "LOG_FILE": LOG_FILE,
+    "DEBUG": FLASK_DEBUG,
+}
+
+# Default /stats window per granularity
+STATS_DEFAULT_WINDOW = {"minute": datetime.timedelta(hours=1), "hour": datetime.timedelta(days=1),
+                        "day": datetime.timedelta(days=30)}
+
+# Pipelines built in this process, drained by shutdown()
+_pipelines = []
+
+
+def _pipeline_gauge(read):
+    """Gauge callback reading from the most recently built pipeline, if any."""
+    def callback():
+        return read(_pipelines[-1]) if _pipelines else None
+    return callback
+
+
+# Registered once per process (not per create_app() call) so the exposition has no duplicate families
+Gauge("ringba_delivery_queue_depth", "Async delivery queue jobs by status", ["status"],
+      callback=_pipeline_gauge(lambda pipeline: pipeline.delivery_queue.depth() if pipeline.delivery_queue else None))
+Gauge("ringba_spool_pending_calls", "Spooled calls not yet confirmed by Google Sheets",
+      callback=_pipeline_gauge(lambda pipeline: pipeline.spool.snapshot()["outstanding"] if pipeline.spool else None))
+Gauge("ringba_sheets_circuit_state", "Sheets circuit breaker state (0 closed, 1 half-open, 2 open)",
+      callback=lambda: {"closed": 0, "half_open": 1, "open": 2}[circuit_breaker.state])
+Gauge("ringba_sheets_rate_limit_per_second", "Current adaptive Sheets request rate",
+      callback=lambda: rate_limiter.snapshot()["rate_per_second"])
+Gauge("ringba_sheet_batch_pending_rows", "Rows waiting for the next batched sheet write",
+      callback=_pipeline_gauge(
+          lambda pipeline: pipeline.sheet_writer.snapshot()["pending"] if pipeline.sheet_writer else None))
+Gauge("ringba_dependency_up", "Whether the last background probe of a dependency passed", ["dependency"],
+      callback=_pipeline_gauge(lambda pipeline: pipeline.dependency_prober.up()))
+
+
+class WebhookPipeline:
+    """The delivery components behind one app, started when it is built.
+
+    The worker model decides how qualifying calls reach Google Sheets:
+    "sync" and "threaded" deliver before answering (protected by the spool),
+    "async" queues the call durably, answers 202 and delivers from background
+    workers. Sheet writes are only micro-batched when requests can arrive
+    concurrently, since a single-threaded server has nothing to coalesce.
+    Components are started here rather than at import so that each gunicorn
+    worker process (which builds the app after forking) runs its own threads
+    and replays any jobs left pending by a previous run.
+    """
+
+    def __init__(self, worker_model):
+        self.worker_model = worker_model
+
+        self.sheet_writer = None
+        if SHEETS_BATCH_ENABLED and worker_model != "sync":
+            self.sheet_writer = BatchWriter(
+                max_rows=SHEETS_BATCH_MAX_ROWS,
+                max_wait_ms=SHEETS_BATCH_MAX_WAIT_MS,
+                max_parallel=SHEETS_BATCH_MAX_PARALLEL
+            )
+            self.sheet_writer.start()
+
+        self.delivery_queue = None
+        if worker_model == "async":
+            self.delivery_queue = DeliveryQueue(
+                DELIVERY_QUEUE_PATH,
+                self._deliver_queued_call,
+                workers=DELIVERY_WORKERS,
+                max_attempts=DELIVERY_MAX_ATTEMPTS,
+                backoff_seconds=DELIVERY_BACKOFF_SECONDS
+            )
+            self.delivery_queue.start()
+
+        self.spool = None
+        # The async queue is already durable; the spool protects the sync path
+        spool_enabled = SPOOL_ENABLED and self.delivery_queue is None
+        if spool_enabled and not SPOOL_SUPPORTED:
+            logging.warning("The call spool needs fcntl file locks; running without it on this platform, "
+                            "so calls Sheets rejects are answered with 500 for Ringba to retry")
+            spool_enabled = False
+        if spool_enabled:
+            self.spool = CallSpool(
+                SPOOL_DIR,
+                self._replay_spooled_calls,
+                segment_max_bytes=SPOOL_SEGMENT_MAX_BYTES,
+                replay_batch=SPOOL_REPLAY_BATCH,
+                retry_seconds=SPOOL_RETRY_SECONDS
+            )
+            self.spool.start()
+
+        self.archiver = None
+        if ARCHIVE_INTERVAL_SECONDS > 0:
+            self.archiver = SheetArchiver()
+            self.archiver.start(ARCHIVE_INTERVAL_SECONDS, [(GOOGLE_SHEET_ID, tab) for tab in ARCHIVE_TABS])
+
+        self.idempotency_cache = None
+        if IDEMPOTENCY_ENABLED:
+            self.idempotency_cache = IdempotencyCache(
+                max_entries=IDEMPOTENCY_MAX_ENTRIES,
+                ttl_seconds=IDEMPOTENCY_TTL_SECONDS,
+                path=IDEMPOTENCY_DB_PATH or None
+            )
+
+        self.call_store = None
+        if CALL_STORE_ENABLED:
+            self.call_store = CallStore(CALL_STORE_PATH, retention_days=CALL_STORE_RETENTION_DAYS)
+            self.call_store.start()
+
+        self.slow_tracer = None
+        if SLOW_REQUEST_MS > 0:
+            self.slow_tracer = SlowRequestTracer(SLOW_REQUEST_MS, SLOW_REQUEST_BUFFER)
+            stage_duration.add_listener(self.slow_tracer.record_stage)
+
+        # Idle until a capture is started from /admin/profile or SIGUSR2
+        self.profiler = SampledProfiler()
+
+        # Probes run on their own schedule so load-balancer pings of /ready cost no API quota
+        self.dependency_prober = DependencyProber(
+            {"google_sheets": probe_sheets, "slack": probe_slack},
+            interval_seconds=READY_PROBE_INTERVAL_SECONDS,
+            required=READY_REQUIRED_PROBES
+        )
+        self.dependency_prober.start()
+
+        # Drain order matters: queue workers feed the batch writer, and every delivery
+        # path may still add alerts to the Slack digest
+        self.graceful = GracefulShutdown(SHUTDOWN_DRAIN_SECONDS)
+        self.graceful.add_step("dependency_prober", lambda timeout: self.dependency_prober.stop(timeout=0))
+        if self.archiver is not None:
+            self.graceful.add_step("archiver", self.archiver.stop)
+        if self.delivery_queue is not None:
+            self.graceful.add_step("delivery_queue", self.delivery_queue.drain)
+        if self.sheet_writer is not None:
+            self.graceful.add_step("sheet_batches", self.sheet_writer.stop)
+        if self.spool is not None:
+            self.graceful.add_step("spool", self.spool.stop)
+        if slack_digest is not None:
+            self.graceful.add_step("slack_digest", lambda timeout: slack_digest.flush())
+        if self.call_store is not None:
+            self.graceful.add_step("call_store", self.call_store.stop)
+        # gunicorn.conf.py calls shutdown() from its worker_exit hook; this covers other servers
+        atexit.register(self.graceful.run)
+
+    def deliver_call(self, time_of_call, caller_id, call_type, campaign_name):
+        """Write the call to Google Sheets and notify Slack.
+
+        Returns False only when the sheet write fails; a failed Slack post is
+        logged but does not fail the delivery (retrying would duplicate the row).
+        """
+        # Append to the call's sheet shard, coalescing with concurrent deliveries when batching is on
+        sheet_id, tab = route_call(campaign_name, call_type, time_of_call)
+        with stage_duration.time("sheets_append"):
+            if self.sheet_writer is not None:
+                sheet_success = self.sheet_writer.append(time_of_call, caller_id, call_type, sheet_id=sheet_id,
+                                                         tab=tab)
+            else:
+                sheet_success = append_row_to_sheet(time_of_call, caller_id, call_type, sheet_id=sheet_id, tab=tab)
+        if not sheet_success:
+            webhook_requests.inc("sheet_fail")
+            logging.error("Failed to append to Google Sheet")
+            return False
+
+        # Send Slack notification
+        sheet_link = f"https://docs.google.com/spreadsheets/d/{sheet_id}"
+        with stage_duration.time("slack_post"):
+            slack_success = send_slack_alert(caller_id, time_of_call, sheet_link, campaign_name, call_type)
+        if not slack_success:
+            webhook_requests.inc("slack_fail")
+            logging.error("Failed to send Slack notification")
+
+        webhook_requests.inc("processed")
+        logging.info("Successfully processed %s from %s", call_type, caller_id, extra={"outcome": "processed"})
+        return True
+
+    def _deliver_queued_call(self, payload):
+        return self.deliver_call(payload["time_of_call"], payload["caller_id"], payload["call_type"],
+                                 payload["campaign_name"])
+
+    def _replay_spooled_calls(self, calls):
+        """Write spooled calls with one bulk update per sheet shard, then alert Slack for each written call.
+
+        Returns one success flag per call so a failing shard does not make the
+        spool re-send rows that other shards already accepted.
+        """
+        shards = {}
+        for index, call in enumerate(calls):
+            shard = route_call(call["campaign_name"], call["call_type"], call["time_of_call"])
+            shards.setdefault(shard, []).append(index)
+        results = [False] * len(calls)
+        for (sheet_id, tab), indexes in shards.items():
+            rows = [build_row(calls[i]["time_of_call"], calls[i]["caller_id"], calls[i]["call_type"]) for i in indexes]
+            with stage_duration.time("spool_replay"):
+                if not append_rows_to_sheet(rows, sheet_id, tab):
+                    continue
+            sheet_link = f"https://docs.google.com/spreadsheets/d/{sheet_id}"
+            for i in indexes:
+                results[i] = True
+                call = calls[i]
+                if not send_slack_alert(call["caller_id"], call["time_of_call"], sheet_link,
+                                        call["campaign_name"], call["call_type"]):
+                    logging.error("Failed to send Slack notification for replayed call from %s", call["caller_id"])
+        return results
+
+    def handle_call(self, time_of_call, caller_id, call_type, campaign_name):
+        """Queue or deliver a call that passed the filter; returns (response body, status)."""
+        if self.delivery_queue is not None:
+            self.delivery_queue.enqueue({
+                "time_of_call": time_of_call,
+                "caller_id": caller_id,
+                "call_type": call_type,
+                "campaign_name": campaign_name
+            })
+            webhook_requests.inc("queued")
+            logging.info("Queued %s from %s for delivery", call_type, caller_id, extra={"outcome": "queued"})
+            return {
+                "caller_id": caller_id,
+                "call_type": call_type,
+                "status": "queued",
+                "time": time_of_call
+            }, 202
+
+        # Make the call durable before touching Sheets so a failure or restart cannot lose it
+        token = None
+        if self.spool is not None:
+            call = {
+                "time_of_call": time_of_call,
+                "caller_id": caller_id,
+                "call_type": call_type,
+                "campaign_name": campaign_name
+            }
+            with stage_duration.time("spool_append"):
+                token = self.spool.append(call)
+
+        try:
+            delivered = self.deliver_call(time_of_call, caller_id, call_type, campaign_name)
+        except Exception:
+            if token is None:
+                raise
+            logging.exception("Delivery of %s from %s raised", call_type, caller_id)
+            delivered = False
+
+        if not delivered:
+            if token is None:
+                return {"error": "Failed to update Google Sheet"}, 500
+            self.spool.defer(token, call)
+            webhook_requests.inc("spooled")
+            logging.warning("Spooled %s from %s for replay", call_type, caller_id, extra={"outcome": "spooled"})
+            return {
+                "caller_id": caller_id,
+                "call_type": call_type,
+                "status": "spooled",
+                "time": time_of_call
+            }, 202
+
+        if token is not None:
+            self.spool.ack(token)
+        return {
+            "caller_id": caller_id,
+            "call_type": call_type,
+            "status": "success",
+            "time": time_of_call
+        }, 200
+
+    def _log_profile(self):
+        logging.warning("Profile of this worker's requests:\n%s", self.profiler.report() or "No requests were profiled")
+        if self.slow_tracer is not None:
+            logging.warning("Slow requests: %s", json.dumps(self.slow_tracer.dump()))
+
+    def profile_on_signal(self, signum, frame):
+        if self.profiler.start(PROFILE_SECONDS):
+            timer = threading.Timer(PROFILE_SECONDS, self._log_profile)
+            timer.daemon = True
+            timer.start()
+
+    def snapshot(self):
+        return {
+            "worker_model": self.worker_model,
+            "ingest_mode": "async" if self.delivery_queue else "sync",
+            "delivery_queue": self.delivery_queue.depth() if self.delivery_queue else None,
+            "sheet_batches": self.sheet_writer.snapshot() if self.sheet_writer else None,
+            "spool": self.spool.snapshot() if self.spool else None,
+            "archiver": self.archiver.snapshot() if self.archiver else None,
+            "idempotency": self.idempotency_cache.snapshot() if self.idempotency_cache else None,
+            "dependencies": self.dependency_prober.snapshot(),
+            "shutdown": self.graceful.snapshot(),
+            "call_store": self.call_store.snapshot() if self.call_store else None,
+            "slow_requests": self.slow_tracer.snapshot() if self.slow_tracer else None,
+            "profiler": self.profiler.snapshot()
+        }
+
+
+def create_app(config=None):
+    """Build the Flask app and start its pipeline.
+
+    ``config`` overrides keys of DEFAULT_CONFIG (SERVICE_NAME, SERVER_LABEL,
+    WORKER_MODEL, HOST, PORT, LOG_FILE, DEBUG); everything else comes from
+    the environment through config.py. Logging, metrics and the Sheets and
+    Slack clients are per process, so build one app per process.
+    """
+    settings = dict(DEFAULT_CONFIG, **(config or {}))
+    if settings["WORKER_MODEL"] not in WORKER_MODELS:
+        raise ValueError(f"Unknown worker model {settings['WORKER_MODEL']!r}; use sync, threaded or async")
+
+    configure_logging(settings["LOG_FILE"])
+
+    app = Flask(__name__)
+    app.config.update(settings)
+    pipeline = WebhookPipeline(settings["WORKER_MODEL"])
+    app.extensions["ringba_webhook"] = pipeline
+    _pipelines.append(pipeline)
+
+    if PROFILE_SIGNAL_ENABLED and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGUSR2, pipeline.profile_on_signal)
+
+    _register_routes(app, pipeline)
+    return app
+
+
+def shutdown():
+    """Drain every pipeline built in this process; safe to call more than once."""
+    for pipeline in _pipelines:
+        pipeline.graceful.run()
+
+
+def run(app):
+    """Serve the app with Flask's built-in server on its HOST and PORT."""
+    threaded = app.config["WORKER_MODEL"] != "sync"
+    logging.info(f"Starting {app.config['SERVICE_NAME']} on {app.config['HOST']}:{app.config['PORT']}"
+                 f" ({app.config['WORKER_MODEL']} workers)")
+    # Exit normally on SIGTERM so the atexit drain runs
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    app.run(
+        host=app.config["HOST"],
+        port=app.config["PORT"],
+        debug=app.config["DEBUG"],
+        threaded=threaded
+    )
+
+
+def _register_routes(app, pipeline):
+    graceful = pipeline.graceful
+    call_store = pipeline.call_store
+    idempotency_cache = pipeline.idempotency_cache
+    slow_tracer = pipeline.slow_tracer
+    profiler = pipeline.profiler
+
+    @app.route("/", methods=["GET"])
+    def health_check():
+        health = {
+            "status": "healthy",
+            "service": app.config["SERVICE_NAME"],
+            "filters": RINGBA_FILTERS,
+            "filter_rules": filter_engine.summary(),
+            "slack_templates": slack_templates.summary(),
+            "server": app.config["SERVER_LABEL"],
+            "sheet_routing": sheet_router.summary(),
+            "sheets_client_cache": get_cache_stats(),
+            "sheets_guard": get_guard_state()
+        }
+        health.update(pipeline.snapshot())
+        return jsonify(health), 200
+
+    @app.route("/ready", methods=["GET"])
+    def readiness_check():
+        if graceful.draining:
+            return jsonify({"status": "draining"}), 503
+        body, status = pipeline.dependency_prober.response()
+        return Response(body, status=status, mimetype="application/json")
+
+    @app.route("/stats", methods=["GET"])
+    def stats():
+        """Call counts from the local store's rollups; ?granularity=minute|hour|day&since=&until=&campaign=&call_type="""
+        if call_store is None:
+            return jsonify({"error": "Call store is disabled"}), 404
+        granularity = request.args.get("granularity", "hour")
+        if granularity not in GRANULARITIES:
+            return jsonify({"error": "granularity must be minute, hour or day"}), 400
+        since = request.args.get("since")
+        if not since:
+            start = datetime.datetime.now(datetime.UTC) - STATS_DEFAULT_WINDOW[granularity]
+            since = start.strftime(GRANULARITIES[granularity])
+        until = request.args.get("until")
+        buckets = call_store.rollups(granularity, since, until, request.args.get("campaign"),
+                                     request.args.get("call_type"))
+        totals = {}
+        for row in buckets:
+            totals[row["outcome"]] = totals.get(row["outcome"], 0) + row["count"]
+        return jsonify({"granularity": granularity, "since": since, "until": until, "totals": totals,
+                        "buckets": buckets}), 200
+
+    def _admin_allowed():
+        token = request.headers.get("X-Admin-Token", "")
+        return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+    @app.route("/admin/slow-requests", methods=["GET"])
+    def slow_requests():
+        if not _admin_allowed():
+            return jsonify({"error": "Not found"}), 404
+        return jsonify({
+            "tracer": slow_tracer.snapshot() if slow_tracer else None,
+            "requests": slow_tracer.dump() if slow_tracer else []
+        }), 200
+
+    @app.route("/admin/profile", methods=["GET", "POST"])
+    def profile():
+        """POST starts a capture (?seconds=&sample_rate=); GET returns the report (?format=pstats for the raw stats)."""
+        if not _admin_allowed():
+            return jsonify({"error": "Not found"}), 404
+        if request.method == "POST":
+            try:
+                seconds = float(request.args.get("seconds", PROFILE_SECONDS))
+                sample_rate = float(request.args.get("sample_rate", 1.0))
+            except ValueError:
+                seconds = sample_rate = 0
+            if not 0 < seconds <= 3600 or not 0 < sample_rate <= 1:
+                return jsonify({"error": "seconds must be in (0, 3600] and sample_rate in (0, 1]"}), 400
+            if not profiler.start(seconds, sample_rate):
+                return jsonify({"error": "A capture is already running", "profiler": profiler.snapshot()}), 409
+            return jsonify({"profiler": profiler.snapshot()}), 202
+        if request.args.get("format") == "pstats":
+            data = profiler.dump()
+            if data is None:
+                return jsonify({"error": "No requests have been profiled"}), 404
+            return Response(data, mimetype="application/octet-stream",
+                            headers={"Content-Disposition": "attachment; filename=ringba-webhook.pstats"})
+        return jsonify({"profiler": profiler.snapshot(), "report": profiler.report()}), 200
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        return Response(render_metrics(), content_type=CONTENT_TYPE)
+
+    @app.route("/ringba-webhook", methods=["POST"])
+    def ringba_webhook():
+        if not graceful.begin():
+            webhook_requests.inc("draining")
+            return jsonify({"error": "Server is shutting down, retry shortly"}), 503
+        trace = slow_tracer.begin() if slow_tracer is not None else None
+        response = None
+        try:
+            with webhook_duration.time(), profiler.profile():
+                response = process_webhook()
+            return response
+        finally:
+            if trace is not None:
+                slow_tracer.end(trace, status=response[1] if response else 500)
+            graceful.end()
+
+    def process_webhook():
+        try:
+            # Log the request summary
+            content_type = request.headers.get('Content-Type', '')
+            content_length = request.headers.get('Content-Length', '0')
+            user_agent = request.headers.get('User-Agent', '')
+
+            logging.debug("=== NEW WEBHOOK REQUEST === Content-Type: '%s', Content-Length: '%s', User-Agent: '%s'",
+                          content_type, content_length, user_agent)
+            logging.debug("Request Headers: %s", request.headers)
+
+            raw_data = request.get_data()
+            call, response = admit_call(raw_data, idempotency_cache, call_store)
+            if response is not None:
+                body, status = response
+                return jsonify(body), status
+
+            record = call.record
+            try:
+                body, status = pipeline.handle_call(call.time_of_call, record.caller_id, call.call_type,
+                                                    record.campaign_name)
+            except Exception:
+                settle_call(idempotency_cache, call, None, None)
+                raise
+            if call_store is not None:
+                call_store.record(body.get("status", "failed"), record.campaign_name, call.call_type,
+                                  record.caller_id, call.time_of_call, record.target_name, record.call_id)
+            settle_call(idempotency_cache, call, body, status)
+            return jsonify(body), status
+
+        except Exception as e:
+            webhook_requests.inc("error")
+            logging.exception("Error processing webhook: %s", e)
+            return jsonify({"error": "Internal server error"}), 500
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Move old rows out of the live worksheet so it stays small
+Usage: python archiver.py [--sheet-id ID] [--tab Sheet1] [--dry-run]
+
+Rows older than ARCHIVE_MAX_AGE_DAYS, and the oldest rows beyond
+ARCHIVE_MAX_ROWS, are copied to archive tabs (ARCHIVE_TAB_TEMPLATE, one per
+month by default) or appended to gzip CSV files in ARCHIVE_DIR, then deleted
+from the live tab with one bulk request. The web app runs the same archiver
+in the background every ARCHIVE_INTERVAL_SECONDS when that is set; a lock
+file (ARCHIVE_LOCK_FILE) lets only one process on the host archive at a time.
+"""
+
+import argparse
+import csv
+import datetime
+import gzip
+import json
+import logging
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+from gspread.exceptions import WorksheetNotFound
+
+from config import (
+    GOOGLE_SHEET_ID, GOOGLE_SHEET_TAB, ARCHIVE_DESTINATION, ARCHIVE_MAX_AGE_DAYS, ARCHIVE_MAX_ROWS,
+    ARCHIVE_TAB_TEMPLATE, ARCHIVE_DIR, ARCHIVE_LOCK_FILE
+)
+from google_sheets import SHEET_HEADERS, append_rows_to_sheet, get_shard, get_worksheet
+from sheet_router import check_tab_template, format_tab
+from timeutil import now_local
+
+_DATE_PREFIX = re.compile(r"^(\d{4}-\d{2}-\d{2})")
+_UNSAFE_FILE_CHARS = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+def _row_date(row):
+    match = _DATE_PREFIX.match(row[0] if row else "")
+    return match.group(1) if match else None
+
+
+@contextmanager
+def process_lock(path):
+    """Try to take an exclusive lock on the file at ``path``; yields False if another process holds it."""
+    with open(path, "a+") as handle:
+        try:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def live_rows(rows):
+    """The data rows up to the last one with a value in Column A.
+
+    Rows below it may hold formulas in the other columns but are not calls;
+    like the row cursor, only Column A decides which rows are filled.
+    """
+    last_filled = 0
+    for index, row in enumerate(rows, start=1):
+        if row and row[0]:
+            last_filled = index
+    return rows[:last_filled]
+
+
+def rows_to_archive(rows, max_rows=None, cutoff_date=None):
+    """Number of leading (oldest) data rows to move out of the live tab.
+
+    Rows are appended in time order, so the archive is always a prefix: rows
+    dated before ``cutoff_date`` (YYYY-MM-DD) plus whatever exceeds
+    ``max_rows``. Blank rows inside the prefix are dropped along with it;
+    formula-only rows after the last call are never counted or archived.
+    """
+    rows = live_rows(rows)
+    by_size = max(0, len(rows) - max_rows) if max_rows else 0
+    by_age = 0
+    if cutoff_date:
+        for row in rows:
+            if not row or not row[0]:
+                by_age += 1
+                continue
+            date = _row_date(row)
+            if date is None or date >= cutoff_date:
+                break
+            by_age += 1
+    return max(by_size, by_age)
+
+
+class SheetArchiver:
+    """Moves old rows from live tabs into archive tabs or compressed CSV files.
+
+    While a tab is archived its row cursor is held exclusively: new appends
+    wait and in-flight writes finish first, so deleting rows at the top never
+    races a write at the bottom. The cursor's lock file in SHEET_LOCK_DIR
+    extends that to every process on the host (other gunicorn workers, or
+    the web app while this runs from the command line); their cursors find
+    the row above their next reservation empty and re-sync. Rows are written
+    to the archive before they are deleted, so a crash in between duplicates
+    rows in the archive rather than losing them.
+
+    Each gunicorn worker runs its own archiver, so runs take ``lock_file``
+    first and are skipped while another process holds it. Column A of the
+    archived rows is read again just before they are deleted, and nothing is
+    deleted if it changed (e.g. an archiver on another host got there first).
+    """
+
+    def __init__(self, destination=ARCHIVE_DESTINATION, max_age_days=ARCHIVE_MAX_AGE_DAYS,
+                 max_rows=ARCHIVE_MAX_ROWS, archive_tab_template=ARCHIVE_TAB_TEMPLATE, archive_dir=ARCHIVE_DIR,
+                 lock_file=ARCHIVE_LOCK_FILE):
+        if destination not in ("tab", "csv"):
+            raise ValueError(f"Unknown archive destination {destination!r}; use 'tab' or 'csv'")
+        self.destination = destination
+        self.max_age_days = max_age_days
+        self.max_rows = max_rows
+        self.archive_tab_template = check_tab_template(archive_tab_template)
+        self.archive_dir = archive_dir
+        self.lock_file = lock_file
+        self._stopping = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stats = {"runs": 0, "archived_rows": 0, "failures": 0, "skipped": 0, "last_run": None}
+
+    def _cutoff_date(self):
+        if not self.max_age_days:
+            return None
+        # Row dates are local (CALL_TIMEZONE) dates
+        cutoff = now_local().date() - datetime.timedelta(days=self.max_age_days)
+        return cutoff.isoformat()
+
+    def _csv_path(self, sheet_id, tab, row):
+        date = _row_date(row)
+        prefix = _UNSAFE_FILE_CHARS.sub("_", f"{sheet_id}-{tab}")
+        return os.path.join(self.archive_dir, f"{prefix}-{date[:7] if date else 'undated'}.csv.gz")
+
+    def location(self, sheet_id, tab, row):
+        """Where ``row`` of a live tab is archived: an archive tab name or CSV path (None for the live tab)."""
+        if self.destination == "csv":
+            return self._csv_path(sheet_id, tab, row)
+        archive_tab = format_tab(self.archive_tab_template, None, row[2], row[0])
+        return None if archive_tab == tab else archive_tab
+
+    def read_archived(self, sheet_id, location):
+        """Yield the rows already archived at a ``location()``; nothing if it does not exist yet."""
+        if self.destination == "tab":
+            try:
+                rows = get_worksheet(sheet_id, location, create=False).get_values("A:F")
+            except WorksheetNotFound:
+                return
+            yield from rows[1:]
+            return
+        if not os.path.exists(location):
+            return
+        with gzip.open(location, "rt", newline="") as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            yield from reader
+
+    def _write_tabs(self, sheet_id, tab, rows):
+        groups = {}
+        for row in rows:
+            archive_tab = self.location(sheet_id, tab, row)
+            if archive_tab is None:
+                raise ValueError(f"Archive tab template {self.archive_tab_template!r} resolves to the live tab")
+            groups.setdefault(archive_tab, []).append(row)
+        for archive_tab, group in groups.items():
+            if not append_rows_to_sheet(group, sheet_id, archive_tab):
+                return False
+        return True
+
+    def _write_csv(self, sheet_id, tab, rows):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        groups = {}
+        for row in rows:
+            groups.setdefault(self._csv_path(sheet_id, tab, row), []).append(row)
+        for path, group in groups.items():
+            new_file = not os.path.exists(path)
+            # Each run appends a new gzip member; readers see one continuous CSV
+            with gzip.open(path, "at", newline="") as f:
+                writer = csv.writer(f)
+                if new_file:
+                    writer.writerow(SHEET_HEADERS)
+                writer.writerows(group)
+        return True
+
+    def archive(self, sheet_id=None, tab=None, dry_run=False):
+        """Archive one live tab; returns a summary dict."""
+        sheet_id = sheet_id or GOOGLE_SHEET_ID
+        tab = tab or GOOGLE_SHEET_TAB
+        summary = {"sheet_id": sheet_id, "tab": tab, "destination": self.destination, "archived": 0}
+        with process_lock(self.lock_file) as locked:
+            if not locked:
+                logging.info(f"Another process is archiving; skipping '{tab}'")
+                summary["skipped"] = True
+                return summary
+            return self._archive_locked(sheet_id, tab, dry_run, summary)
+
+    def _archive_locked(self, sheet_id, tab, dry_run, summary):
+        sheet, cursor = get_shard(sheet_id, tab)
+        with cursor.exclusive():
+            # One bulk read of the live rows; the header is row 1
+            data = live_rows(sheet.get_values("A:F")[1:])
+            count = rows_to_archive(data, self.max_rows, self._cutoff_date())
+            summary.update(live_rows=len(data), to_archive=count)
+            if not count or dry_run:
+                return summary
+
+            width = len(SHEET_HEADERS)
+            rows = [(row + [""] * width)[:width] for row in data[:count] if row and row[0]]
+            write = self._write_tabs if self.destination == "tab" else self._write_csv
+            if not write(sheet_id, tab, rows):
+                raise RuntimeError(f"Could not write {len(rows)} rows to the archive")
+            # Appends from other processes only add rows below, so the prefix
+            # can only have changed if someone else archived or edited it
+            current = [row[0] if row else "" for row in sheet.get_values(f"A2:A{count + 1}")]
+            current += [""] * (count - len(current))
+            if current != [row[0] if row else "" for row in data[:count]]:
+                raise RuntimeError(f"Rows of '{tab}' changed while archiving; archived copies kept, nothing deleted")
+            # Rows 2..count+1 in one deleteDimension request
+            sheet.delete_rows(2, count + 1)
+        summary["archived"] = len(rows)
+        logging.info(f"Archived {len(rows)} rows from '{tab}' to {self.destination}")
+        return summary
+
+    def run_once(self, targets):
+        for sheet_id, tab in targets:
+            try:
+                summary = self.archive(sheet_id, tab)
+                with self._lock:
+                    self.stats["archived_rows"] += summary["archived"]
+                    if summary.get("skipped"):
+                        self.stats["skipped"] += 1
+            except Exception as e:
+                with self._lock:
+                    self.stats["failures"] += 1
+                logging.error(f"Error archiving '{tab}': {str(e)}")
+        with self._lock:
+            self.stats["runs"] += 1
+            self.stats["last_run"] = datetime.datetime.now(datetime.UTC).isoformat(timespec="seconds")
+
+    def start(self, interval_seconds, targets):
+        def run():
+            while not self._stopping.wait(interval_seconds):
+                self.run_once(targets)
+
+        self._thread = threading.Thread(target=run, name="sheet-archiver", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, destination=self.destination, max_age_days=self.max_age_days,
+                        max_rows=self.max_rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sheet-id", default=GOOGLE_SHEET_ID)
+    parser.add_argument("--tab", default=GOOGLE_SHEET_TAB)
+    parser.add_argument("--destination", choices=["tab", "csv"], default=ARCHIVE_DESTINATION)
+    parser.add_argument("--max-age-days", type=int, default=ARCHIVE_MAX_AGE_DAYS)
+    parser.add_argument("--max-rows", type=int, default=ARCHIVE_MAX_ROWS)
+    parser.add_argument("--dry-run", action="store_true", help="Only report how many rows would move")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    archiver = SheetArchiver(args.destination, args.max_age_days, args.max_rows)
+    print(json.dumps(archiver.archive(args.sheet_id, args.tab, dry_run=args.dry_run), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+ASGI variant of the webhook server.
+
+Shares parsing, filtering and idempotency (webhook_intake.py) and the row
+and Slack formatting logic with the Flask app in app_factory.py, but talks to
+Google Sheets and Slack with async HTTP clients, so one process can hold
+hundreds of in-flight webhooks while they wait on I/O.
+
+Run with: uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+"""
+
+import json
+import logging
+
+import httpx
+
+from async_sheets import AsyncSheetsClient
+from filter_rules import engine as filter_engine
+from google_sheets import build_row, probe_sheets
+from health_probe import DependencyProber
+from sheet_router import route_call
+from idempotency import IdempotencyCache
+from logging_setup import configure_logging
+from metrics import CONTENT_TYPE, render_metrics, stage_duration, webhook_duration, webhook_requests
+from slack_notify import JSON_HEADERS, probe_slack, render_alert_message
+from webhook_intake import admit_call, settle_call
+from config import (
+    RINGBA_FILTERS, SLACK_WEBHOOK_URL, SLACK_POOL_SIZE, LOG_FILE, READY_PROBE_INTERVAL_SECONDS, READY_REQUIRED_PROBES,
+    IDEMPOTENCY_ENABLED, IDEMPOTENCY_MAX_ENTRIES, IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_DB_PATH
+)
+
+configure_logging(LOG_FILE)
+
+
+async def _read_body(receive):
+    chunks = []
+    more_body = True
+    while more_body:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        more_body = message.get("more_body", False)
+    return b"".join(chunks)
+
+
+async def _send_bytes(send, payload, status, content_type):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type), (b"content-length", str(len(payload)).encode())],
+    })
+    await send({"type": "http.response.body", "body": payload})
+
+
+async def _send_json(send, body, status):
+    await _send_bytes(send, json.dumps(body).encode("utf-8"), status, b"application/json")
+
+
+class RingbaWebhookApp:
+    def __init__(self):
+        self.http = None
+        self.sheets = {}
+        self.idempotency = None
+        if IDEMPOTENCY_ENABLED:
+            self.idempotency = IdempotencyCache(
+                max_entries=IDEMPOTENCY_MAX_ENTRIES,
+                ttl_seconds=IDEMPOTENCY_TTL_SECONDS,
+                path=IDEMPOTENCY_DB_PATH or None
+            )
+        # The probes are blocking, so they run on the prober's own thread rather than the event loop
+        self.prober = DependencyProber(
+            {"google_sheets": probe_sheets, "slack": probe_slack},
+            interval_seconds=READY_PROBE_INTERVAL_SECONDS,
+            required=READY_REQUIRED_PROBES
+        )
+
+    def _ensure_clients(self):
+        if self.http is None:
+            limits = httpx.Limits(max_connections=SLACK_POOL_SIZE * 10, max_keepalive_connections=SLACK_POOL_SIZE * 2)
+            self.http = httpx.AsyncClient(timeout=10, limits=limits)
+
+    def _sheets_for(self, sheet_id, tab):
+        """One client (and row cursor) per (spreadsheet ID, tab) shard."""
+        client = self.sheets.get((sheet_id, tab))
+        if client is None:
+            client = self.sheets[(sheet_id, tab)] = AsyncSheetsClient(self.http, sheet_id, tab)
+        return client
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self._ensure_clients()
+                self.prober.start()
+                logging.info("Started Ringba Webhook Handler (ASGI)")
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.prober.stop(timeout=5)
+                if self.http is not None:
+                    await self.http.aclose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        path, method = scope["path"], scope["method"]
+        if path == "/" and method == "GET":
+            body, status = self.health_check()
+        elif path == "/metrics" and method == "GET":
+            await _send_bytes(send, render_metrics().encode("utf-8"), 200, CONTENT_TYPE.encode())
+            return
+        elif path == "/ready" and method == "GET":
+            payload, status = self.prober.response()
+            await _send_bytes(send, payload, status, b"application/json")
+            return
+        elif path == "/ringba-webhook" and method == "POST":
+            self._ensure_clients()
+            raw_data = await _read_body(receive)
+            with webhook_duration.time():
+                body, status = await self.ringba_webhook(raw_data)
+        elif path in ("/", "/metrics", "/ready", "/ringba-webhook"):
+            body, status = {"error": "Method not allowed"}, 405
+        else:
+            body, status = {"error": "Not found"}, 404
+        await _send_json(send, body, status)
+
+    def health_check(self):
+        return {
+            "status": "healthy",
+            "service": "Ringba Webhook Handler",
+            "filters": RINGBA_FILTERS,
+            "filter_rules": filter_engine.summary(),
+            "server": "asgi",
+            "idempotency": self.idempotency.snapshot() if self.idempotency else None,
+            "dependencies": self.prober.snapshot()
+        }, 200
+
+    async def deliver_call(self, time_of_call, caller_id, call_type, campaign_name):
+        """Async counterpart of app_factory.WebhookPipeline.deliver_call."""
+        sheet_id, tab = route_call(campaign_name, call_type, time_of_call)
+        with stage_duration.time("sheets_append"):
+            sheets = self._sheets_for(sheet_id, tab)
+            sheet_success = await sheets.append_rows([build_row(time_of_call, caller_id, call_type)])
+        if not sheet_success:
+            webhook_requests.inc("sheet_fail")
+            logging.error("Failed to append to Google Sheet")
+            return False
+
+        sheet_link = f"https://docs.google.com/spreadsheets/d/{sheet_id}"
+        try:
+            payload = render_alert_message(caller_id, time_of_call, sheet_link, campaign_name, call_type)
+            with stage_duration.time("slack_post"):
+                response = await self.http.post(SLACK_WEBHOOK_URL, content=payload, headers=JSON_HEADERS)
+            response.raise_for_status()
+        except Exception as e:
+            webhook_requests.inc("slack_fail")
+            logging.error(f"Error sending Slack notification: {str(e)}")
+
+        webhook_requests.inc("processed")
+        logging.info("Successfully processed %s from %s", call_type, caller_id, extra={"outcome": "processed"})
+        return True
+
+    async def ringba_webhook(self, raw_data):
+        try:
+            call, response = admit_call(raw_data, self.idempotency)
+            if response is not None:
+                return response
+
+            record = call.record
+            try:
+                if await self.deliver_call(call.time_of_call, record.caller_id, call.call_type, record.campaign_name):
+                    body, status = {
+                        "caller_id": record.caller_id,
+                        "call_type": call.call_type,
+                        "status": "success",
+                        "time": call.time_of_call
+                    }, 200
+                else:
+                    body, status = {"error": "Failed to update Google Sheet"}, 500
+            except Exception:
+                settle_call(self.idempotency, call, None, None)
+                raise
+            settle_call(self.idempotency, call, body, status)
+            return body, status
+
+        except Exception as e:
+            webhook_requests.inc("error")
+            logging.exception("Error processing webhook: %s", e)
+            return {"error": "Internal server error"}, 500
+
+
+app = RingbaWebhookApp()
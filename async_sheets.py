@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import time
+from urllib.parse import quote
+
+import httpx
+from google.auth.transport.requests import Request
+
+from config import GOOGLE_SHEET_ID, GOOGLE_SHEET_TAB, GOOGLE_SHEET_RESYNC_SECONDS, GOOGLE_SHEETS_API_URL, SHEET_LOCK_DIR
+from google_sheets import SHEET_HEADERS, load_credentials, token_expiring
+from metrics import google_api_errors
+from sheet_cursor import rows_lock_file, share_rows_nowait
+
+
+class AsyncSheetsClient:
+    """Appends rows through the Sheets REST API without blocking the event loop.
+
+    Mirrors google_sheets.append_rows_to_sheet: the tab is created if it does
+    not exist yet and headers are validated once,
+    the next free row is tracked in memory (Column A only) with a guard read
+    before each write, and each append is a single A:F range update.
+    """
+
+    def __init__(self, http_client, sheet_id=GOOGLE_SHEET_ID, tab=GOOGLE_SHEET_TAB,
+                 resync_interval=GOOGLE_SHEET_RESYNC_SECONDS):
+        self.http = http_client
+        self.tab = tab
+        self.resync_interval = resync_interval
+        self._spreadsheet_url = f"{GOOGLE_SHEETS_API_URL}/v4/spreadsheets/{sheet_id}"
+        self._values_url = f"{self._spreadsheet_url}/values"
+        self._creds = None
+        self._auth_lock = asyncio.Lock()
+        self._cursor_changed = asyncio.Condition()
+        self._next_row = None
+        # First row -> row after the last, for each append still in flight, and
+        # the first rows of those whose guard read found them in place
+        self._inflight = {}
+        self._checked = set()
+        self._generation = 0
+        # Shared with appends from other processes; the archiver takes it exclusively
+        self._lock_file = rows_lock_file(SHEET_LOCK_DIR, sheet_id, tab)
+        self._synced_at = 0.0
+        self._headers_checked = False
+
+    async def _auth_headers(self):
+        async with self._auth_lock:
+            if self._creds is None:
+                self._creds = await asyncio.to_thread(load_credentials)
+            if token_expiring(self._creds):
+                # google-auth only offers a blocking refresh
+                await asyncio.to_thread(self._creds.refresh, Request())
+        return {"Authorization": f"Bearer {self._creds.token}"}
+
+    def _range_url(self, a1_range):
+        return f"{self._values_url}/{quote(f'{self.tab}!{a1_range}', safe='')}"
+
+    async def _get_values(self, a1_range):
+        response = await self.http.get(self._range_url(a1_range), headers=await self._auth_headers())
+        response.raise_for_status()
+        return response.json().get("values", [])
+
+    async def _put_values(self, a1_range, rows):
+        response = await self.http.put(
+            self._range_url(a1_range),
+            params={"valueInputOption": "RAW"},
+            json={"values": rows},
+            headers=await self._auth_headers(),
+        )
+        response.raise_for_status()
+
+    async def _ensure_tab(self):
+        response = await self.http.get(self._spreadsheet_url, params={"fields": "sheets.properties.title"},
+                                       headers=await self._auth_headers())
+        response.raise_for_status()
+        titles = {sheet["properties"]["title"] for sheet in response.json().get("sheets", [])}
+        if self.tab in titles:
+            return
+        response = await self.http.post(
+            f"{self._spreadsheet_url}:batchUpdate",
+            json={"requests": [{"addSheet": {"properties": {"title": self.tab}}}]},
+            headers=await self._auth_headers(),
+        )
+        # 400 means another worker created it first
+        if response.status_code != 400:
+            response.raise_for_status()
+            logging.info("Created worksheet '%s'", self.tab)
+
+    async def _ensure_headers(self):
+        await self._ensure_tab()
+        rows = await self._get_values("1:1")
+        if not rows or rows[0] != SHEET_HEADERS:
+            response = await self.http.post(
+                f"{self._values_url}/{quote(self.tab, safe='')}:clear", json={}, headers=await self._auth_headers()
+            )
+            response.raise_for_status()
+            await self._put_values("A1:F1", [SHEET_HEADERS])
+            logging.info("Created correct headers in Google Sheet")
+        self._headers_checked = True
+
+    async def _sync(self):
+        if not self._headers_checked:
+            await self._ensure_headers()
+        # Find next empty row by checking ONLY Column A (ignore formulas in other columns)
+        last_filled = 0
+        for index, row in enumerate(await self._get_values("A:A"), start=1):
+            if row and row[0]:
+                last_filled = index
+        # Rows of checked appends still in flight look empty in Column A;
+        # unchecked reservations are taken again after the sync
+        self._next_row = max([last_filled + 1, *(self._inflight[row] for row in self._checked)])
+        self._synced_at = time.monotonic()
+        self._generation += 1
+        self._cursor_changed.notify_all()
+
+    def _take_rows(self, count, checked):
+        start = self._next_row
+        self._next_row += count
+        self._inflight[start] = self._next_row
+        if checked:
+            self._checked.add(start)
+        return start
+
+    def _release(self, start):
+        self._inflight.pop(start, None)
+        self._checked.discard(start)
+
+    async def _confirm(self, start, count, generation, filled):
+        """Same checks as RowCursor._confirm; called holding _cursor_changed."""
+        while True:
+            if self._generation != generation:
+                # The cursor re-synced during the guard read, so these rows may be stale
+                self._release(start)
+                if self._next_row is None:
+                    await self._sync()
+                return self._take_rows(count, checked=True)
+            if any(filled[1:]):
+                logging.warning("Row %d is already written, re-syncing row cursor", start)
+                break
+            owner = None
+            if not filled[0]:
+                owner = next((first for first, end in self._inflight.items() if first <= start - 1 < end), None)
+            if filled[0] or owner in self._checked:
+                self._checked.add(start)
+                self._cursor_changed.notify_all()
+                return start
+            if owner is None:
+                logging.warning("Row %d is empty, re-syncing row cursor", start - 1)
+                break
+            # The row above belongs to an append whose guard read is still running
+            await self._cursor_changed.wait()
+        self._release(start)
+        await self._sync()
+        return self._take_rows(count, checked=True)
+
+    async def _reserve(self, count):
+        """Reserve ``count`` rows; every successful reservation must be followed by ``_release(start)``."""
+        async with self._cursor_changed:
+            synced = self._next_row is None or time.monotonic() - self._synced_at >= self.resync_interval
+            if synced:
+                await self._sync()
+            start = self._take_rows(count, checked=synced)
+            generation = self._generation
+        if synced:
+            return start
+
+        try:
+            # Guard read outside the lock so concurrent appends overlap their round trips;
+            # the row above must be filled too, or rows were deleted under the cursor
+            values = await self._get_values(f"A{start - 1}:A{start + count - 1}")
+            filled = [bool(row and row[0]) for row in values] + [False] * (count + 1 - len(values))
+            async with self._cursor_changed:
+                return await self._confirm(start, count, generation, filled)
+        except BaseException:
+            async with self._cursor_changed:
+                # Appends waiting on these rows re-check them
+                self._release(start)
+                self._cursor_changed.notify_all()
+            raise
+
+    async def _share_rows(self):
+        if not self._lock_file:
+            return None
+        # Poll rather than block the event loop while another process archives
+        while True:
+            handle = share_rows_nowait(self._lock_file)
+            if handle is not None:
+                return handle
+            await asyncio.sleep(0.05)
+
+    async def append_rows(self, rows):
+        if not rows:
+            return True
+        handle = None
+        try:
+            handle = await self._share_rows()
+            first_row = await self._reserve(len(rows))
+            last_row = first_row + len(rows) - 1
+            try:
+                await self._put_values(f"A{first_row}:F{last_row}", rows)
+            finally:
+                self._release(first_row)
+            logging.info(f"Successfully appended rows {first_row}-{last_row} ({len(rows)} rows)")
+            return True
+        except Exception as e:
+            self._next_row = None
+            if isinstance(e, httpx.HTTPStatusError):
+                google_api_errors.inc(str(e.response.status_code))
+                if e.response.status_code in (401, 403):
+                    self._creds = None
+            logging.error(f"Error appending to Google Sheet: {str(e)}")
+            return False
+        finally:
+            if handle is not None:
+                handle.close()
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Replay calls from Ringba exports or the handler's own logs into Google Sheets
+Usage: python backfill.py FILE [FILE ...] [--format auto|csv|jsonl|log] [--dry-run]
+
+Reads Ringba CSV exports, JSON-lines files of webhook payloads, or
+ringba_webhook.log (JSON lines, plus the older "Raw data: '...'" text lines),
+optionally gzipped. Every call goes through the same filter rules and sheet
+routing as live webhooks. Calls already in their target tab (same time of
+call and caller ID) are skipped, so a backfill can be re-run safely after an
+interruption. So are calls the archiver already moved out: the archive tab
+or CSV file each call would be archived to is read too, so exports older
+than ARCHIVE_MAX_AGE_DAYS do not put archived calls back into the live tab
+(and from there into the archive a second time). Rows are written in large
+batched updates per tab.
+
+Input is streamed line by line and the keys of rows already in the target
+tabs are kept in a temporary SQLite file, so memory stays flat however large
+the input or however many tabs it spans.
+"""
+
+import argparse
+import csv
+import datetime
+import gzip
+import io
+import json
+import logging
+import re
+import sqlite3
+import sys
+import time
+
+from gspread.exceptions import WorksheetNotFound
+
+from archiver import SheetArchiver
+from call_record import FIELD_ALIASES, CallRecord, parse_call, record_from_payload, resolve_time_of_call
+from filter_rules import classify_call
+from google_sheets import append_rows_to_sheet, build_row, get_worksheet
+from sheet_router import route_call
+from timeutil import normalize_time
+
+# Ringba call log export headers, normalized, mapped to webhook payload keys
+EXPORT_COLUMNS = {
+    "campaign": "campaignName",
+    "target": "targetName",
+    "callerid": "callerId",
+    "calldate": "callDate",
+    "connectedcalllengthinseconds": "callLengthFromConnect",
+    "connectedcalllength": "callLengthFromConnect",
+    "inboundcallid": "inboundCallId",
+}
+_LEGACY_RAW_DATA = re.compile(r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}),\d+ - .* - Raw data: '(.*)'$")
+
+
+def _normalize_header(name):
+    return re.sub(r"[\s_]+", "", name).lower()
+
+
+_COLUMN_KEYS = {_normalize_header(key): key for key in FIELD_ALIASES}
+_COLUMN_KEYS.update(EXPORT_COLUMNS)
+
+
+def open_input(path):
+    if path == "-":
+        return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8", errors="replace", newline="")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace", newline="")
+    return open(path, encoding="utf-8", errors="replace", newline="")
+
+
+def detect_format(path):
+    name = path[:-3] if path.endswith(".gz") else path
+    if name.endswith(".csv"):
+        return "csv"
+    if ".log" in name:
+        return "log"
+    return "jsonl"
+
+
+def read_csv(lines):
+    """Yield (CallRecord, received_at) from a CSV export; unknown columns are ignored."""
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = [(index, _COLUMN_KEYS[_normalize_header(name)]) for index, name in enumerate(header)
+               if _normalize_header(name) in _COLUMN_KEYS]
+    for row in reader:
+        yield record_from_payload({key: row[index] for index, key in columns if index < len(row)}), None
+
+
+def read_jsonl(lines):
+    """Yield (CallRecord, received_at) from one webhook payload per line; unreadable lines yield None."""
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            payload = json.loads(line)
+        except ValueError:
+            yield None, None
+            continue
+        yield (record_from_payload(payload), None) if isinstance(payload, dict) else (None, None)
+
+
+def _record_from_log_entry(entry):
+    if "raw_body" in entry:
+        return parse_call(entry["raw_body"])
+    if "caller_id" in entry and "campaign_name" in entry:
+        # A "Processing ... call" line, logged with the CallRecord's fields
+        record = CallRecord()
+        for field in CallRecord.__slots__:
+            if entry.get(field) is not None:
+                setattr(record, field, entry[field])
+        return record
+    return None
+
+
+def read_log(lines):
+    """Yield (CallRecord, received_at) for every call body found in a handler log."""
+    for line in lines:
+        try:
+            if line.startswith("{"):
+                entry = json.loads(line)
+                record = _record_from_log_entry(entry)
+                if record is None:
+                    continue
+                yield record, datetime.datetime.fromisoformat(entry["ts"])
+                continue
+            match = _LEGACY_RAW_DATA.match(line.rstrip("\r\n"))
+            if match:
+                received_at = datetime.datetime.strptime(match.group(1), "%Y-%m-%d %H:%M:%S")
+                yield parse_call(match.group(2)), received_at.replace(tzinfo=datetime.UTC)
+        except (ValueError, KeyError):
+            yield None, None
+
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl, "log": read_log}
+
+
+class Backfill:
+    """Filters, de-duplicates and batches calls into their sheet tabs.
+
+    The (time of call, caller ID) keys of every target tab and of the
+    archive locations its calls map to, and of each row written, go into an
+    on-disk SQLite set rather than memory. At most
+    ``max_pending`` rows wait for a write across all tabs; past that the
+    largest batch is written early.
+    """
+
+    def __init__(self, batch_size=500, dry_run=False, max_retries=6, max_pending=None, archiver=None):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.max_retries = max_retries
+        self.max_pending = max_pending or batch_size * 20
+        # Only used to find and read the archive; it never archives here
+        self.archiver = archiver or SheetArchiver()
+        # An empty name opens a private temporary database file, deleted on close
+        self._keys = sqlite3.connect("")
+        self._keys.execute("PRAGMA journal_mode=OFF")
+        self._keys.execute("PRAGMA synchronous=OFF")
+        self._keys.execute(
+            "CREATE TABLE keys (sheet_id TEXT, tab TEXT, time_of_call TEXT, caller_id TEXT,"
+            " PRIMARY KEY (sheet_id, tab, time_of_call, caller_id)) WITHOUT ROWID"
+        )
+        self._loaded = set()
+        self._pending = {}
+        self._pending_rows = 0
+        self.stats = {"read": 0, "unreadable": 0, "filtered": 0, "no_time": 0, "duplicates": 0,
+                      "written": 0, "batches": 0}
+
+    def _load_existing(self, shard):
+        if shard in self._loaded:
+            return
+        # One bulk read of the time/caller columns per tab; the header is row 1. Times
+        # are normalized so rows written before TIME_FORMAT still match
+        try:
+            rows = get_worksheet(*shard, create=not self.dry_run).get_values("A:B")[1:]
+        except WorksheetNotFound:
+            # Dry runs never create tabs; one that does not exist yet has no rows
+            rows = []
+        self._keys.executemany(
+            "INSERT OR IGNORE INTO keys VALUES (?, ?, ?, ?)",
+            (shard + (normalize_time(row[0]), row[1]) for row in rows if len(row) >= 2),
+        )
+        self._loaded.add(shard)
+        logging.info(f"Loaded {len(rows)} existing rows from {shard[0]}!{shard[1]}")
+
+    def _load_archived(self, shard, row):
+        location = self.archiver.location(*shard, row)
+        if location is None or (shard, location) in self._loaded:
+            return
+        # Archived rows count as rows of the live tab they came from
+        cursor = self._keys.executemany(
+            "INSERT OR IGNORE INTO keys VALUES (?, ?, ?, ?)",
+            (shard + (normalize_time(archived[0]), archived[1])
+             for archived in self.archiver.read_archived(shard[0], location) if len(archived) >= 2),
+        )
+        self._loaded.add((shard, location))
+        logging.info(f"Loaded {max(cursor.rowcount, 0)} archived rows of {shard[0]}!{shard[1]} from {location}")
+
+    def _claim(self, shard, time_of_call, caller_id):
+        """Record the key; False if the tab already has (or will get) this call."""
+        cursor = self._keys.execute("INSERT OR IGNORE INTO keys VALUES (?, ?, ?, ?)",
+                                    shard + (time_of_call, caller_id))
+        return cursor.rowcount == 1
+
+    def add(self, record, received_at=None):
+        self.stats["read"] += 1
+        if record is None:
+            self.stats["unreadable"] += 1
+            return
+        call_type = classify_call(record.campaign_name, record.target_name, record.call_length)
+        if call_type is None:
+            self.stats["filtered"] += 1
+            return
+        if not record.timestamp and received_at is None:
+            # Without a time the row could not be matched against the sheet or placed in order
+            self.stats["no_time"] += 1
+            return
+
+        time_of_call = resolve_time_of_call(record, received_at)
+        shard = route_call(record.campaign_name, call_type, time_of_call)
+        row = build_row(time_of_call, record.caller_id, call_type)
+        self._load_existing(shard)
+        self._load_archived(shard, row)
+        if not self._claim(shard, time_of_call, record.caller_id):
+            self.stats["duplicates"] += 1
+            return
+        rows = self._pending.setdefault(shard, [])
+        rows.append(row)
+        self._pending_rows += 1
+        if len(rows) >= self.batch_size:
+            self._flush(shard)
+        elif self._pending_rows >= self.max_pending:
+            # Input spread over many tabs; write the biggest batch rather than hold them all
+            self._flush(max(self._pending, key=lambda pending: len(self._pending[pending])))
+
+    def _flush(self, shard):
+        rows = self._pending.pop(shard, None)
+        if not rows:
+            return
+        self._pending_rows -= len(rows)
+        if not self.dry_run:
+            for attempt in range(self.max_retries):
+                if append_rows_to_sheet(rows, *shard):
+                    break
+                # Also rides out an open circuit breaker
+                delay = min(2 ** attempt, 60)
+                logging.warning(f"Batch of {len(rows)} rows failed, retrying in {delay}s")
+                time.sleep(delay)
+            else:
+                raise RuntimeError(f"Could not write {len(rows)} rows to {shard[0]}!{shard[1]}; re-run to resume")
+        self.stats["written"] += len(rows)
+        self.stats["batches"] += 1
+
+    def finish(self):
+        for shard in list(self._pending):
+            self._flush(shard)
+        self._keys.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("files", nargs="+", help="Input files (.gz is decompressed; - reads stdin)")
+    parser.add_argument("--format", choices=["auto", "csv", "jsonl", "log"], default="auto")
+    parser.add_argument("--batch-size", type=int, default=500, help="Rows per Sheets write")
+    parser.add_argument("--progress-seconds", type=float, default=5.0)
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be written without writing")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    backfill = Backfill(args.batch_size, args.dry_run)
+    started = last_report = time.monotonic()
+    for path in args.files:
+        input_format = detect_format(path) if args.format == "auto" else args.format
+        logging.info(f"Reading {path} as {input_format}")
+        with open_input(path) as lines:
+            for record, received_at in READERS[input_format](lines):
+                backfill.add(record, received_at)
+                now = time.monotonic()
+                if now - last_report >= args.progress_seconds:
+                    last_report = now
+                    rate = backfill.stats["read"] / (now - started)
+                    logging.info(f"Progress: {json.dumps(backfill.stats)} ({rate:.0f} records/s)")
+    backfill.finish()
+
+    summary = dict(backfill.stats, dry_run=args.dry_run, seconds=round(time.monotonic() - started, 1))
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Compare the Flask (gunicorn sync workers) and ASGI (uvicorn) servers against local stand-ins
+Usage: python benchmarks/bench_asgi_vs_flask.py [--requests 400] [--concurrency 100]
+"""
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from standins import SheetsStandin, SlackStandin, fake_service_account, state_paths
+
+CAMPAIGN = "SPANISH DEBT | 3.5 STANDARD | 01292025"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.1)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def drive(url, total, concurrency):
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+
+    def one(index):
+        payload = {"campaignName": CAMPAIGN, "targetName": "", "callerId": f"BENCH{index:06d}"}
+        started = time.perf_counter()
+        response = session.post(url, json=payload, timeout=60)
+        return time.perf_counter() - started, response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - started
+    latencies = [latency * 1000 for latency, _ in results]
+    return {
+        "requests": total,
+        "ok": sum(1 for _, status in results if status == 200),
+        "throughput_rps": round(total / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+    }
+
+
+def run_server(command, env, port, total, concurrency):
+    # Each server gets its own spool, call store and logs, away from the repo
+    env = dict(env, **state_paths(tempfile.mkdtemp(prefix="ringba-bench-")))
+    process = subprocess.Popen(command, cwd=REPO_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        # Warm up: first call builds the Sheets client and syncs the row cursor
+        requests.post(f"http://127.0.0.1:{port}/ringba-webhook",
+                      json={"campaignName": CAMPAIGN, "targetName": "", "callerId": "WARMUP"}, timeout=60)
+        return drive(f"http://127.0.0.1:{port}/ringba-webhook", total, concurrency)
+    finally:
+        process.terminate()
+        process.wait(10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--gunicorn-workers", type=int, default=4)
+    parser.add_argument("--sheets-latency-ms", type=float, default=80)
+    parser.add_argument("--slack-latency-ms", type=float, default=40)
+    args = parser.parse_args()
+
+    sheets = SheetsStandin(latency_ms=args.sheets_latency_ms).start()
+    slack = SlackStandin(latency_ms=args.slack_latency_ms).start()
+    env = dict(
+        os.environ,
+        GOOGLE_CREDS_JSON=fake_service_account(f"{sheets.url}/token"),
+        GOOGLE_SHEETS_API_URL=sheets.url,
+        GOOGLE_SHEET_ID="benchmark",
+        SLACK_WEBHOOK_URL=f"{slack.url}/hook",
+        RINGBA_CAMPAIGN_NAME=CAMPAIGN,
+        LOG_LEVEL="WARNING",
+        IDEMPOTENCY_ENABLED="False",
+    )
+
+    servers = {}
+    port = free_port()
+    # gunicorn.conf.py picks the worker class from WORKER_MODEL, so pin it to match the label
+    servers["flask (gunicorn sync)"] = run_server(
+        [sys.executable, "-m", "gunicorn", "main:app", "-w", str(args.gunicorn_workers), "-b", f"127.0.0.1:{port}"],
+        dict(env, WORKER_MODEL="sync"), port, args.requests, args.concurrency)
+    port = free_port()
+    servers["asgi (uvicorn, 1 process)"] = run_server(
+        [sys.executable, "-m", "uvicorn", "asgi_app:app", "--port", str(port), "--log-level", "warning"],
+        env, port, args.requests, args.concurrency)
+
+    sheets.stop()
+    slack.stop()
+    print(f"{'server':<28} {'ok':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, result in servers.items():
+        print(f"{name:<28} {result['ok']:>5} {result['throughput_rps']:>8} {result['p50_ms']:>8} "
+              f"{result['p95_ms']:>8} {result['p99_ms']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark webhook body parsing: the old multi-pass path vs parse_call()
+Usage: python benchmarks/bench_parsing.py [--iterations 100000]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from call_record import parse_call
+
+PAYLOADS = {
+    "no_value": {
+        "campaignName": "SPANISH DEBT | 3.5 STANDARD | 01292025",
+        "targetName": "",
+        "callerId": "+15551234567",
+        "callLengthFromConnect": 0,
+        "endCallSource": "system",
+        "timestamp": "2025-08-01T14:03:22Z",
+    },
+    "0819_snake_case": {
+        "campaignName": "SPANISH DEBT | 3.5 STANDARD | 01292025",
+        "targetName": "TA7a8e20272b90487c8d420370c8477992",
+        "callerId": "+15557654321",
+        "call_length_from_connect": "22",
+        "end_call_source": "caller",
+        "callDate": "2025-08-01 10:03:22",
+        "inboundCallId": "RGB1234567890",
+        "publisherName": "Example Publisher",
+        "buyer": "Example Buyer",
+    },
+}
+
+
+def legacy_parse(raw_data):
+    """The pre-CallRecord handler: decode for logging, parse twice, chained lookups."""
+    raw_text = raw_data.decode('utf-8')
+    data = json.loads(raw_data)
+    if data and data.get("type") == "url_verification":
+        return None
+    data = json.loads(raw_text)
+    campaign_name = data.get("campaignName", "")
+    target_name = data.get("targetName", "")
+    caller_id = data.get("callerId", "Unknown")
+    call_length = data.get("callLengthFromConnect", data.get("CallLengthFromConnect", data.get("call_length_from_connect")))
+    end_call_source = data.get("endCallSource", data.get("EndCallSource", data.get("end_call_source")))
+    timestamp = data.get("timestamp") or data.get("callTime") or data.get("callDate")
+    return campaign_name, target_name, caller_id, call_length, end_call_source, timestamp
+
+
+def single_pass_parse(raw_data):
+    record = parse_call(raw_data)
+    return (record.campaign_name, record.target_name, record.caller_id,
+            record.call_length, record.end_call_source, record.timestamp)
+
+
+def time_it(func, raw_data, iterations):
+    started = time.process_time()
+    for _ in range(iterations):
+        func(raw_data)
+    return (time.process_time() - started) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=100000)
+    args = parser.parse_args()
+
+    print(f"{'payload':<18} {'legacy us':>10} {'single us':>10} {'speedup':>8}")
+    for name, payload in PAYLOADS.items():
+        raw_data = json.dumps(payload).encode('utf-8')
+        assert legacy_parse(raw_data) == single_pass_parse(raw_data)
+        legacy = time_it(legacy_parse, raw_data, args.iterations)
+        single = time_it(single_pass_parse, raw_data, args.iterations)
+        print(f"{name:<18} {legacy:>10.2f} {single:>10.2f} {legacy / single:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Load-test main.app against local Google Sheets and Slack stand-ins
+Usage: python benchmarks/load_test.py [--requests 1000] [--concurrency 50] [--output run.json] [--baseline old.json]
+
+The Flask app runs in this process on a threaded WSGI server, so every setting
+in config.py can be tried with --env (e.g. --env SHEETS_BATCH_ENABLED=True).
+Requests follow a weighted mix of realistic Ringba payloads; see PAYLOAD_KINDS.
+The report (throughput, p50/p95/p99 latency, responses by status and payload
+kind, Sheets/Slack API calls per webhook, mean time per processing stage) is
+printed as JSON and optionally written to --output for comparing runs.
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from standins import SheetsStandin, SlackStandin, fake_service_account, state_paths
+
+CAMPAIGN = "SPANISH DEBT | 3.5 STANDARD | 01292025"
+TARGET_0819 = "TA7a8e20272b90487c8d420370c8477992"
+
+# Payload kinds and their default share of traffic
+DEFAULT_MIX = {
+    "no_value": 40,
+    "no_value_label": 10,
+    "0819_short": 10,
+    "0819_long": 10,
+    "other_campaign": 20,
+    "retry": 5,
+    "malformed": 5,
+}
+PAYLOAD_KINDS = tuple(DEFAULT_MIX)
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in PAYLOAD_KINDS:
+            raise argparse.ArgumentTypeError(f"Unknown payload kind {name!r}; choose from {', '.join(PAYLOAD_KINDS)}")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+class PayloadFactory:
+    """Builds request bodies for each payload kind, remembering sent calls so retries can repeat them."""
+
+    def __init__(self, seed):
+        self._random = random.Random(seed)
+        self._ids = itertools.count(1)
+        self._sent = []
+        self._lock = threading.Lock()
+
+    def _call(self, target, seconds, campaign=CAMPAIGN):
+        call_number = next(self._ids)
+        return {
+            "campaignName": campaign,
+            "targetName": target,
+            "callerId": f"+1555{call_number:07d}",
+            "callLengthFromConnect": seconds,
+            "endCallSource": self._random.choice(["caller", "target", "system"]),
+            "callId": f"LOADTEST{call_number:08d}",
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        }
+
+    def build(self, kind):
+        if kind == "malformed":
+            return b'{"campaignName": "' + CAMPAIGN.encode() + b'", "callerId": '
+        if kind == "retry":
+            with self._lock:
+                previous = self._random.choice(self._sent) if self._sent else None
+            if previous is not None:
+                return previous
+            kind = "no_value"
+        if kind == "no_value":
+            payload = self._call("", self._random.randint(0, 600))
+        elif kind == "no_value_label":
+            payload = self._call("-no value-", self._random.randint(0, 600))
+        elif kind == "0819_short":
+            payload = self._call(TARGET_0819, self._random.randint(0, 30))
+        elif kind == "0819_long":
+            payload = self._call(TARGET_0819, self._random.randint(31, 900))
+        else:
+            payload = self._call("TAother", self._random.randint(0, 600), campaign="ENGLISH DEBT | STANDARD")
+        body = json.dumps(payload).encode("utf-8")
+        with self._lock:
+            self._sent.append(body)
+        return body
+
+    def plan(self, mix, total):
+        kinds = list(mix)
+        return self._random.choices(kinds, weights=[mix[kind] for kind in kinds], k=total)
+
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def latency_summary(samples):
+    return {
+        "p50_ms": round(percentile(samples, 50), 2) if samples else None,
+        "p95_ms": round(percentile(samples, 95), 2) if samples else None,
+        "p99_ms": round(percentile(samples, 99), 2) if samples else None,
+        "max_ms": round(max(samples), 2) if samples else None,
+    }
+
+
+def stage_means(metrics_text):
+    """Mean milliseconds per stage from the app's /metrics histogram."""
+    sums, counts = {}, {}
+    for name, stage, value in re.findall(r'^ringba_stage_duration_seconds_(sum|count)\{stage="([^"]+)"\} (\S+)$',
+                                         metrics_text, re.MULTILINE):
+        (sums if name == "sum" else counts)[stage] = float(value)
+    return {stage: round(sums[stage] / counts[stage] * 1000, 3) for stage in sorted(counts) if counts[stage]}
+
+
+def wait_for_queue(delivery_queue, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        depth = delivery_queue.depth()
+        if depth["pending"] == 0 and depth["inflight"] == 0:
+            return
+        time.sleep(0.1)
+
+
+def run(args, base_url, factory, sheets, slack, delivery_queue):
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency))
+    url = f"{base_url}/ringba-webhook"
+
+    # Warm up: the first delivery builds the Sheets client and syncs the row cursor
+    session.post(url, data=factory.build("no_value"), headers={"Content-Type": "application/json"}, timeout=60)
+    if delivery_queue is not None:
+        wait_for_queue(delivery_queue)
+    sheets.reset_counts()
+    slack.reset_counts()
+    base_metrics = session.get(f"{base_url}/metrics", timeout=10).text
+
+    plan = factory.plan(args.mix, args.requests)
+
+    def one(kind):
+        body = factory.build(kind)
+        started = time.perf_counter()
+        try:
+            response = session.post(url, data=body, headers={"Content-Type": "application/json"}, timeout=60)
+            status = response.status_code
+            outcome = response.json().get("status") or ("rejected" if status < 500 else "error")
+        except requests.RequestException:
+            status, outcome = 0, "transport_error"
+        except ValueError:
+            outcome = "non_json"
+        return kind, (time.perf_counter() - started) * 1000, status, outcome
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(one, plan))
+    elapsed = time.perf_counter() - started
+    if delivery_queue is not None:
+        wait_for_queue(delivery_queue)
+
+    latencies = [latency for _, latency, _, _ in results]
+    by_kind = defaultdict(list)
+    for kind, latency, status, outcome in results:
+        by_kind[kind].append((latency, status, outcome))
+    # Retries answered from the idempotency cache do not cause new writes
+    delivered = sum(1 for kind, _, status, outcome in results
+                    if kind != "retry" and status in (200, 202) and outcome in ("success", "queued"))
+
+    sheets_calls = {kind: count for kind, count in sheets.calls.items() if kind not in ("token", "injected_error")}
+    sheets_total = sum(sheets_calls.values())
+    slack_total = slack.calls["slack_post"]
+
+    metrics_text = session.get(f"{base_url}/metrics", timeout=10).text
+    before, after = stage_means(base_metrics), stage_means(metrics_text)
+    return {
+        "requests": len(results),
+        "delivered": delivered,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(results) / elapsed, 1),
+        "latency": latency_summary(latencies),
+        "status_codes": dict(sorted(Counter(str(status) for _, _, status, _ in results).items())),
+        "by_kind": {
+            kind: dict(
+                latency_summary([latency for latency, _, _ in rows]),
+                count=len(rows),
+                outcomes=dict(Counter(outcome for _, _, outcome in rows)),
+            )
+            for kind, rows in sorted(by_kind.items())
+        },
+        "api_calls": {
+            "sheets": dict(sorted(sheets_calls.items())),
+            "sheets_injected_errors": sheets.calls["injected_error"],
+            "slack": slack_total,
+            "slack_injected_errors": slack.calls["injected_error"],
+            "sheets_per_webhook": round(sheets_total / len(results), 3),
+            "sheets_per_delivered": round(sheets_total / delivered, 3) if delivered else None,
+            "slack_per_delivered": round(slack_total / delivered, 3) if delivered else None,
+        },
+        # Includes the warm-up request; stages are cumulative means for this process
+        "stage_mean_ms": after or before,
+    }
+
+
+def compare(result, baseline):
+    """Relative change of the headline numbers against a previous run's JSON."""
+    pairs = {
+        "throughput_rps": (result["throughput_rps"], baseline["result"]["throughput_rps"]),
+        "p50_ms": (result["latency"]["p50_ms"], baseline["result"]["latency"]["p50_ms"]),
+        "p95_ms": (result["latency"]["p95_ms"], baseline["result"]["latency"]["p95_ms"]),
+        "p99_ms": (result["latency"]["p99_ms"], baseline["result"]["latency"]["p99_ms"]),
+        "sheets_per_delivered": (result["api_calls"]["sheets_per_delivered"],
+                                 baseline["result"]["api_calls"]["sheets_per_delivered"]),
+    }
+    changes = {}
+    for name, (new, old) in pairs.items():
+        change = round((new - old) / old * 100, 1) if new is not None and old else None
+        changes[name] = {"baseline": old, "current": new, "change_pct": change}
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="Comma-separated kind=weight pairs, e.g. no_value=80,other_campaign=20")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--sheets-latency-ms", type=float, default=80)
+    parser.add_argument("--sheets-jitter-ms", type=float, default=40)
+    parser.add_argument("--sheets-error-rate", type=float, default=0.0)
+    parser.add_argument("--sheets-error-status", type=int, default=429)
+    parser.add_argument("--slack-latency-ms", type=float, default=40)
+    parser.add_argument("--slack-jitter-ms", type=float, default=20)
+    parser.add_argument("--slack-error-rate", type=float, default=0.0)
+    parser.add_argument("--slack-error-status", type=int, default=500)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra app setting, may be repeated")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--baseline", help="Previous --output file to compare against")
+    args = parser.parse_args()
+
+    sheets = SheetsStandin(latency_ms=args.sheets_latency_ms, jitter_ms=args.sheets_jitter_ms,
+                           error_rate=args.sheets_error_rate, error_status=args.sheets_error_status).start()
+    slack = SlackStandin(latency_ms=args.slack_latency_ms, jitter_ms=args.slack_jitter_ms,
+                         error_rate=args.slack_error_rate, error_status=args.slack_error_status).start()
+    work_dir = tempfile.mkdtemp(prefix="ringba-load-")
+    # Spool, call store, queue and logs all stay in work_dir, never the repo
+    settings = dict(state_paths(work_dir))
+    settings.update({
+        "GOOGLE_CREDS_JSON": fake_service_account(f"{sheets.url}/token"),
+        "GOOGLE_SHEETS_API_URL": sheets.url,
+        "GOOGLE_SHEET_ID": "loadtest",
+        "SLACK_WEBHOOK_URL": f"{slack.url}/hook",
+        "RINGBA_CAMPAIGN_NAME": CAMPAIGN,
+        "RINGBA_TARGET_NAME": "-no value-",
+        "RINGBA_0819_TARGET_ID": TARGET_0819,
+        "LOG_LEVEL": "WARNING",
+    })
+    overrides = dict(item.split("=", 1) for item in args.env)
+    settings.update(overrides)
+    # config.py reads the environment at import time, so set it before importing the app
+    os.environ.update(settings)
+
+    from werkzeug.serving import make_server
+    import main as webhook_app
+
+    # Per-request access lines would swamp the output
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+    server = make_server("127.0.0.1", 0, webhook_app.app, threaded=True)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    try:
+        result = run(args, base_url, PayloadFactory(args.seed), sheets, slack, webhook_app.delivery_queue)
+    finally:
+        server.shutdown()
+        sheets.stop()
+        slack.stop()
+
+    report = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "parameters": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "mix": args.mix,
+            "seed": args.seed,
+            "sheets": {"latency_ms": args.sheets_latency_ms, "jitter_ms": args.sheets_jitter_ms,
+                       "error_rate": args.sheets_error_rate, "error_status": args.sheets_error_status},
+            "slack": {"latency_ms": args.slack_latency_ms, "jitter_ms": args.slack_jitter_ms,
+                      "error_rate": args.slack_error_rate, "error_status": args.slack_error_status},
+            "env": overrides,
+        },
+        "result": result,
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["comparison"] = compare(result, json.load(f))
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+"""
+Local stand-ins for the Google Sheets API and a Slack incoming webhook.
+
+The Sheets stand-in implements the handful of endpoints this project uses
+(OAuth token, spreadsheet metadata, values get/update/append/clear, adding
+tabs and deleting rows) over an in-memory grid, so the real gspread/httpx
+code paths run unchanged against it.
+Point the app at them with GOOGLE_SHEETS_API_URL, SLACK_WEBHOOK_URL and the
+service-account JSON from ``fake_service_account()``.
+
+Both stand-ins can add latency (a fixed delay plus uniform jitter) and fail a
+fraction of requests with a chosen HTTP status, e.g. 429 to mimic the Sheets
+per-minute quota. Token requests are never failed.
+"""
+
+import os
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+_CELL_RE = re.compile(r"^([A-Z]*)(\d*)$")
+
+
+def _column_index(letters):
+    index = 0
+    for char in letters:
+        index = index * 26 + (ord(char) - 64)
+    return index
+
+
+def parse_a1(range_name):
+    """Split an A1 range into (tab, first_row, first_col, last_row, last_col); open ends are None."""
+    if "!" in range_name:
+        tab, cells = range_name.rsplit("!", 1)
+    else:
+        tab, cells = range_name, ""
+    tab = tab.strip("'")
+    if not cells:
+        return tab, 1, 1, None, None
+    start, _, end = cells.partition(":")
+    end = end or start
+    start_col, start_row = _CELL_RE.match(start).groups()
+    end_col, end_row = _CELL_RE.match(end).groups()
+    return (
+        tab,
+        int(start_row) if start_row else 1,
+        _column_index(start_col) if start_col else 1,
+        int(end_row) if end_row else None,
+        _column_index(end_col) if end_col else None,
+    )
+
+
+def _trim(cells):
+    while cells and cells[-1] in ("", None):
+        cells.pop()
+    return cells
+
+
+class SheetsState:
+    """Thread-safe in-memory worksheets keyed by tab name."""
+
+    def __init__(self, tabs=("Sheet1",)):
+        self.lock = threading.Lock()
+        self.tabs = {tab: [] for tab in tabs}
+
+    def read(self, range_name, major_dimension="ROWS"):
+        tab, row0, col0, row1, col1 = parse_a1(range_name)
+        with self.lock:
+            grid = self.tabs.setdefault(tab, [])
+            last_row = min(row1 or len(grid), len(grid))
+            block = []
+            for row in grid[row0 - 1:last_row]:
+                width = col1 or len(row)
+                block.append(list(row[col0 - 1:width]))
+        if major_dimension == "COLUMNS":
+            width = max((len(row) for row in block), default=0)
+            block = [[row[i] if i < len(row) else "" for row in block] for i in range(width)]
+        block = [_trim(row) for row in block]
+        while block and not block[-1]:
+            block.pop()
+        return block
+
+    def write(self, range_name, values):
+        tab, row0, col0, _, _ = parse_a1(range_name)
+        with self.lock:
+            grid = self.tabs.setdefault(tab, [])
+            for offset, row_values in enumerate(values):
+                while len(grid) < row0 + offset:
+                    grid.append([])
+                row = grid[row0 + offset - 1]
+                needed = col0 - 1 + len(row_values)
+                row.extend([""] * (needed - len(row)))
+                row[col0 - 1:needed] = row_values
+        return len(values)
+
+    def append(self, range_name, values):
+        tab = parse_a1(range_name)[0]
+        with self.lock:
+            grid = self.tabs.setdefault(tab, [])
+            last = len(grid)
+            while last and not any(grid[last - 1]):
+                last -= 1
+            del grid[last:]
+            grid.extend(list(row) for row in values)
+            return last + 1
+
+    def clear(self, range_name):
+        tab = parse_a1(range_name)[0]
+        with self.lock:
+            self.tabs[tab] = []
+
+    def row_count(self, tab):
+        with self.lock:
+            return len(self.tabs.get(tab, []))
+
+
+class _StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "Standin/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if not raw:
+            return {}
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return {}
+
+    def _reply(self, status, body, headers=()):
+        payload = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json" if not isinstance(body, bytes) else "text/plain")
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _handle(self, method):
+        server = self.server
+        body = self._read_json() if method in ("POST", "PUT") else {}
+        standin = server.standin
+        kind = standin.classify(method, self.path)
+        standin.count(kind)
+        delay = standin.delay()
+        if delay:
+            time.sleep(delay)
+        if kind != "token" and standin.should_fail():
+            standin.count("injected_error")
+            self._reply(standin.error_status, standin.error_body(), [("Retry-After", "0")])
+            return
+        status, response = standin.respond(method, self.path, body, kind)
+        self._reply(status, response)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+
+class _Standin:
+    """Base class: a threaded HTTP server with per-endpoint request counters."""
+
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0, error_status=500, host="127.0.0.1", port=0):
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._random = random.Random()
+        self.calls = Counter()
+        self._calls_lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), _StandinHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.standin = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, kind):
+        with self._calls_lock:
+            self.calls[kind] += 1
+
+    def delay(self):
+        if not self.jitter:
+            return self.latency
+        return self.latency + self._random.uniform(0, self.jitter)
+
+    def should_fail(self):
+        return self.error_rate > 0 and self._random.random() < self.error_rate
+
+    def error_body(self):
+        return {"error": {"code": self.error_status, "message": "Injected error", "status": "UNAVAILABLE"}}
+
+    def reset_counts(self):
+        with self._calls_lock:
+            self.calls.clear()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class SheetsStandin(_Standin):
+    """Google Sheets API v4 + OAuth token endpoint stand-in."""
+
+    def __init__(self, tabs=("Sheet1",), **kwargs):
+        super().__init__(**kwargs)
+        self.state = SheetsState(tabs)
+
+    def classify(self, method, path):
+        parts = urlsplit(path).path
+        if parts == "/token":
+            return "token"
+        if "/values/" in parts:
+            suffix = parts.rsplit(":", 1)[-1] if parts.endswith((":append", ":clear")) else None
+            return {"append": "values_append", "clear": "values_clear"}.get(suffix, f"values_{method.lower()}")
+        if parts.endswith(":batchUpdate"):
+            return "batch_update"
+        return "metadata"
+
+    def _metadata(self, spreadsheet_id):
+        sheets = []
+        for index, tab in enumerate(self.state.tabs):
+            sheets.append({"properties": {
+                "sheetId": index, "title": tab, "index": index, "sheetType": "GRID",
+                "gridProperties": {"rowCount": max(1000, self.state.row_count(tab) + 1000), "columnCount": 26},
+            }})
+        return {
+            "spreadsheetId": spreadsheet_id,
+            "properties": {"title": "Stand-in", "locale": "en_US", "timeZone": "America/New_York"},
+            "sheets": sheets,
+        }
+
+    def _batch_request(self, request):
+        if "deleteDimension" in request:
+            span = request["deleteDimension"]["range"]
+            with self.state.lock:
+                tab = list(self.state.tabs)[span["sheetId"]]
+                if span.get("dimension", "ROWS") == "ROWS":
+                    del self.state.tabs[tab][span["startIndex"]:span["endIndex"]]
+            return {}
+        if "addSheet" not in request:
+            return {}
+        title = request["addSheet"].get("properties", {}).get("title", f"Sheet{len(self.state.tabs) + 1}")
+        with self.state.lock:
+            self.state.tabs.setdefault(title, [])
+            index = list(self.state.tabs).index(title)
+        return {"addSheet": {"properties": {
+            "sheetId": index, "title": title, "index": index, "sheetType": "GRID",
+            "gridProperties": {"rowCount": 1000, "columnCount": 26},
+        }}}
+
+    def respond(self, method, path, body, kind):
+        split = urlsplit(path)
+        query = {key: values[-1] for key, values in parse_qs(split.query).items()}
+        if kind == "token":
+            return 200, {"access_token": "standin-token", "expires_in": 3600, "token_type": "Bearer"}
+
+        match = re.match(r"^/v4/spreadsheets/([^/:]+)(.*)$", split.path)
+        if not match:
+            return 404, {"error": {"code": 404, "message": "Not found", "status": "NOT_FOUND"}}
+        spreadsheet_id, rest = match.groups()
+        if kind == "metadata":
+            return 200, self._metadata(spreadsheet_id)
+        if kind == "batch_update":
+            return 200, {"spreadsheetId": spreadsheet_id,
+                         "replies": [self._batch_request(request) for request in body.get("requests", [])]}
+
+        range_name = unquote(rest[len("/values/"):])
+        if kind == "values_append":
+            range_name = range_name[:-len(":append")]
+            first_row = self.state.append(range_name, body.get("values", []))
+            return 200, {"spreadsheetId": spreadsheet_id, "updates": {"updatedRows": len(body.get("values", [])),
+                                                                      "updatedRange": f"A{first_row}"}}
+        if kind == "values_clear":
+            self.state.clear(range_name[:-len(":clear")])
+            return 200, {"spreadsheetId": spreadsheet_id, "clearedRange": range_name}
+        if kind == "values_put":
+            rows = self.state.write(range_name, body.get("values", []))
+            return 200, {"spreadsheetId": spreadsheet_id, "updatedRange": range_name, "updatedRows": rows}
+        values = self.state.read(range_name, query.get("majorDimension", "ROWS"))
+        response = {"range": range_name, "majorDimension": query.get("majorDimension", "ROWS")}
+        if values:
+            response["values"] = values
+        return 200, response
+
+
+class SlackStandin(_Standin):
+    """Slack incoming-webhook stand-in that records every message it receives."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.messages = []
+
+    def classify(self, method, path):
+        return "slack_post"
+
+    def error_body(self):
+        return b"injected_error"
+
+    def respond(self, method, path, body, kind):
+        self.messages.append(body)
+        return 200, b"ok"
+
+
+def fake_service_account(token_uri):
+    """Return a throwaway service-account JSON string whose token endpoint is ``token_uri``."""
+    import rsa
+
+    _, private_key = rsa.newkeys(1024)
+    return json.dumps({
+        "type": "service_account",
+        "project_id": "standin",
+        "private_key_id": "standin",
+        "private_key": private_key.save_pkcs1().decode("ascii"),
+        "client_email": "standin@standin.iam.gserviceaccount.com",
+        "client_id": "0",
+        "token_uri": token_uri,
+    })
+
+
+def state_paths(work_dir):
+    """Settings that keep every file the app writes under ``work_dir``.
+
+    The defaults are relative to the working directory, and the spool and
+    call store there are what a real server replays on startup.
+    """
+    return {
+        "LOG_FILE": os.path.join(work_dir, "ringba_webhook.log"),
+        "DELIVERY_QUEUE_PATH": os.path.join(work_dir, "delivery_queue.db"),
+        "SPOOL_DIR": os.path.join(work_dir, "spool"),
+        "CALL_STORE_PATH": os.path.join(work_dir, "calls.db"),
+        "IDEMPOTENCY_DB_PATH": os.path.join(work_dir, "idempotency.db"),
+        "ARCHIVE_DIR": os.path.join(work_dir, "archive"),
+        "ARCHIVE_LOCK_FILE": os.path.join(work_dir, "archiver.lock"),
+        "SHEET_LOCK_DIR": os.path.join(work_dir, "sheet_locks"),
+    }
@@ -0,0 +1,107 @@
+import datetime
+import json
+
+from timeutil import format_local, normalize_time
+
+# Every payload key we read, mapped to (CallRecord field, priority). When a
+# payload carries several spellings of one field the lowest priority wins,
+# matching the order the handler used to try them in.
+FIELD_ALIASES = {
+    "campaignName": ("campaign_name", 0),
+    "targetName": ("target_name", 0),
+    "callerId": ("caller_id", 0),
+    "callLengthFromConnect": ("call_length", 0),
+    "CallLengthFromConnect": ("call_length", 1),
+    "call_length_from_connect": ("call_length", 2),
+    "endCallSource": ("end_call_source", 0),
+    "EndCallSource": ("end_call_source", 1),
+    "end_call_source": ("end_call_source", 2),
+    "timestamp": ("timestamp", 0),
+    "callTime": ("timestamp", 1),
+    "callDate": ("timestamp", 2),
+    "callId": ("call_id", 0),
+    "inboundCallId": ("call_id", 1),
+    "call_id": ("call_id", 2),
+    "type": ("type", 0),
+    "challenge": ("challenge", 0),
+}
+
+# Example body sent back when Ringba posts an empty request
+EXPECTED_FORMAT = {
+    "campaignName": "SPANISH DEBT | 3.5 STANDARD | 01292025",
+    "targetName": "-no value- or actual target",
+    "callerId": "example_caller_id",
+    "callLengthFromConnect": 0,
+    "endCallSource": "system"
+}
+
+# Fields where an empty value means "not provided", so a later alias may fill it
+SKIP_EMPTY_FIELDS = frozenset(["timestamp", "call_id"])
+
+
+class CallRecord:
+    """Normalized view of a Ringba webhook payload."""
+
+    __slots__ = (
+        "campaign_name", "target_name", "caller_id", "call_length",
+        "end_call_source", "timestamp", "call_id", "type", "challenge",
+    )
+
+    def __init__(self):
+        self.campaign_name = ""
+        self.target_name = ""
+        self.caller_id = "Unknown"
+        self.call_length = None
+        self.end_call_source = None
+        self.timestamp = None
+        self.call_id = None
+        self.type = None
+        self.challenge = None
+
+    def __repr__(self):
+        return (f"CallRecord(campaign_name={self.campaign_name!r}, target_name={self.target_name!r}, "
+                f"caller_id={self.caller_id!r}, call_length={self.call_length!r})")
+
+
+def record_from_payload(payload):
+    """Resolve field aliases in a single pass over the payload's keys."""
+    record = CallRecord()
+    seen = {}
+    for key, value in payload.items():
+        alias = FIELD_ALIASES.get(key)
+        if alias is None:
+            continue
+        field, priority = alias
+        if field in SKIP_EMPTY_FIELDS and not value:
+            continue
+        if seen.get(field, priority + 1) <= priority:
+            continue
+        seen[field] = priority
+        setattr(record, field, value)
+    return record
+
+
+def parse_call(raw_body):
+    """Parse a raw request body into a CallRecord.
+
+    The body is decoded and parsed exactly once. Raises ``UnicodeDecodeError``
+    for undecodable bodies and ``ValueError`` for invalid or non-object JSON.
+    Returns None for an empty JSON object.
+    """
+    payload = json.loads(raw_body)
+    if not isinstance(payload, dict):
+        raise ValueError("JSON payload is not an object")
+    if not payload:
+        return None
+    return record_from_payload(payload)
+
+
+def resolve_time_of_call(record, received_at=None):
+    """Ringba's timestamp, else when the call was received (default: now), as local time in TIME_FORMAT.
+
+    Timestamps in a format parse_timestamp does not know are passed through
+    unchanged rather than replaced.
+    """
+    if record.timestamp:
+        return normalize_time(record.timestamp)
+    return format_local(received_at or datetime.datetime.now(datetime.UTC))
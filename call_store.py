@@ -0,0 +1,188 @@
+import datetime
+import logging
+import sqlite3
+import threading
+import time
+
+# Rollup granularities and the strftime pattern of their bucket labels (UTC)
+GRANULARITIES = {
+    "minute": "%Y-%m-%dT%H:%M",
+    "hour": "%Y-%m-%dT%H:00",
+    "day": "%Y-%m-%d",
+}
+
+
+def bucket_labels(received_at):
+    moment = datetime.datetime.fromtimestamp(received_at, datetime.UTC)
+    return {granularity: moment.strftime(pattern) for granularity, pattern in GRANULARITIES.items()}
+
+
+class CallStore:
+    """Local SQLite record of every processed and filtered call, with rollups.
+
+    Calls are indexed by time, campaign and call type. Next to them the store
+    keeps per-minute, per-hour and per-day counts by campaign, call type and
+    outcome, updated in the same transaction as the insert, so reports read
+    a few rollup rows instead of scanning calls. Records are buffered in
+    memory and written by a background thread every ``flush_seconds`` in one
+    transaction, keeping SQLite off the request path. Several gunicorn
+    workers can share one file (WAL mode). Calls and minute rollups older
+    than ``retention_days`` are pruned; hour and day rollups are kept.
+    """
+
+    def __init__(self, path, flush_seconds=1.0, retention_days=90):
+        self.path = path
+        self.flush_seconds = flush_seconds
+        self.retention_days = retention_days
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._last_prune = 0.0
+        self.stats = {"recorded": 0, "written": 0, "flushes": 0, "write_failures": 0, "pruned": 0}
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS calls ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " received_at REAL NOT NULL,"
+            " time_of_call TEXT,"
+            " caller_id TEXT,"
+            " campaign TEXT NOT NULL,"
+            " target TEXT,"
+            " call_type TEXT NOT NULL,"
+            " outcome TEXT NOT NULL,"
+            " call_id TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_calls_received ON calls (received_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_calls_campaign ON calls (campaign, received_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_calls_call_type ON calls (call_type, received_at)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rollups ("
+            " granularity TEXT NOT NULL,"
+            " bucket TEXT NOT NULL,"
+            " campaign TEXT NOT NULL,"
+            " call_type TEXT NOT NULL,"
+            " outcome TEXT NOT NULL,"
+            " count INTEGER NOT NULL,"
+            " PRIMARY KEY (granularity, bucket, campaign, call_type, outcome)) WITHOUT ROWID"
+        )
+
+    def record(self, outcome, campaign_name, call_type=None, caller_id=None, time_of_call=None,
+               target_name=None, call_id=None):
+        """Buffer one call; filtered calls have no call type."""
+        row = (time.time(), time_of_call, caller_id, campaign_name or "", target_name, call_type or "", outcome,
+               call_id)
+        with self._lock:
+            self._buffer.append(row)
+            self.stats["recorded"] += 1
+
+    def flush(self):
+        """Write buffered calls and their rollup increments in one transaction."""
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        if not rows:
+            return True
+
+        # Fold the batch into one increment per rollup row before touching the database
+        increments = {}
+        for received_at, _, _, campaign, _, call_type, outcome, _ in rows:
+            for granularity, bucket in bucket_labels(received_at).items():
+                key = (granularity, bucket, campaign, call_type, outcome)
+                increments[key] = increments.get(key, 0) + 1
+
+        with self._db_lock:
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self._conn.executemany(
+                        "INSERT INTO calls (received_at, time_of_call, caller_id, campaign, target, call_type,"
+                        " outcome, call_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        rows,
+                    )
+                    self._conn.executemany(
+                        "INSERT INTO rollups (granularity, bucket, campaign, call_type, outcome, count)"
+                        " VALUES (?, ?, ?, ?, ?, ?)"
+                        " ON CONFLICT (granularity, bucket, campaign, call_type, outcome)"
+                        " DO UPDATE SET count = count + excluded.count",
+                        [key + (count,) for key, count in increments.items()],
+                    )
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+            except sqlite3.Error as e:
+                with self._lock:
+                    self.stats["write_failures"] += 1
+                    # Keep the calls for the next flush rather than dropping them
+                    self._buffer[:0] = rows
+                logging.error(f"Could not write {len(rows)} calls to the call store: {str(e)}")
+                return False
+        with self._lock:
+            self.stats["written"] += len(rows)
+            self.stats["flushes"] += 1
+        return True
+
+    def prune(self):
+        if not self.retention_days:
+            return 0
+        cutoff = time.time() - self.retention_days * 86400
+        cutoff_minute = bucket_labels(cutoff)["minute"]
+        with self._db_lock:
+            deleted = self._conn.execute("DELETE FROM calls WHERE received_at < ?", (cutoff,)).rowcount
+            self._conn.execute("DELETE FROM rollups WHERE granularity = 'minute' AND bucket < ?", (cutoff_minute,))
+        with self._lock:
+            self.stats["pruned"] += deleted
+        return deleted
+
+    def rollups(self, granularity="hour", since=None, until=None, campaign=None, call_type=None):
+        """Counts per bucket between ``since`` and ``until`` (bucket labels, inclusive)."""
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown granularity {granularity!r}; use minute, hour or day")
+        query = "SELECT bucket, campaign, call_type, outcome, count FROM rollups WHERE granularity = ?"
+        params = [granularity]
+        if since:
+            query += " AND bucket >= ?"
+            params.append(since)
+        if until:
+            query += " AND bucket <= ?"
+            params.append(until)
+        if campaign is not None:
+            query += " AND campaign = ?"
+            params.append(campaign)
+        if call_type is not None:
+            query += " AND call_type = ?"
+            params.append(call_type)
+        query += " ORDER BY bucket"
+        with self._db_lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [
+            {"bucket": bucket, "campaign": campaign, "call_type": call_type, "outcome": outcome, "count": count}
+            for bucket, campaign, call_type, outcome, count in rows
+        ]
+
+    def _run(self):
+        while not self._stopping.wait(self.flush_seconds):
+            self.flush()
+            if time.monotonic() - self._last_prune >= 3600:
+                self._last_prune = time.monotonic()
+                try:
+                    self.prune()
+                except sqlite3.Error as e:
+                    logging.error(f"Could not prune the call store: {str(e)}")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="call-store", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, buffered=len(self._buffer), path=self.path)
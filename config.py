@@ -8,14 +8,134 @@ RINGBA_FILTERS = {
     "campaign_name": os.getenv("RINGBA_CAMPAIGN_NAME", "Your Campaign Name"),
     "target_name": os.getenv("RINGBA_TARGET_NAME", "Your Target Name")
 }
+# Opt-in: also log calls whose target is exactly RINGBA_TARGET_NAME (e.g. "-no value-") as No Value
+RINGBA_MATCH_TARGET_NAME = os.getenv("RINGBA_MATCH_TARGET_NAME", "False").lower() == "true"
+# 0819 target calls are only logged when they last this many seconds or less
+RINGBA_0819_TARGET_ID = os.getenv("RINGBA_0819_TARGET_ID", "TA7a8e20272b90487c8d420370c8477992")
+RINGBA_0819_MAX_SECONDS = int(os.getenv("RINGBA_0819_MAX_SECONDS", 30))
+# Optional JSON rule file replacing the rules above; re-read when it changes
+FILTER_RULES_FILE = os.getenv("FILTER_RULES_FILE", "")
+FILTER_RULES_RELOAD_SECONDS = float(os.getenv("FILTER_RULES_RELOAD_SECONDS", 5))
+
+# Times of call are converted to this zone (DST-aware) and written as "YYYY-MM-DD HH:MM:SS <zone>",
+# e.g. EST or EDT for the default
+CALL_TIMEZONE = os.getenv("CALL_TIMEZONE", "America/New_York")
+# Zone assumed for incoming timestamps that carry no offset or zone name
+NAIVE_TIMESTAMP_TIMEZONE = os.getenv("NAIVE_TIMESTAMP_TIMEZONE", CALL_TIMEZONE)
 
 # Google Sheets configuration
 GOOGLE_SHEET_ID = os.getenv("GOOGLE_SHEET_ID", "your_google_sheet_id_here")
 GOOGLE_SHEET_TAB = os.getenv("GOOGLE_SHEET_TAB", "Sheet1")
 GOOGLE_CREDS_FILE = os.getenv("GOOGLE_CREDS_FILE", "credentials.json")
+# Sharding: tab name template ({date}, {month}, {year}, {campaign}, {call_type}), e.g.
+# "Calls {date}" for one tab per day, and an optional JSON file routing calls by
+# campaign/call type to other spreadsheets or tabs (see sheet_routes.example.json)
+SHEET_TAB_TEMPLATE = os.getenv("SHEET_TAB_TEMPLATE", GOOGLE_SHEET_TAB)
+SHEET_ROUTES_FILE = os.getenv("SHEET_ROUTES_FILE", "")
+# Base URL of the Sheets REST API (only changed to point at a local stand-in)
+GOOGLE_SHEETS_API_URL = os.getenv("GOOGLE_SHEETS_API_URL", "https://sheets.googleapis.com").rstrip("/")
+# How often the in-memory row cursor re-reads Column A to re-sync with the sheet
+GOOGLE_SHEET_RESYNC_SECONDS = int(os.getenv("GOOGLE_SHEET_RESYNC_SECONDS", 300))
+# Per-tab lock files shared by appends from every process on this host; the archiver
+# holds a tab's exclusively while it deletes rows ("" = off; not available on Windows)
+SHEET_LOCK_DIR = os.getenv("SHEET_LOCK_DIR", "sheet_locks")
+# Circuit breaker: stop calling Sheets for a while after this many consecutive 429/5xx failures
+SHEETS_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("SHEETS_CIRCUIT_FAILURE_THRESHOLD", 5))
+SHEETS_CIRCUIT_RESET_SECONDS = float(os.getenv("SHEETS_CIRCUIT_RESET_SECONDS", 30))
+# Adaptive rate limit on Sheets requests per process (halved on 429, recovers on success)
+SHEETS_RATE_LIMIT_PER_SECOND = float(os.getenv("SHEETS_RATE_LIMIT_PER_SECOND", 5))
+SHEETS_RATE_LIMIT_BURST = int(os.getenv("SHEETS_RATE_LIMIT_BURST", 20))
+SHEETS_RATE_LIMIT_MIN_PER_SECOND = float(os.getenv("SHEETS_RATE_LIMIT_MIN_PER_SECOND", 0.5))
+SHEETS_RATE_LIMIT_MAX_WAIT_SECONDS = float(os.getenv("SHEETS_RATE_LIMIT_MAX_WAIT_SECONDS", 2))
+# Archival: move rows older than ARCHIVE_MAX_AGE_DAYS, or beyond ARCHIVE_MAX_ROWS, out of
+# the live tab into archive tabs ("tab") or gzip CSV files ("csv"). 0 interval = off.
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", 0))
+ARCHIVE_TABS = [tab.strip() for tab in os.getenv("ARCHIVE_TABS", GOOGLE_SHEET_TAB).split(",") if tab.strip()]
+ARCHIVE_MAX_AGE_DAYS = int(os.getenv("ARCHIVE_MAX_AGE_DAYS", 30))
+ARCHIVE_MAX_ROWS = int(os.getenv("ARCHIVE_MAX_ROWS", 5000))
+ARCHIVE_DESTINATION = os.getenv("ARCHIVE_DESTINATION", "tab").lower()
+ARCHIVE_TAB_TEMPLATE = os.getenv("ARCHIVE_TAB_TEMPLATE", "Archive {month}")
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+# Lock file that lets one process at a time archive (gunicorn workers, cron, the CLI)
+ARCHIVE_LOCK_FILE = os.getenv("ARCHIVE_LOCK_FILE", "archiver.lock")
+# Micro-batching: coalesce rows from concurrent deliveries into one Sheets write
+SHEETS_BATCH_ENABLED = os.getenv("SHEETS_BATCH_ENABLED", "False").lower() == "true"
+SHEETS_BATCH_MAX_ROWS = int(os.getenv("SHEETS_BATCH_MAX_ROWS", 50))
+SHEETS_BATCH_MAX_WAIT_MS = int(os.getenv("SHEETS_BATCH_MAX_WAIT_MS", 200))
+SHEETS_BATCH_MAX_PARALLEL = int(os.getenv("SHEETS_BATCH_MAX_PARALLEL", 4))  # Shards flushed at once
 
 # Slack configuration
 SLACK_WEBHOOK_URL = os.getenv("SLACK_WEBHOOK_URL", "https://hooks.slack.com/services/XXXX/YYYY/ZZZZ")
+SLACK_POOL_SIZE = int(os.getenv("SLACK_POOL_SIZE", 10))  # Keep-alive connections to Slack
+SLACK_MAX_RETRIES = int(os.getenv("SLACK_MAX_RETRIES", 3))  # Retries on 429/5xx
+SLACK_TEMPLATES_FILE = os.getenv("SLACK_TEMPLATES_FILE", "")  # Per-call-type alert templates (JSON)
+# When > 0, alerts received within this many seconds are merged into one message
+SLACK_DIGEST_SECONDS = float(os.getenv("SLACK_DIGEST_SECONDS", 0))
+
+# Ingest mode: "sync" writes to Sheets/Slack before responding, "async" queues the
+# call durably, answers 202 immediately and delivers from background workers
+INGEST_MODE = os.getenv("INGEST_MODE", "sync").lower()
+# How the app factory serves webhooks: "sync" one request at a time, "threaded" a
+# thread per request (both deliver before responding), "async" as INGEST_MODE=async
+WORKER_MODEL = os.getenv("WORKER_MODEL", "async" if INGEST_MODE == "async" else "threaded").lower()
+# Request threads per gunicorn worker for the threaded and async models
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", 8))
+DELIVERY_QUEUE_PATH = os.getenv("DELIVERY_QUEUE_PATH", "delivery_queue.db")
+DELIVERY_WORKERS = int(os.getenv("DELIVERY_WORKERS", 4))
+DELIVERY_MAX_ATTEMPTS = int(os.getenv("DELIVERY_MAX_ATTEMPTS", 8))
+DELIVERY_BACKOFF_SECONDS = float(os.getenv("DELIVERY_BACKOFF_SECONDS", 2))
+
+# Write-ahead spool (sync ingest): every qualifying call is written to local segment
+# files before delivery and replayed in bulk if Sheets is down or the process restarts
+SPOOL_ENABLED = os.getenv("SPOOL_ENABLED", "True").lower() == "true"
+SPOOL_DIR = os.getenv("SPOOL_DIR", "spool")
+SPOOL_SEGMENT_MAX_BYTES = int(os.getenv("SPOOL_SEGMENT_MAX_BYTES", 4 * 1024 * 1024))
+SPOOL_REPLAY_BATCH = int(os.getenv("SPOOL_REPLAY_BATCH", 500))
+SPOOL_RETRY_SECONDS = float(os.getenv("SPOOL_RETRY_SECONDS", 30))
+
+# Duplicate suppression for Ringba retries (keyed on call ID or callerId + timestamp)
+IDEMPOTENCY_ENABLED = os.getenv("IDEMPOTENCY_ENABLED", "True").lower() == "true"
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", 10000))
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", 86400))
+IDEMPOTENCY_DB_PATH = os.getenv("IDEMPOTENCY_DB_PATH", "")  # Empty = in-memory only
+
+# Local call store: every processed and filtered call plus per-minute/hour/day
+# rollups in SQLite, served by /stats so dashboards do not read the Sheet
+CALL_STORE_ENABLED = os.getenv("CALL_STORE_ENABLED", "True").lower() == "true"
+CALL_STORE_PATH = os.getenv("CALL_STORE_PATH", "calls.db")
+CALL_STORE_RETENTION_DAYS = int(os.getenv("CALL_STORE_RETENTION_DAYS", 90))  # 0 = keep forever
+
+# Readiness: Sheets and Slack are probed in the background and /ready serves the
+# cached result; it answers 503 unless every required probe passed its last check
+READY_PROBE_INTERVAL_SECONDS = float(os.getenv("READY_PROBE_INTERVAL_SECONDS", 60))
+READY_REQUIRED_PROBES = [
+    name.strip() for name in os.getenv("READY_REQUIRED_PROBES", "google_sheets").split(",") if name.strip()
+]
+
+# Shutdown: on SIGTERM, new webhooks get 503 while in-flight requests, batches,
+# queue workers and the spool drain for at most this long
+SHUTDOWN_DRAIN_SECONDS = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", 25))
+
+# Diagnostics: webhooks slower than SLOW_REQUEST_MS are kept with a per-stage timing
+# breakdown (0 = off). /admin/slow-requests and /admin/profile need the X-Admin-Token
+# header and are disabled while ADMIN_TOKEN is empty. With PROFILE_SIGNAL_ENABLED,
+# SIGUSR2 to a worker profiles its requests for PROFILE_SECONDS and logs the report.
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", 2000))
+SLOW_REQUEST_BUFFER = int(os.getenv("SLOW_REQUEST_BUFFER", 100))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+PROFILE_SIGNAL_ENABLED = os.getenv("PROFILE_SIGNAL_ENABLED", "False").lower() == "true"
+PROFILE_SECONDS = float(os.getenv("PROFILE_SECONDS", 30))
+
+# Logging: JSON lines written from a background thread, rotated by size
+LOG_FILE = os.getenv("LOG_FILE", "ringba_webhook.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 5))
+# "size" rotates by LOG_MAX_BYTES in-process; "external" only reopens the file after
+# logrotate moves it, for several processes sharing it (default: external under gunicorn)
+LOG_ROTATION = os.getenv("LOG_ROTATION", "").lower()
+# Fraction of requests whose raw body is logged (1.0 = every request)
+LOG_BODY_SAMPLE_RATE = float(os.getenv("LOG_BODY_SAMPLE_RATE", 0.1))
 
 # Flask configuration for local server
 FLASK_ENV = os.getenv("FLASK_ENV", "production")  # Changed to production for server
@@ -0,0 +1,172 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+
+class DeliveryQueue:
+    """Durable local queue that hands accepted calls to background workers.
+
+    Jobs are stored in a SQLite file (WAL mode) so nothing accepted is lost if
+    the process restarts. A worker claims a job by leasing it; if the worker
+    dies the lease expires and another worker picks the job up again. Failed
+    deliveries are retried with exponential backoff until ``max_attempts`` is
+    reached, after which the job is kept with status ``failed`` for inspection.
+    """
+
+    def __init__(self, path, handler, workers=4, max_attempts=8, backoff_seconds=2.0,
+                 max_backoff_seconds=300.0, lease_seconds=120.0):
+        self.path = path
+        self.handler = handler
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._active = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS deliveries ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " payload TEXT NOT NULL,"
+            " status TEXT NOT NULL DEFAULT 'pending',"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " next_attempt_at REAL NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_error TEXT)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_deliveries_due ON deliveries (status, next_attempt_at)"
+        )
+
+    def enqueue(self, payload):
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO deliveries (payload, next_attempt_at, created_at) VALUES (?, ?, ?)",
+                (json.dumps(payload), now, now),
+            )
+        self._wakeup.set()
+        return cursor.lastrowid
+
+    def _claim(self):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id, payload, attempts FROM deliveries"
+                    " WHERE status IN ('pending', 'inflight') AND next_attempt_at <= ?"
+                    " ORDER BY next_attempt_at LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE deliveries SET status = 'inflight', attempts = attempts + 1,"
+                        " next_attempt_at = ? WHERE id = ?",
+                        (now + self.lease_seconds, row[0]),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return row[0], json.loads(row[1]), row[2] + 1
+
+    def _complete(self, job_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM deliveries WHERE id = ?", (job_id,))
+
+    def _reschedule(self, job_id, attempts, error):
+        if attempts >= self.max_attempts:
+            logging.error(f"Delivery {job_id} failed after {attempts} attempts, giving up: {error}")
+            with self._lock:
+                self._conn.execute(
+                    "UPDATE deliveries SET status = 'failed', last_error = ? WHERE id = ?",
+                    (error, job_id),
+                )
+            return
+        delay = min(self.backoff_seconds * (2 ** (attempts - 1)), self.max_backoff_seconds)
+        logging.warning(f"Delivery {job_id} failed (attempt {attempts}), retrying in {delay:.0f}s: {error}")
+        with self._lock:
+            self._conn.execute(
+                "UPDATE deliveries SET status = 'pending', next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (time.time() + delay, error, job_id),
+            )
+
+    def _run_worker(self):
+        while not self._stopping.is_set():
+            try:
+                job = self._claim()
+            except Exception as e:
+                logging.error(f"Error claiming delivery job: {str(e)}")
+                job = None
+            if job is None:
+                self._wakeup.wait(1.0)
+                self._wakeup.clear()
+                continue
+            job_id, payload, attempts = job
+            with self._lock:
+                self._active += 1
+            try:
+                delivered = self.handler(payload)
+                error = None if delivered else "handler reported failure"
+            except Exception as e:
+                delivered = False
+                error = str(e)
+            if delivered:
+                self._complete(job_id)
+            else:
+                self._reschedule(job_id, attempts, error)
+            with self._lock:
+                self._active -= 1
+
+    def start(self):
+        if self._threads:
+            return
+        self._stopping.clear()
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run_worker, name=f"delivery-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logging.info(f"Started {self.workers} delivery workers on {self.path}")
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def drain(self, timeout):
+        """Keep delivering due jobs for up to ``timeout`` seconds, then stop the workers.
+
+        Jobs that are not delivered by then, or are waiting out a retry
+        backoff, stay in the database for the next process to pick up.
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                due = self._conn.execute(
+                    "SELECT COUNT(*) FROM deliveries WHERE status = 'pending' AND next_attempt_at <= ?",
+                    (time.time(),),
+                ).fetchone()[0]
+                if not due and not self._active:
+                    break
+            time.sleep(0.05)
+        self.stop(max(0.0, deadline - time.monotonic()))
+
+    def depth(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM deliveries GROUP BY status").fetchall()
+        counts = {"pending": 0, "inflight": 0, "failed": 0}
+        counts.update(dict(rows))
+        return counts
@@ -0,0 +1,157 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from config import (
+    RINGBA_FILTERS, RINGBA_MATCH_TARGET_NAME, RINGBA_0819_TARGET_ID, RINGBA_0819_MAX_SECONDS,
+    FILTER_RULES_FILE, FILTER_RULES_RELOAD_SECONDS
+)
+
+
+def default_rules(match_target_name=RINGBA_MATCH_TARGET_NAME):
+    """Rules equivalent to the original hard-coded filter.
+
+    1. 0819 Target: campaign matches AND target is the 0819 target ID AND call length <= 30 seconds
+    2. True No Value: campaign matches AND target is empty/null (no target assigned)
+
+    With ``match_target_name`` (RINGBA_MATCH_TARGET_NAME), calls whose target
+    equals RINGBA_TARGET_NAME (e.g. "-no value-") are No Value calls too,
+    unless that name is the 0819 target, whose duration limit always applies.
+    """
+    campaign = RINGBA_FILTERS["campaign_name"]
+    rules = [
+        {"campaign": campaign, "target": RINGBA_0819_TARGET_ID, "call_type": "0819 Call",
+         "max_duration": RINGBA_0819_MAX_SECONDS},
+        {"campaign": campaign, "target": "", "call_type": "No Value"},
+    ]
+    target_name = normalize_target(RINGBA_FILTERS["target_name"])
+    if match_target_name and target_name and target_name != normalize_target(RINGBA_0819_TARGET_ID):
+        rules.append({"campaign": campaign, "target": target_name, "call_type": "No Value"})
+    return rules
+
+
+def normalize_target(target_name):
+    # Empty, null and whitespace-only targets all mean "no target assigned"
+    if not target_name:
+        return ""
+    return str(target_name).strip()
+
+
+def _parse_duration(call_length_from_connect):
+    if call_length_from_connect is None:
+        return None
+    try:
+        return int(call_length_from_connect)
+    except (ValueError, TypeError):
+        return None
+
+
+def compile_rules(rules):
+    """Compile a list of rule dicts into a campaign -> target -> ranges index.
+
+    Each rule needs ``campaign``, ``target`` and ``call_type`` and may set
+    ``min_duration``/``max_duration`` (seconds, inclusive). Several rules may
+    share a campaign/target pair as long as their duration ranges differ.
+    """
+    index = {}
+    for rule in rules:
+        campaign = rule["campaign"]
+        target = normalize_target(rule.get("target", ""))
+        entry = (rule.get("min_duration"), rule.get("max_duration"), rule["call_type"])
+        targets = index.setdefault(campaign, {})
+        if entry not in targets.setdefault(target, []):
+            targets[target].append(entry)
+    # Tuples keep the per-target lists immutable once published
+    return {campaign: {target: tuple(ranges) for target, ranges in targets.items()}
+            for campaign, targets in index.items()}
+
+
+class FilterEngine:
+    """Evaluates calls against compiled filter rules in O(1).
+
+    Rules come from a JSON file (``{"rules": [...]}``) when ``path`` is set,
+    otherwise from ``default_rules()``. The file's modification time is
+    checked at most every ``reload_interval`` seconds and the rules are
+    recompiled when it changes, so edits take effect without a restart.
+    """
+
+    def __init__(self, path=None, reload_interval=5):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._reload_lock = threading.Lock()
+        self._checked_at = 0.0
+        self._mtime = None
+        self._index = compile_rules(default_rules())
+        if path:
+            self._load()
+
+    def _load(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+            if mtime == self._mtime:
+                return
+            with open(self.path) as f:
+                rules = json.load(f)["rules"]
+            self._index = compile_rules(rules)
+            self._mtime = mtime
+            logging.info(f"Loaded {len(rules)} filter rules from {self.path}")
+        except Exception as e:
+            # Keep serving the last good rule set
+            logging.error(f"Could not load filter rules from {self.path}: {str(e)}")
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        if not self._reload_lock.acquire(blocking=False):
+            return
+        try:
+            self._checked_at = now
+            self._load()
+        finally:
+            self._reload_lock.release()
+
+    def classify(self, campaign_name, target_name, call_length_from_connect=None):
+        """Return the call type of the first matching rule, or None if the call is filtered out."""
+        if self.path:
+            self._maybe_reload()
+        targets = self._index.get(campaign_name)
+        if targets is None:
+            return None
+        ranges = targets.get(normalize_target(target_name))
+        if ranges is None:
+            return None
+        duration = _parse_duration(call_length_from_connect)
+        for min_duration, max_duration, call_type in ranges:
+            if min_duration is None and max_duration is None:
+                return call_type
+            if duration is None:
+                continue
+            if min_duration is not None and duration < min_duration:
+                continue
+            if max_duration is not None and duration > max_duration:
+                continue
+            return call_type
+        return None
+
+    def summary(self):
+        index = self._index
+        return {
+            "source": self.path or "defaults",
+            "campaigns": len(index),
+            "targets": sum(len(targets) for targets in index.values()),
+        }
+
+
+engine = FilterEngine(FILTER_RULES_FILE or None, FILTER_RULES_RELOAD_SECONDS)
+
+
+def classify_call(campaign_name, target_name, call_length_from_connect=None):
+    return engine.classify(campaign_name, target_name, call_length_from_connect)
+
+
+def passes_filter(campaign_name, target_name, call_length_from_connect=None, end_call_source=None):
+    """Check if the call matches any configured filter rule."""
+    return classify_call(campaign_name, target_name, call_length_from_connect) is not None
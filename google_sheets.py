@@ -2,57 +2,290 @@ import datetime
 import gspread
 import json
 import os
+import threading
+import requests
+from google.auth.exceptions import RefreshError, TransportError
+from google.auth.transport.requests import AuthorizedSession, Request
 from google.oauth2.service_account import Credentials
-from config import GOOGLE_SHEET_ID, GOOGLE_SHEET_TAB, GOOGLE_CREDS_FILE
+from config import (
+    GOOGLE_SHEET_ID, GOOGLE_SHEET_TAB, GOOGLE_CREDS_FILE, GOOGLE_SHEET_RESYNC_SECONDS, GOOGLE_SHEETS_API_URL,
+    SHEETS_CIRCUIT_FAILURE_THRESHOLD, SHEETS_CIRCUIT_RESET_SECONDS, SHEETS_RATE_LIMIT_PER_SECOND,
+    SHEETS_RATE_LIMIT_BURST, SHEETS_RATE_LIMIT_MIN_PER_SECOND, SHEETS_RATE_LIMIT_MAX_WAIT_SECONDS, SHEET_LOCK_DIR
+)
+from sheet_cursor import RowCursor, rows_lock_file
+from sheets_guard import (
+    AdaptiveRateLimiter, CircuitBreaker, RateLimitTimeout, TRANSIENT_STATUS_CODES, parse_retry_after
+)
+from metrics import google_api_errors, stage_duration
 import logging
 
 SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
+DEFAULT_SHEETS_API_URL = "https://sheets.googleapis.com"
 
-def append_row_to_sheet(time_of_call, caller_id, call_type=""):
+# Define correct headers - now including Call Type
+SHEET_HEADERS = ["Time of call", "CallerID", "Call Type", "Agent Name", "Status", "Notes"]
+
+# Refresh the access token this long before it actually expires so no webhook
+# ever pays for the OAuth round trip inline
+TOKEN_REFRESH_MARGIN = datetime.timedelta(minutes=5)
+
+# Status codes that mean the cached client/worksheet handle is no longer usable
+REBUILD_STATUS_CODES = (401, 403, 404)
+
+# Rows reserved for a tab created on demand
+NEW_TAB_ROWS = 1000
+
+# Process-wide client cache, shared by all request threads. Worksheet handles and
+# row cursors are kept per (spreadsheet ID, tab) shard.
+_cache_lock = threading.Lock()
+_cache = {"creds": None, "client": None, "spreadsheets": {}, "shards": {}}
+# Row cursors outlive cache invalidation: they know which rows writes in flight hold
+_cursors = {}
+_cache_stats = {"hits": 0, "misses": 0, "token_refreshes": 0, "invalidations": 0}
+
+# Process-wide protection: every Sheets request takes a rate-limiter token, and
+# writes are refused outright while the circuit is open
+circuit_breaker = CircuitBreaker(
+    failure_threshold=SHEETS_CIRCUIT_FAILURE_THRESHOLD,
+    reset_seconds=SHEETS_CIRCUIT_RESET_SECONDS
+)
+rate_limiter = AdaptiveRateLimiter(
+    max_rate=SHEETS_RATE_LIMIT_PER_SECOND,
+    burst=SHEETS_RATE_LIMIT_BURST,
+    min_rate=SHEETS_RATE_LIMIT_MIN_PER_SECOND,
+    max_wait=SHEETS_RATE_LIMIT_MAX_WAIT_SECONDS
+)
+# Tokens a thread took ahead of its next requests (see append_rows_to_sheet)
+_prepaid = threading.local()
+
+
+def load_credentials():
+    # Try to get credentials from environment variable first (for deployment)
+    creds_json = os.getenv('GOOGLE_CREDS_JSON')
+    if creds_json:
+        return Credentials.from_service_account_info(json.loads(creds_json), scopes=SCOPES)
+    # Fall back to file-based credentials (for local development)
+    return Credentials.from_service_account_file(GOOGLE_CREDS_FILE, scopes=SCOPES)
+
+
+class _GuardedSession(AuthorizedSession):
+    """AuthorizedSession that meters every Sheets request through the rate limiter.
+
+    429 responses slow the limiter down and successes speed it back up. When
+    GOOGLE_SHEETS_API_URL is overridden (e.g. to run against the local Sheets
+    stand-in in benchmarks/) requests are sent there instead.
+    """
+
+    def request(self, method, url, *args, **kwargs):
+        if getattr(_prepaid, "requests", 0):
+            _prepaid.requests -= 1
+        else:
+            rate_limiter.acquire()
+        if url.startswith(DEFAULT_SHEETS_API_URL) and GOOGLE_SHEETS_API_URL != DEFAULT_SHEETS_API_URL:
+            url = GOOGLE_SHEETS_API_URL + url[len(DEFAULT_SHEETS_API_URL):]
+        response = super().request(method, url, *args, **kwargs)
+        if response.status_code == 429:
+            rate_limiter.throttled(parse_retry_after(response.headers.get("Retry-After")))
+        elif response.status_code < 400:
+            rate_limiter.succeeded()
+        return response
+
+
+def _authorize(creds):
+    return gspread.Client(auth=creds, session=_GuardedSession(creds))
+
+
+def token_expiring(creds):
+    if not creds.token or creds.expiry is None:
+        return True
+    # google-auth keeps expiry as a naive UTC datetime
+    now = datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+    return creds.expiry - now <= TOKEN_REFRESH_MARGIN
+
+
+def _open_worksheet(client, sheet_id, tab, create=True):
+    # Caller holds _cache_lock
+    spreadsheet = _cache["spreadsheets"].get(sheet_id)
+    if spreadsheet is None:
+        spreadsheet = _cache["spreadsheets"][sheet_id] = client.open_by_key(sheet_id)
+    try:
+        return spreadsheet.worksheet(tab)
+    except gspread.exceptions.WorksheetNotFound:
+        if not create:
+            raise
     try:
-        # Try to get credentials from environment variable first (for deployment)
-        creds_json = os.getenv('GOOGLE_CREDS_JSON')
-        if creds_json:
-            creds = Credentials.from_service_account_info(json.loads(creds_json), scopes=SCOPES)
+        sheet = spreadsheet.add_worksheet(title=tab, rows=NEW_TAB_ROWS, cols=len(SHEET_HEADERS))
+        logging.info("Created worksheet '%s' in spreadsheet %s", tab, sheet_id)
+        return sheet
+    except gspread.exceptions.APIError:
+        # Another worker created it first
+        return spreadsheet.worksheet(tab)
+
+
+def _get_cached(sheet_id=None, tab=None, create=True):
+    key = (sheet_id or GOOGLE_SHEET_ID, tab or GOOGLE_SHEET_TAB)
+    with _cache_lock:
+        creds = _cache["creds"]
+        if creds is None:
+            with stage_duration.time("sheets_auth"):
+                creds = load_credentials()
+                _cache.update(creds=creds, client=_authorize(creds))
+            logging.info("Built Google Sheets client")
+        elif token_expiring(creds):
+            with stage_duration.time("sheets_auth"):
+                creds.refresh(Request())
+            _cache_stats["token_refreshes"] += 1
+
+        shard = _cache["shards"].get(key)
+        if shard is not None:
+            _cache_stats["hits"] += 1
+            return shard
+
+        _cache_stats["misses"] += 1
+        with stage_duration.time("sheets_open"):
+            sheet = _open_worksheet(_cache["client"], *key, create=create)
+        cursor = _cursors.get(key)
+        if cursor is None:
+            cursor = _cursors[key] = RowCursor(
+                sheet, SHEET_HEADERS, GOOGLE_SHEET_RESYNC_SECONDS, rows_lock_file(SHEET_LOCK_DIR, *key)
+            )
         else:
-            # Fall back to file-based credentials (for local development)
-            creds = Credentials.from_service_account_file(GOOGLE_CREDS_FILE, scopes=SCOPES)
-        
-        client = gspread.authorize(creds)
-        sheet = client.open_by_key(GOOGLE_SHEET_ID).worksheet(GOOGLE_SHEET_TAB)
-        
-        # Define correct headers - now including Call Type
-        correct_headers = ["Time of call", "CallerID", "Call Type", "Agent Name", "Status", "Notes"]
-        
-        # Check if headers exist and are correct
+            cursor.rebind(sheet)
+        shard = _cache["shards"][key] = (sheet, cursor)
+        logging.info("Opened worksheet '%s' of spreadsheet %s", key[1], key[0])
+        return shard
+
+
+def get_worksheet(sheet_id=None, tab=None, create=True):
+    """Return the cached worksheet handle, building it on first use.
+
+    The credentials and authorized client are shared by every thread in the
+    process, as are the worksheet handle and row cursor of each (spreadsheet,
+    tab) shard. Tabs that do not exist yet are created, unless ``create`` is
+    False, which raises gspread's WorksheetNotFound instead. The access
+    token is refreshed ahead of expiry.
+    """
+    return _get_cached(sheet_id, tab, create)[0]
+
+
+def get_shard(sheet_id=None, tab=None):
+    """Return the cached (worksheet, row cursor) pair of a shard."""
+    return _get_cached(sheet_id, tab)
+
+
+def probe_sheets(sheet_id=None, tab=None):
+    """Check that the credentials work and the default worksheet is reachable; raises if not.
+
+    Reads only the spreadsheet ID from the metadata endpoint, the cheapest
+    call that still proves auth and access to the spreadsheet.
+    """
+    try:
+        get_worksheet(sheet_id, tab).spreadsheet.fetch_sheet_metadata({"fields": "spreadsheetId"})
+    except Exception as e:
+        _handle_sheet_error(e)
+        raise
+
+
+def invalidate_sheet_cache():
+    """Drop the cached client so the next call re-authorizes and re-opens its sheet.
+
+    Row cursors are kept and re-bound to the new worksheet handles, so rows
+    reserved by writes still in flight are not handed out again.
+    """
+    with _cache_lock:
+        _cache.update(creds=None, client=None, spreadsheets={}, shards={})
+        _cache_stats["invalidations"] += 1
+
+
+def get_cache_stats():
+    with _cache_lock:
+        stats = dict(_cache_stats)
+        shards = dict(_cache["shards"])
+    stats["row_cursors"] = {f"{sheet_id}!{tab}": cursor.snapshot() for (sheet_id, tab), (_, cursor) in shards.items()}
+    return stats
+
+
+def get_guard_state():
+    return {"circuit": circuit_breaker.snapshot(), "rate_limiter": rate_limiter.snapshot()}
+
+
+def _is_transient(e):
+    """True for failures that mean Google is throttling or unreachable."""
+    if isinstance(e, gspread.exceptions.APIError):
+        return e.response.status_code in TRANSIENT_STATUS_CODES
+    return isinstance(e, (requests.ConnectionError, requests.Timeout, TransportError))
+
+
+def _handle_sheet_error(e):
+    """Count API errors and invalidate the cache when the handle itself went stale."""
+    if isinstance(e, RefreshError):
+        invalidate_sheet_cache()
+    elif isinstance(e, gspread.exceptions.APIError):
+        google_api_errors.inc(str(e.response.status_code))
+        if e.response.status_code in REBUILD_STATUS_CODES:
+            invalidate_sheet_cache()
+
+
+def build_row(time_of_call, caller_id, call_type=""):
+    # Agent Name, Status and Notes are left blank for manual entry
+    return [time_of_call, caller_id, call_type, "", "", ""]
+
+
+def append_rows_to_sheet(rows, sheet_id=None, tab=None):
+    """Write several rows below the last filled row of a tab with a single range update.
+
+    ``sheet_id``/``tab`` default to GOOGLE_SHEET_ID/GOOGLE_SHEET_TAB.
+    """
+    if not rows:
+        return True
+    if not circuit_breaker.allow():
+        logging.warning("Sheets circuit is open; not writing %d rows", len(rows))
+        return False
+    cursor = None
+    try:
+        sheet, cursor = _get_cached(sheet_id, tab)
+        # Pay for the guard read and the write before any rows are reserved, so
+        # a busy limiter refuses the append up front instead of leaving a hole
+        rate_limiter.acquire(2)
+        _prepaid.requests = 2
         try:
-            existing_headers = sheet.row_values(1)
-            if not existing_headers or existing_headers != correct_headers:
-                # Clear the sheet and add correct headers
-                sheet.clear()
-                sheet.append_row(correct_headers)
-                logging.info("Created correct headers in Google Sheet")
-        except Exception as e:
-            # If there's an error reading headers, clear and create new ones
-            sheet.clear()
-            sheet.append_row(correct_headers)
-            logging.info("Created correct headers in Google Sheet (after error)")
-        
-        # Find next empty row by checking ONLY Column A (ignore formulas in other columns)
-        col_a_values = sheet.col_values(1)  # Get only Column A values
-        next_row = len([val for val in col_a_values if val]) + 1
-        
-        # Explicitly write to specific columns - this bypasses append_row() confusion
-        sheet.update(f'A{next_row}', time_of_call)
-        sheet.update(f'B{next_row}', caller_id)
-        sheet.update(f'C{next_row}', call_type)
-        sheet.update(f'D{next_row}', "")  # Agent Name
-        sheet.update(f'E{next_row}', "")  # Status
-        sheet.update(f'F{next_row}', "")  # Notes
-        
-        logging.info(f"Successfully appended row {next_row} for caller {caller_id} with call type {call_type}")
+            first_row = cursor.reserve(len(rows))
+            last_row = first_row + len(rows) - 1
+
+            # Write the rows with one explicit A:F range update - this bypasses
+            # append_row() confusion and costs a single API request
+            try:
+                sheet.update(f'A{first_row}:F{last_row}', rows)
+            finally:
+                cursor.release(first_row)
+        finally:
+            _prepaid.requests = 0
+        circuit_breaker.record_success()
+
+        logging.info(f"Successfully appended rows {first_row}-{last_row} ({len(rows)} rows)")
         return True
-        
+
+    except RateLimitTimeout as e:
+        # Nothing was sent, so the cursor is still right; a reservation given up
+        # here is found empty by the next guard read
+        circuit_breaker.release()
+        logging.error(f"Error appending to Google Sheet: {str(e)}")
+        return False
+
     except Exception as e:
+        if _is_transient(e):
+            circuit_breaker.record_failure()
+        else:
+            circuit_breaker.release()
+        if cursor is not None:
+            cursor.invalidate()
+        _handle_sheet_error(e)
         logging.error(f"Error appending to Google Sheet: {str(e)}")
         return False
+
+
+def append_row_to_sheet(time_of_call, caller_id, call_type="", sheet_id=None, tab=None):
+    if not append_rows_to_sheet([build_row(time_of_call, caller_id, call_type)], sheet_id, tab):
+        return False
+    logging.info(f"Successfully appended row for caller {caller_id} with call type {call_type}")
+    return True
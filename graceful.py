@@ -0,0 +1,80 @@
+import logging
+import threading
+import time
+
+
+class GracefulShutdown:
+    """Stops taking webhooks and drains background work within a deadline.
+
+    Request handlers call ``begin()``/``end()`` around each webhook; once
+    ``run()`` starts, ``begin()`` returns False so new webhooks can be turned
+    away (Ringba retries them against another worker). ``run()`` then waits
+    for in-flight webhooks and calls each registered drain step in order
+    with the time left until ``deadline_seconds``. Whatever a step cannot
+    finish in time must already be durable (queue database, spool segments)
+    so the next process picks it up.
+    """
+
+    def __init__(self, deadline_seconds=25.0):
+        self.deadline_seconds = deadline_seconds
+        self._steps = []
+        self._cond = threading.Condition()
+        self._inflight = 0
+        self._draining = False
+        self.stats = {"rejected": 0, "drain_seconds": None, "steps": {}}
+
+    @property
+    def draining(self):
+        return self._draining
+
+    def add_step(self, name, step):
+        """Register ``step(timeout)`` to run during shutdown, after earlier steps."""
+        self._steps.append((name, step))
+
+    def begin(self):
+        """Register an incoming request; returns False once shutdown has started."""
+        with self._cond:
+            if self._draining:
+                self.stats["rejected"] += 1
+                return False
+            self._inflight += 1
+            return True
+
+    def end(self):
+        with self._cond:
+            self._inflight -= 1
+            if not self._inflight:
+                self._cond.notify_all()
+
+    def run(self):
+        """Drain and stop everything once; later calls return immediately."""
+        with self._cond:
+            if self._draining:
+                return
+            self._draining = True
+        started = time.monotonic()
+        deadline = started + self.deadline_seconds
+        logging.warning("Shutting down: draining in-flight work for up to %.0fs", self.deadline_seconds)
+
+        with self._cond:
+            while self._inflight and deadline > time.monotonic():
+                self._cond.wait(deadline - time.monotonic())
+            if self._inflight:
+                logging.error("%d webhook requests still running at the drain deadline", self._inflight)
+
+        for name, step in self._steps:
+            step_started = time.monotonic()
+            try:
+                step(max(0.0, deadline - step_started))
+                outcome = "ok"
+            except Exception as e:
+                outcome = "error"
+                logging.exception("Shutdown step %s failed: %s", name, e)
+            self.stats["steps"][name] = {"outcome": outcome, "seconds": round(time.monotonic() - step_started, 3)}
+
+        self.stats["drain_seconds"] = round(time.monotonic() - started, 3)
+        logging.warning("Shutdown drain finished in %.1fs", self.stats["drain_seconds"])
+
+    def snapshot(self):
+        with self._cond:
+            return dict(self.stats, draining=self._draining, inflight=self._inflight)
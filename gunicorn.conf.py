@@ -0,0 +1,32 @@
+"""
+gunicorn settings, read automatically when gunicorn starts in this directory.
+
+WORKER_MODEL picks the worker class the same way it picks Flask's
+built-in server: "sync" serves one request at a time per worker, "threaded"
+and "async" run WORKER_THREADS request threads per worker (gthread).
+
+On SIGTERM (deploys, restarts) each worker stops accepting connections and
+finishes its current requests, then worker_exit drains the batch writer,
+delivery queue, spool and Slack digest before the process exits.
+"""
+
+import sys
+
+from config import SHUTDOWN_DRAIN_SECONDS, WORKER_MODEL, WORKER_THREADS
+
+if WORKER_MODEL == "sync":
+    # The app skips micro-batching too, since one request at a time has nothing to coalesce
+    worker_class = "sync"
+    threads = 1
+else:
+    worker_class = "gthread"
+    threads = WORKER_THREADS
+
+# Leave the drain time to finish before gunicorn kills the worker
+graceful_timeout = int(SHUTDOWN_DRAIN_SECONDS) + 5
+
+
+def worker_exit(server, worker):
+    app_factory = sys.modules.get("app_factory")
+    if app_factory is not None:
+        app_factory.shutdown()
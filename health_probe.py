@@ -0,0 +1,100 @@
+import datetime
+import json
+import logging
+import threading
+import time
+
+
+def _now_iso():
+    return datetime.datetime.now(datetime.UTC).isoformat(timespec="seconds")
+
+
+class DependencyProber:
+    """Checks external dependencies on a schedule and caches the answer.
+
+    ``probes`` maps a dependency name to a callable that raises on failure.
+    A background thread runs every probe each ``interval_seconds`` and
+    records whether it passed, its latency, when it was checked and when it
+    last succeeded. The readiness response (JSON body and status code) is
+    rendered once per round, so serving it costs no I/O or API quota. The
+    service is ready when every probe named in ``required`` passed its last
+    check; until the first round finishes it is not.
+    """
+
+    def __init__(self, probes, interval_seconds=60, required=()):
+        unknown = set(required) - set(probes)
+        if unknown:
+            raise ValueError(f"Unknown required probes: {', '.join(sorted(unknown))}")
+        self.probes = dict(probes)
+        self.interval_seconds = interval_seconds
+        self.required = tuple(required)
+        self._results = {
+            name: {"ok": None, "latency_ms": None, "checked_at": None, "last_success": None, "error": None}
+            for name in self.probes
+        }
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._render()
+
+    def _check(self, name, probe):
+        started = time.perf_counter()
+        try:
+            probe()
+            error = None
+        except Exception as e:
+            error = f"{type(e).__name__}: {str(e)[:200]}"
+        latency_ms = round((time.perf_counter() - started) * 1000, 1)
+        checked_at = _now_iso()
+        with self._lock:
+            result = self._results[name]
+            result.update(ok=error is None, latency_ms=latency_ms, checked_at=checked_at, error=error)
+            if error is None:
+                result["last_success"] = checked_at
+        if error is not None:
+            logging.warning("Dependency probe %s failed: %s", name, error)
+
+    def _render(self):
+        with self._lock:
+            results = {name: dict(result) for name, result in self._results.items()}
+        ready = all(results[name]["ok"] for name in self.required)
+        body = json.dumps({
+            "status": "ready" if ready else "not_ready",
+            "required": list(self.required),
+            "dependencies": results,
+        }).encode("utf-8")
+        # Swapped in one assignment so readers never see a half-built response
+        self._response = (body, 200 if ready else 503)
+
+    def run_once(self):
+        for name, probe in self.probes.items():
+            self._check(name, probe)
+        self._render()
+
+    def _run(self):
+        while True:
+            self.run_once()
+            if self._stopping.wait(self.interval_seconds):
+                return
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="dependency-prober", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def response(self):
+        """Return the cached (JSON body bytes, HTTP status) readiness answer."""
+        return self._response
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(result) for name, result in self._results.items()}
+
+    def up(self):
+        """1/0 per dependency for the metrics gauge (skips ones not probed yet)."""
+        with self._lock:
+            return {name: int(result["ok"]) for name, result in self._results.items() if result["ok"] is not None}
@@ -0,0 +1,111 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Marker stored while the first copy of a call is still being delivered
+IN_PROGRESS = object()
+
+
+def idempotency_key(record):
+    """Key a call on Ringba's call ID, or callerId + timestamp when there is none.
+
+    Returns None when neither is available: keying on the caller alone would
+    swallow genuine repeat calls from the same number.
+    """
+    if record.call_id:
+        return f"id:{record.call_id}"
+    if record.timestamp:
+        return f"caller:{record.caller_id}|{record.timestamp}"
+    return None
+
+
+class IdempotencyCache:
+    """Bounded TTL/LRU cache of responses already sent for a call.
+
+    ``begin`` claims a key for the first request and returns the stored
+    response for every later one. When ``path`` is set, completed responses
+    are also written to SQLite so duplicates are still recognized after a
+    restart or by another worker process.
+    """
+
+    def __init__(self, max_entries=10000, ttl_seconds=86400, path=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "in_progress": 0, "evictions": 0}
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS idempotency ("
+                " key TEXT PRIMARY KEY, response TEXT NOT NULL, status INTEGER NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn.execute("DELETE FROM idempotency WHERE expires_at < ?", (time.time(),))
+
+    def _lookup_db(self, key, now):
+        row = self._conn.execute(
+            "SELECT response, status, expires_at FROM idempotency WHERE key = ? AND expires_at >= ?", (key, now)
+        ).fetchone()
+        if row is None:
+            return None
+        return row[2], (json.loads(row[0]), row[1])
+
+    def _store(self, key, expires_at, value):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def begin(self, key):
+        """Claim ``key``. Returns None for a new call, IN_PROGRESS, or the cached (body, status)."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < now:
+                del self._entries[key]
+                entry = None
+            if entry is None and self._conn is not None:
+                entry = self._lookup_db(key, now)
+                if entry is not None:
+                    self._store(key, *entry)
+            if entry is None:
+                self.stats["misses"] += 1
+                self._store(key, now + self.ttl_seconds, IN_PROGRESS)
+                return None
+            self._entries.move_to_end(key)
+            if entry[1] is IN_PROGRESS:
+                self.stats["in_progress"] += 1
+            else:
+                self.stats["hits"] += 1
+            return entry[1]
+
+    def complete(self, key, body, status):
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._store(key, expires_at, (body, status))
+            if self._conn is not None:
+                try:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO idempotency (key, response, status, expires_at) VALUES (?, ?, ?, ?)",
+                        (key, json.dumps(body), status, expires_at),
+                    )
+                except sqlite3.Error as e:
+                    logging.error(f"Could not persist idempotency key {key}: {str(e)}")
+
+    def discard(self, key):
+        """Release a claimed key so a retry of a failed call is processed again."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats, entries=len(self._entries))
+        lookups = stats["hits"] + stats["misses"] + stats["in_progress"]
+        stats["hit_rate"] = round((stats["hits"] + stats["in_progress"]) / lookups, 4) if lookups else 0.0
+        return stats
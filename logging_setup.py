@@ -0,0 +1,100 @@
+import atexit
+import datetime
+import json
+import logging
+import os
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, WatchedFileHandler
+
+from config import LOG_LEVEL, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_BODY_SAMPLE_RATE, LOG_ROTATION
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# LogRecord attributes that are not user-supplied ``extra`` fields
+_STANDARD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line.
+
+    Values passed through ``extra`` become top-level keys. A CallRecord passed
+    as ``extra={"call": record}`` is expanded into its fields, and raw request
+    bodies (``raw_body``) are decoded here rather than on the request thread.
+    """
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.UTC).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key in _STANDARD_ATTRS or key.startswith("_"):
+                continue
+            if key == "call" and hasattr(value, "__slots__"):
+                entry.update((field, getattr(value, field)) for field in value.__slots__)
+            elif isinstance(value, bytes):
+                entry[key] = value.decode("utf-8", "replace")
+            else:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    # The stock QueueHandler formats the message on the calling thread before
+    # enqueueing it; the listener runs in this process, so hand the record over
+    # untouched and let the listener thread do all the formatting
+    def prepare(self, record):
+        return record
+
+
+def _file_handler(log_file):
+    rotation = LOG_ROTATION
+    if not rotation:
+        # gunicorn's arbiter sets this before forking; its workers all append to one file
+        rotation = "external" if os.getenv("SERVER_SOFTWARE", "").startswith("gunicorn") else "size"
+    if rotation == "size":
+        return RotatingFileHandler(log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT)
+    if rotation == "external":
+        # Size-based rollover from several processes loses records; each one
+        # appends and reopens the file once logrotate has moved it
+        return WatchedFileHandler(log_file)
+    raise ValueError(f"Unknown LOG_ROTATION {rotation!r}; use 'size' or 'external'")
+
+
+def configure_logging(log_file):
+    """Route all logging through a queue to a JSON-lines file and the console.
+
+    Request threads only enqueue records; a single listener thread formats
+    them and does the disk I/O. The file is rotated per LOG_ROTATION.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    file_handler = _file_handler(log_file)
+    file_handler.setFormatter(JsonFormatter())
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_DeferredQueueHandler(log_queue))
+    root.setLevel(LOG_LEVEL)
+
+
+def should_log_body():
+    """Decide whether this request's raw body is logged, per LOG_BODY_SAMPLE_RATE."""
+    return LOG_BODY_SAMPLE_RATE >= 1 or random.random() < LOG_BODY_SAMPLE_RATE
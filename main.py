@@ -1,188 +1,12 @@
-import datetime
-import json
-import logging
-from flask import Flask, request, jsonify
-from google_sheets import append_row_to_sheet
-from slack_notify import send_slack_alert
-from config import RINGBA_FILTERS, GOOGLE_SHEET_ID, FLASK_DEBUG, HOST, PORT
+from app_factory import create_app, run
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('ringba_webhook.log'),
-        logging.StreamHandler()
-    ]
-)
+# Port, log file and worker model come from the environment (see config.py)
+app = create_app()
 
-app = Flask(__name__)
-
-def passes_filter(campaign_name, target_name, call_length_from_connect=None, end_call_source=None):
-    """Check if the call matches our filter criteria.
-    
-    A call is considered valid if it matches ONE of these criteria:
-    1. 0819 Target: campaign matches AND target_name is "TA7a8e20272b90487c8d420370c8477992" AND call length <= 30 seconds
-    2. True No Value: campaign matches AND target_name is empty/null (no target assigned)
-    
-    This ensures we get both 0819 target calls (30s and under) and TRUE No Value calls.
-    """
-    if campaign_name != RINGBA_FILTERS["campaign_name"]:
-        return False
-    
-    # Check for 0819 target calls (30 seconds and under)
-    if target_name == "TA7a8e20272b90487c8d420370c8477992":
-        # For 0819 target, only allow calls 30 seconds and under
-        if call_length_from_connect is not None:
-            try:
-                call_length = int(call_length_from_connect)
-                if call_length <= 30:
-                    return True  # Allow 0819 target calls 30s and under
-            except (ValueError, TypeError):
-                pass
-        return False  # Filter out 0819 target calls over 30 seconds
-    
-    # Check for true No Value calls (empty/null target names)
-    if not target_name or str(target_name).strip() == "":
-        return True  # Allow true No Value calls
-    
-    return False  # Filter out all other calls
-
-@app.route("/", methods=["GET"])
-def health_check():
-    return jsonify({
-        "status": "healthy",
-        "service": "Ringba Webhook Handler",
-        "filters": RINGBA_FILTERS,
-        "server": "render"
-    }), 200
-
-@app.route("/ringba-webhook", methods=["POST"])
-def ringba_webhook():
-    try:
-        # Handle Slack URL verification challenge
-        data = request.get_json()
-        if data and data.get("type") == "url_verification":
-            challenge = data.get("challenge")
-            if challenge:
-                return jsonify({"challenge": challenge}), 200
-        
-        # Log all request details
-        content_type = request.headers.get('Content-Type', '')
-        content_length = request.headers.get('Content-Length', '0')
-        user_agent = request.headers.get('User-Agent', '')
-        
-        logging.info(f"=== NEW WEBHOOK REQUEST ===")
-        logging.info(f"Content-Type: '{content_type}'")
-        logging.info(f"Content-Length: '{content_length}'")
-        logging.info(f"User-Agent: '{user_agent}'")
-        logging.info(f"Request Headers: {dict(request.headers)}")
-        
-        # Check if request has any data
-        raw_data = request.data
-        logging.info(f"Raw data length: {len(raw_data)} bytes")
-        
-        if len(raw_data) == 0:
-            logging.warning("Request has no data - empty body. This might be a Ringba configuration issue.")
-            return jsonify({
-                "status": "received",
-                "message": "Empty request received - check Ringba webhook configuration",
-                "expected_format": {
-                    "campaignName": "SPANISH DEBT | 3.5 STANDARD | 01292025",
-                    "targetName": "-no value- or actual target",
-                    "callerId": "example_caller_id",
-                    "callLengthFromConnect": 0,
-                    "endCallSource": "system"
-                }
-            }), 200
-        
-        # Try to decode and log the raw data
-        try:
-            raw_text = raw_data.decode('utf-8')
-            logging.info(f"Raw data: '{raw_text}'")
-        except Exception as e:
-            logging.error(f"Could not decode raw data: {str(e)}")
-            return jsonify({"error": "Invalid request encoding"}), 400
-        
-        # Try to parse JSON
-        data = None
-        if 'application/json' in content_type:
-            data = request.get_json()
-        else:
-            try:
-                data = request.get_json(force=True)
-            except:
-                try:
-                    data = json.loads(raw_text)
-                except Exception as e:
-                    logging.error(f"Could not parse JSON. Raw text: '{raw_text}', Error: {str(e)}")
-                    return jsonify({"error": "Invalid JSON data"}), 400
-        
-        if not data:
-            logging.error("No JSON data received")
-            return jsonify({"error": "No JSON data received"}), 400
-        
-        campaign_name = data.get("campaignName", "")
-        target_name = data.get("targetName", "")
-        caller_id = data.get("callerId", "Unknown")
-        call_length_from_connect = data.get("callLengthFromConnect", data.get("CallLengthFromConnect", data.get("call_length_from_connect")))
-        end_call_source = data.get("endCallSource", data.get("EndCallSource", data.get("end_call_source")))
-        
-        logging.info(f"Parsed data: campaignName='{campaign_name}', targetName='{target_name}', callerId='{caller_id}', callLengthFromConnect='{call_length_from_connect}', endCallSource='{end_call_source}'")
-        
-        # Check if this call matches our filter
-        if not passes_filter(campaign_name, target_name, call_length_from_connect, end_call_source):
-            logging.info(f"Call filtered out: campaignName={campaign_name}, targetName={target_name}")
-            return jsonify({"status": "filtered", "message": "Call does not match filter criteria"}), 200
-        
-        # Determine call type for notifications and logging
-        if target_name == "TA7a8e20272b90487c8d420370c8477992":
-            call_type = "0819 Call"
-            logging.info(f"Processing 0819 target call: callerId={caller_id}, callLength={call_length_from_connect}s")
-        else:
-            call_type = "No Value"
-            logging.info(f"Processing No Value call: callerId={caller_id}")
-        
-        # Process the call - use Ringba's timestamp if available, otherwise use current local time
-        ringba_timestamp = data.get("timestamp") or data.get("callTime") or data.get("callDate")
-        if ringba_timestamp:
-            time_of_call = ringba_timestamp
-        else:
-            # Convert UTC server time to Eastern time (handles DST automatically)
-            utc_time = datetime.datetime.now(datetime.UTC)
-            # Use EDT (UTC-4) for Daylight Saving Time
-            eastern_time = utc_time.astimezone(datetime.timezone(datetime.timedelta(hours=-4)))  # EDT is UTC-4
-            time_of_call = eastern_time.strftime("%Y-%m-%d %I:%M:%S %p EDT")
-        
-        # Append to Google Sheet
-        sheet_success = append_row_to_sheet(time_of_call, caller_id, call_type)
-        if not sheet_success:
-            logging.error("Failed to append to Google Sheet")
-            return jsonify({"error": "Failed to update Google Sheet"}), 500
-        
-        # Send Slack notification
-        sheet_link = f"https://docs.google.com/spreadsheets/d/{GOOGLE_SHEET_ID}"
-        slack_success = send_slack_alert(caller_id, time_of_call, sheet_link, campaign_name, call_type)
-        if not slack_success:
-            logging.error("Failed to send Slack notification")
-        
-        logging.info(f"Successfully processed {call_type.lower()} from {caller_id}")
-        
-        return jsonify({
-            "caller_id": caller_id,
-            "call_type": call_type,
-            "status": "success",
-            "time": time_of_call
-        }), 200
-        
-    except Exception as e:
-        logging.error(f"Error processing webhook: {str(e)}")
-        return jsonify({"error": "Internal server error"}), 500
+# gunicorn.conf.py and benchmarks/load_test.py reach the pipeline through this module
+pipeline = app.extensions["ringba_webhook"]
+graceful = pipeline.graceful
+delivery_queue = pipeline.delivery_queue
 
 if __name__ == "__main__":
-    logging.info(f"Starting Ringba Webhook Handler on {HOST}:{PORT}")
-    app.run(
-        host=HOST,
-        port=PORT,
-        debug=FLASK_DEBUG
-    )
+    run(app)
@@ -0,0 +1,165 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, spanning a fast parse up to a slow Google call
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues):
+        with self._lock:
+            return self._values.get(labelvalues, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labelvalues, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+        self._listeners = []
+        _registry.append(self)
+
+    def add_listener(self, callback):
+        """Call ``callback(value, labelvalues)`` on every observation (e.g. for request tracing)."""
+        self._listeners.append(callback)
+
+    def observe(self, value, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+        for listener in self._listeners:
+            listener(value, labelvalues)
+
+    @contextmanager
+    def time(self, *labelvalues):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labelvalues)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, (list(s[0]), s[1], s[2])) for labels, s in self._series.items())
+        for labelvalues, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.labelnames, labelvalues, [("le", le)])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {repr(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Gauge:
+    """Gauge whose samples are read from a callback at scrape time.
+
+    The callback returns either a number or a dict mapping a label value
+    (for a single label name) to a number.
+    """
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        _registry.append(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        if self.callback is None:
+            return lines
+        try:
+            value = self.callback()
+        except Exception:
+            return lines
+        if value is None:
+            return lines
+        if isinstance(value, dict):
+            for labelvalue, sample in sorted(value.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, (labelvalue,))} {_format_value(sample)}")
+        else:
+            lines.append(f"{self.name} {_format_value(value)}")
+        return lines
+
+
+def render_metrics():
+    """Render every registered metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Shared metrics. Values are per process: under gunicorn each worker exports its own.
+webhook_requests = Counter(
+    "ringba_webhook_requests_total",
+    "Webhook requests by outcome (filtered, processed, queued, spooled, duplicate, sheet_fail, slack_fail, invalid, draining, error)",
+    ["outcome"],
+)
+webhook_duration = Histogram("ringba_webhook_duration_seconds", "End-to-end webhook handling time")
+stage_duration = Histogram(
+    "ringba_stage_duration_seconds",
+    "Time spent per processing stage (parse, filter, spool_append, sheets_append, sheets_auth, sheets_open,"
+    " sheets_sync, slack_post, spool_replay)",
+    ["stage"],
+)
+google_api_errors = Counter(
+    "ringba_google_api_errors_total",
+    "Google Sheets API error responses by HTTP status (429 = quota exceeded)",
+    ["status"],
+)
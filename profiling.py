@@ -0,0 +1,161 @@
+import contextvars
+import cProfile
+import datetime
+import io
+import logging
+import marshal
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# [start perf_counter, [(stage, offset, seconds), ...]] of the request running in this context
+_current_trace = contextvars.ContextVar("request_trace", default=None)
+
+
+class SlowRequestTracer:
+    """Keeps a per-stage timing breakdown of the slowest webhook requests.
+
+    ``begin()``/``end()`` bracket a request; every stage timed through the
+    stage histogram in between (parse, filter, sheets_auth, sheets_sync,
+    sheets_append, slack_post, ...) is recorded with its offset from the
+    start of the request. Requests that take at least ``threshold_ms`` are
+    kept in a ring buffer of the last ``capacity``; faster ones are dropped.
+    """
+
+    def __init__(self, threshold_ms=2000, capacity=100):
+        self.threshold_ms = threshold_ms
+        self._traces = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self.stats = {"traced": 0, "slow": 0}
+
+    def begin(self):
+        return _current_trace.set([time.perf_counter(), []])
+
+    def record_stage(self, seconds, labelvalues):
+        """Histogram listener; ignores observations made outside a traced request."""
+        trace = _current_trace.get()
+        if trace is not None:
+            offset = time.perf_counter() - seconds - trace[0]
+            trace[1].append((labelvalues[0], offset, seconds))
+
+    def end(self, token, **details):
+        trace = _current_trace.get()
+        _current_trace.reset(token)
+        total_ms = (time.perf_counter() - trace[0]) * 1000
+        slow = total_ms >= self.threshold_ms
+        if slow:
+            entry = {
+                "at": datetime.datetime.now(datetime.UTC).isoformat(timespec="milliseconds"),
+                "total_ms": round(total_ms, 1),
+                "stages": [
+                    {"stage": stage, "offset_ms": round(offset * 1000, 1), "ms": round(seconds * 1000, 1)}
+                    for stage, offset, seconds in trace[1]
+                ],
+            }
+            entry.update(details)
+        with self._lock:
+            self.stats["traced"] += 1
+            if slow:
+                self.stats["slow"] += 1
+                self._traces.append(entry)
+
+    def dump(self):
+        """Slow requests currently in the buffer, oldest first."""
+        with self._lock:
+            return list(self._traces)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, threshold_ms=self.threshold_ms, buffered=len(self._traces))
+
+
+class SampledProfiler:
+    """cProfile capture over a sample of requests for a limited time.
+
+    ``start(seconds, sample_rate)`` opens a capture window; while it is open
+    each request wrapped in ``profile()`` is profiled with probability
+    ``sample_rate`` and its statistics are merged into the capture. cProfile
+    only sees the thread it runs on, so background threads (batch flushes,
+    spool replay) are not included. Profiling never runs unless started.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._until = 0.0
+        self._sample_rate = 1.0
+        self._started_at = None
+        self._stats = None
+        self.stats = {"captures": 0, "profiled_requests": 0}
+
+    @property
+    def active(self):
+        return time.monotonic() < self._until
+
+    def start(self, seconds, sample_rate=1.0):
+        """Open a capture window, discarding the previous capture; False if one is running."""
+        with self._lock:
+            if self.active:
+                return False
+            self._until = time.monotonic() + seconds
+            self._sample_rate = sample_rate
+            self._started_at = datetime.datetime.now(datetime.UTC).isoformat(timespec="seconds")
+            self._stats = None
+            self.stats["captures"] += 1
+        logging.warning("Profiling %.0f%% of requests for %ss", sample_rate * 100, seconds)
+        return True
+
+    def _begin(self):
+        if not self.active or random.random() >= self._sample_rate:
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is active on this thread
+            return None
+        return profile
+
+    def _finish(self, profile):
+        profile.disable()
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+            self.stats["profiled_requests"] += 1
+
+    @contextmanager
+    def profile(self):
+        """Profile the wrapped request if a capture is open and it is sampled."""
+        profile = self._begin()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                self._finish(profile)
+
+    def report(self, limit=40, sort="cumulative"):
+        """Text report of the current capture, or None if nothing was profiled yet."""
+        with self._lock:
+            if self._stats is None:
+                return None
+            stream = io.StringIO()
+            self._stats.stream = stream
+            self._stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def dump(self):
+        """The capture in pstats file format (load with pstats/snakeviz), or None."""
+        with self._lock:
+            if self._stats is None:
+                return None
+            return marshal.dumps(self._stats.stats)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, active=self.active, started_at=self._started_at,
+                        sample_rate=self._sample_rate)
+
@@ -0,0 +1,158 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from google_sheets import append_rows_to_sheet, build_row
+
+
+class BatchWriter:
+    """Coalesces rows from concurrent callers into one Sheets write per shard.
+
+    Rows are grouped by their (spreadsheet ID, tab) shard. A shard's rows are
+    collected until ``max_rows`` are waiting or the oldest has waited
+    ``max_wait_ms``, then written with a single ``append_rows_to_sheet`` call.
+    Up to ``max_parallel`` shards are flushed at the same time, but each shard
+    has at most one write in flight so its rows land in order. Every caller
+    gets a future that resolves to the batch's success flag, so callers still
+    learn whether their own row made it into the sheet.
+    """
+
+    def __init__(self, write_rows=append_rows_to_sheet, max_rows=50, max_wait_ms=200, max_parallel=4):
+        self.write_rows = write_rows
+        self.max_rows = max_rows
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_parallel = max_parallel
+        self._pending = {}
+        self._oldest = {}
+        self._inflight = set()
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread = None
+        self._executor = None
+        self.stats = {
+            "batches": 0,
+            "rows": 0,
+            "failed_batches": 0,
+            "last_batch_size": 0,
+            "max_batch_size": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+        }
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._executor = ThreadPoolExecutor(max_workers=self.max_parallel, thread_name_prefix="sheet-shard-flush")
+            self._thread = threading.Thread(target=self._run, name="sheet-batch-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, row, sheet_id=None, tab=None):
+        future = Future()
+        shard = (sheet_id, tab)
+        with self._cond:
+            if self._thread is None:
+                raise RuntimeError("BatchWriter is not running")
+            rows = self._pending.get(shard)
+            if rows is None:
+                rows = self._pending[shard] = []
+                self._oldest[shard] = time.monotonic()
+            rows.append((row, future))
+            # Wake the writer to open the wait window, or to flush a full batch
+            if len(rows) == 1 or len(rows) >= self.max_rows:
+                self._cond.notify()
+        return future
+
+    def append(self, time_of_call, caller_id, call_type="", timeout=None, sheet_id=None, tab=None):
+        """Queue one sheet row and block until its batch has been written."""
+        return self.submit(build_row(time_of_call, caller_id, call_type), sheet_id, tab).result(timeout)
+
+    def _take_batches(self):
+        """Wait until at least one shard is due, then take a batch from every due shard."""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                due, wait = [], None
+                for shard, rows in self._pending.items():
+                    if shard in self._inflight:
+                        continue
+                    waited = now - self._oldest[shard]
+                    if len(rows) >= self.max_rows or waited >= self.max_wait or self._stopping:
+                        due.append(shard)
+                    else:
+                        remaining = self.max_wait - waited
+                        wait = remaining if wait is None else min(wait, remaining)
+                if due:
+                    break
+                if self._stopping and not self._pending and not self._inflight:
+                    return []
+                self._cond.wait(wait)
+
+            batches = []
+            for shard in due:
+                rows = self._pending[shard]
+                batches.append((shard, rows[:self.max_rows]))
+                if len(rows) > self.max_rows:
+                    # The rest keeps its original wait window
+                    self._pending[shard] = rows[self.max_rows:]
+                else:
+                    del self._pending[shard]
+                    del self._oldest[shard]
+                self._inflight.add(shard)
+            return batches
+
+    def _flush(self, shard, batch):
+        started = time.perf_counter()
+        try:
+            success = self.write_rows([row for row, _ in batch], *shard)
+        except Exception as e:
+            logging.error(f"Error flushing batch of {len(batch)} rows: {str(e)}")
+            success = False
+        flush_ms = (time.perf_counter() - started) * 1000
+
+        with self._cond:
+            self.stats["batches"] += 1
+            self.stats["rows"] += len(batch)
+            self.stats["last_batch_size"] = len(batch)
+            self.stats["max_batch_size"] = max(self.stats["max_batch_size"], len(batch))
+            self.stats["last_flush_ms"] = round(flush_ms, 1)
+            self.stats["max_flush_ms"] = max(self.stats["max_flush_ms"], round(flush_ms, 1))
+            if not success:
+                self.stats["failed_batches"] += 1
+            self._inflight.discard(shard)
+            self._cond.notify()
+        logging.info(f"Flushed batch of {len(batch)} rows in {flush_ms:.1f}ms (success={success})")
+
+        for _, future in batch:
+            future.set_result(success)
+
+    def _run(self):
+        while True:
+            batches = self._take_batches()
+            if not batches:
+                return
+            for shard, batch in batches:
+                self._executor.submit(self._flush, shard, batch)
+
+    def stop(self, timeout=None):
+        """Flush whatever is pending and stop the writer thread."""
+        with self._cond:
+            if self._thread is None:
+                return
+            self._stopping = True
+            self._cond.notify()
+            thread = self._thread
+        thread.join(timeout)
+        self._executor.shutdown(wait=True)
+        with self._cond:
+            self._thread = None
+
+    def snapshot(self):
+        with self._cond:
+            stats = dict(self.stats)
+            stats["pending"] = sum(len(rows) for rows in self._pending.values())
+            stats["pending_shards"] = len(self._pending)
+        stats["avg_batch_size"] = round(stats["rows"] / stats["batches"], 2) if stats["batches"] else 0
+        return stats
@@ -0,0 +1,302 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no shared file locks; only writes in this process are paused
+    fcntl = None
+
+from metrics import stage_duration
+
+
+def rows_lock_file(lock_dir, sheet_id, tab):
+    """Lock file guarding the rows of one tab across processes, or None when unavailable."""
+    if not lock_dir or fcntl is None:
+        return None
+    os.makedirs(lock_dir, exist_ok=True)
+    digest = hashlib.sha1(f"{sheet_id}/{tab}".encode("utf-8")).hexdigest()[:16]
+    return os.path.join(lock_dir, f"{digest}.lock")
+
+
+def _lock_file(path, operation):
+    """Open ``path`` and flock it; closing the returned handle unlocks it."""
+    handle = open(path, "a+")
+    try:
+        fcntl.flock(handle, operation)
+    except BaseException:
+        handle.close()
+        raise
+    return handle
+
+
+def share_rows_nowait(path):
+    """Take a shared lock on ``path`` without waiting; None while an archiver holds it."""
+    try:
+        return _lock_file(path, fcntl.LOCK_SH | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return None
+
+
+def _close(handle):
+    if handle is not None:
+        handle.close()
+
+
+class RowCursor:
+    """Tracks the next free row of a worksheet in memory.
+
+    Headers are validated and Column A is read once when the cursor syncs.
+    After that each reservation costs a single guard read of the reserved
+    cells in Column A and the row just above them, so appends stay O(1) no
+    matter how large the sheet grows. The cursor re-syncs when the guard
+    finds the rows already taken (another worker wrote there) or finds an
+    empty row above them that no write of this cursor is filling (rows were
+    deleted, e.g. by an archiver in another process), after a failed write,
+    or once ``resync_interval`` seconds have passed.
+
+    Callers ``release(row)`` each reservation once its write finished, so
+    ``exclusive()`` can wait for in-flight writes before rows are deleted.
+    Until then the reserved rows are still empty in Column A, so every sync
+    keeps the cursor above the rows handed out to writes in flight. With a
+    ``lock_file`` (see rows_lock_file), each reservation also holds a shared
+    flock on it until released and ``exclusive()`` takes it exclusively, so
+    writes from other processes on the host wait for the deletion as well.
+    """
+
+    def __init__(self, sheet, headers, resync_interval=300, lock_file=None):
+        self.sheet = sheet
+        self.headers = list(headers)
+        self.resync_interval = resync_interval
+        self.lock_file = lock_file
+        # First row of each reservation -> its shared lock on lock_file
+        self._handles = {}
+        self._lock = threading.Condition()
+        # First row -> row after the last, for each reservation not yet released,
+        # and the first rows of those whose guard read found them in place
+        self._inflight = {}
+        self._checked = set()
+        self._generation = 0
+        self._paused = False
+        self._next_row = None
+        self._synced_at = 0.0
+        self._headers_checked = False
+        self.stats = {"syncs": 0, "conflicts": 0, "gaps": 0, "reservations": 0}
+
+    def _ensure_headers(self):
+        # A failed read propagates: only a header row that was actually read
+        # and found missing or wrong is replaced
+        existing_headers = self.sheet.row_values(1)
+        if not existing_headers or existing_headers != self.headers:
+            # Clear the sheet and add correct headers
+            self.sheet.clear()
+            self.sheet.append_row(self.headers)
+            logging.info("Created correct headers in Google Sheet")
+        self._headers_checked = True
+
+    def _sync(self):
+        if not self._headers_checked:
+            self._ensure_headers()
+        # Find next empty row by checking ONLY Column A (ignore formulas in other columns)
+        with stage_duration.time("sheets_sync"):
+            col_a_values = self.sheet.col_values(1)
+        last_filled = 0
+        for index, value in enumerate(col_a_values, start=1):
+            if value:
+                last_filled = index
+        # Rows of checked writes still in flight look empty in Column A;
+        # unchecked reservations are taken again after the sync
+        self._next_row = max([last_filled + 1, *(self._inflight[row] for row in self._checked)])
+        self._synced_at = time.monotonic()
+        self._generation += 1
+        self._lock.notify_all()
+        self.stats["syncs"] += 1
+        logging.info("Row cursor synced: next free row is %d", self._next_row)
+
+    def _guard_read(self, start, count):
+        """Column A from the row above ``start`` to the last reserved row."""
+        values = self.sheet.get(f'A{start - 1}:A{start + count - 1}')
+        values += [[]] * (count + 1 - len(values))
+        return [bool(row and row[0]) for row in values]
+
+    def _take(self, count, checked):
+        start = self._next_row
+        self._next_row += count
+        self._inflight[start] = self._next_row
+        if checked:
+            self._checked.add(start)
+        return start
+
+    def _forget(self, start):
+        self._inflight.pop(start, None)
+        self._checked.discard(start)
+        self._lock.notify_all()
+
+    def _owner(self, row):
+        """First row of the reservation in flight that covers ``row``, if any."""
+        for first, end in self._inflight.items():
+            if first <= row < end:
+                return first
+        return None
+
+    def _confirm(self, start, count, generation, filled):
+        """Keep a guarded reservation, or replace it with fresh rows; called with the lock held."""
+        while True:
+            if self._generation != generation:
+                # The cursor re-synced during the guard read, so these rows may be stale
+                self._forget(start)
+                if self._next_row is None:
+                    self._sync()
+                return self._take(count, checked=True)
+            if any(filled[1:]):
+                self.stats["conflicts"] += 1
+                logging.warning("Row %d is already written, re-syncing row cursor", start)
+                break
+            owner = None if filled[0] else self._owner(start - 1)
+            if filled[0] or owner in self._checked:
+                self._checked.add(start)
+                self._lock.notify_all()
+                return start
+            if owner is None:
+                # Nothing this cursor holds explains the empty row: rows above
+                # were deleted, e.g. by an archiver in another process
+                self.stats["gaps"] += 1
+                logging.warning("Row %d is empty, re-syncing row cursor", start - 1)
+                break
+            # The row above belongs to a reservation whose guard read is still running
+            self._lock.wait()
+        self._forget(start)
+        self._sync()
+        return self._take(count, checked=True)
+
+    def _share_rows(self):
+        """Wait out exclusive() here and in other processes; returns the shared lock handle.
+
+        Called with the lock held; the file lock is taken without it so a
+        long archive run elsewhere does not block snapshot() or release().
+        """
+        while True:
+            while self._paused:
+                self._lock.wait()
+            if not self.lock_file:
+                return None
+            self._lock.release()
+            try:
+                handle = _lock_file(self.lock_file, fcntl.LOCK_SH)
+            finally:
+                self._lock.acquire()
+            if not self._paused:
+                return handle
+            _close(handle)
+
+    def reserve(self, count=1):
+        """Reserve ``count`` consecutive rows and return the first row number.
+
+        Every successful reservation must be followed by ``release(row)``
+        with the row returned here.
+        """
+        with self._lock:
+            handle = self._share_rows()
+            try:
+                synced = self._next_row is None or time.monotonic() - self._synced_at >= self.resync_interval
+                if synced:
+                    self._sync()
+                start = self._take(count, checked=synced)
+            except BaseException:
+                _close(handle)
+                raise
+            generation = self._generation
+            self.stats["reservations"] += 1
+            if synced:
+                self._handles[start] = handle
+                return start
+
+        # The guard read runs outside the lock so concurrent reservations
+        # do not queue behind each other's round trips
+        try:
+            filled = self._guard_read(start, count)
+        except BaseException:
+            with self._lock:
+                self._forget(start)
+            _close(handle)
+            raise
+        with self._lock:
+            try:
+                start = self._confirm(start, count, generation, filled)
+            except BaseException:
+                self._forget(start)
+                _close(handle)
+                raise
+            self._handles[start] = handle
+            return start
+
+    def release(self, row):
+        """Mark the reserved write starting at ``row`` as finished (successfully or not)."""
+        with self._lock:
+            self._forget(row)
+            handle = self._handles.pop(row, None)
+        _close(handle)
+
+    @contextmanager
+    def exclusive(self, timeout=30):
+        """Hold off new reservations and wait for in-flight writes, e.g. while rows are deleted.
+
+        With a lock file, writes from other processes are held off too;
+        RuntimeError is raised if they do not pause within ``timeout`` seconds.
+        The cursor re-syncs afterwards because row numbers may have shifted.
+        """
+        with self._lock:
+            while self._paused:
+                self._lock.wait()
+            self._paused = True
+            while self._inflight:
+                self._lock.wait()
+        try:
+            with self._other_processes_paused(timeout):
+                yield
+        finally:
+            with self._lock:
+                self._paused = False
+                self._next_row = None
+                self._lock.notify_all()
+
+    @contextmanager
+    def _other_processes_paused(self, timeout):
+        if not self.lock_file:
+            yield
+            return
+        # Shared locks are granted while an exclusive one waits, so poll
+        # for a moment with no write in flight
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                handle = _lock_file(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    raise RuntimeError(f"Writes from other processes did not pause within {timeout}s") from None
+                time.sleep(0.05)
+        try:
+            yield
+        finally:
+            _close(handle)
+
+    def rebind(self, sheet):
+        """Switch to a re-opened handle of the same worksheet; reservations in flight stay held."""
+        with self._lock:
+            self.sheet = sheet
+            self._headers_checked = False
+            self._next_row = None
+
+    def invalidate(self):
+        """Force a re-sync before the next reservation (e.g. after a failed write)."""
+        with self._lock:
+            self._next_row = None
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, next_row=self._next_row)
@@ -0,0 +1,104 @@
+import json
+import logging
+import re
+
+from config import GOOGLE_SHEET_ID, SHEET_ROUTES_FILE, SHEET_TAB_TEMPLATE
+from timeutil import now_local
+
+# Characters Google Sheets does not allow in tab names
+_INVALID_TAB_CHARS = re.compile(r"[\[\]:*?/\\]")
+_DATE_PREFIX = re.compile(r"^(\d{4})-(\d{2})-(\d{2})")
+# Tab names are limited to 100 characters
+MAX_TAB_LENGTH = 100
+
+
+def _call_date(time_of_call):
+    """Date the call belongs to: the leading YYYY-MM-DD of its time, else today in CALL_TIMEZONE."""
+    match = _DATE_PREFIX.match(time_of_call or "")
+    if match:
+        return match.groups()
+    today = now_local()
+    return today.strftime("%Y"), today.strftime("%m"), today.strftime("%d")
+
+
+def format_tab(template, campaign_name, call_type, time_of_call):
+    """Fill a tab template; supports {date}, {month}, {year}, {campaign} and {call_type}."""
+    if "{" not in template:
+        return template
+    year, month, day = _call_date(time_of_call)
+    tab = template.format(
+        date=f"{year}-{month}-{day}",
+        month=f"{year}-{month}",
+        year=year,
+        campaign=campaign_name or "Unknown",
+        call_type=call_type or "Unknown",
+    )
+    return _INVALID_TAB_CHARS.sub("-", tab).strip()[:MAX_TAB_LENGTH]
+
+
+def check_tab_template(template):
+    """Raise ValueError if ``template`` uses a placeholder format_tab cannot fill."""
+    try:
+        format_tab(template, "Campaign", "Type", "2000-01-01")
+    except (KeyError, IndexError, ValueError) as e:
+        raise ValueError(
+            f"Invalid tab template {template!r}: {e!r}; "
+            "use only {date}, {month}, {year}, {campaign} and {call_type}"
+        ) from None
+    return template
+
+
+class SheetRouter:
+    """Maps each call to the (spreadsheet ID, tab) it is written to.
+
+    Routes are tried in order; a route matches when its optional
+    ``campaign`` and ``call_type`` both equal the call's, and sends the call
+    to its ``sheet_id`` (default: GOOGLE_SHEET_ID) and ``tab`` template
+    (default: SHEET_TAB_TEMPLATE). Calls no route matches use the defaults,
+    so with no routes and a plain tab name everything goes to one worksheet
+    exactly as before. Templates such as ``"Calls {date}"`` shard by day.
+    Every template is checked here, so a bad placeholder fails at startup
+    rather than on each call.
+    """
+
+    def __init__(self, routes=(), default_sheet_id=GOOGLE_SHEET_ID, default_tab=SHEET_TAB_TEMPLATE):
+        self.default_sheet_id = default_sheet_id
+        self.default_tab = check_tab_template(default_tab)
+        self.routes = []
+        for route in routes:
+            self.routes.append((
+                route.get("campaign"),
+                route.get("call_type"),
+                route.get("sheet_id") or default_sheet_id,
+                check_tab_template(route.get("tab") or default_tab),
+            ))
+        # Skip template work entirely in the single-sheet setup
+        self._static = None if self.routes or "{" in default_tab else (default_sheet_id, default_tab)
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        with open(path) as f:
+            routes = json.load(f)["routes"]
+        logging.info(f"Loaded {len(routes)} sheet routes from {path}")
+        return cls(routes, **kwargs)
+
+    def route(self, campaign_name, call_type, time_of_call):
+        if self._static is not None:
+            return self._static
+        for campaign, route_call_type, sheet_id, tab in self.routes:
+            if campaign is not None and campaign != campaign_name:
+                continue
+            if route_call_type is not None and route_call_type != call_type:
+                continue
+            return sheet_id, format_tab(tab, campaign_name, call_type, time_of_call)
+        return self.default_sheet_id, format_tab(self.default_tab, campaign_name, call_type, time_of_call)
+
+    def summary(self):
+        return {"routes": len(self.routes), "default_sheet_id": self.default_sheet_id, "default_tab": self.default_tab}
+
+
+router = SheetRouter.from_file(SHEET_ROUTES_FILE) if SHEET_ROUTES_FILE else SheetRouter()
+
+
+def route_call(campaign_name, call_type, time_of_call):
+    return router.route(campaign_name, call_type, time_of_call)
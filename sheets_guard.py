@@ -0,0 +1,184 @@
+import logging
+import threading
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Responses that mean Google is throttling or degraded (rather than that our request was bad)
+TRANSIENT_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+
+
+class RateLimitTimeout(Exception):
+    """Raised when no request slot frees up within the limiter's max wait."""
+
+
+class CircuitBreaker:
+    """Stops calling Google Sheets after repeated transient failures.
+
+    After ``failure_threshold`` consecutive 429/5xx/connection failures the
+    circuit opens and every call fails fast for ``reset_seconds``. Then one
+    probe call is let through (half-open): success closes the circuit, failure
+    re-opens it with the wait doubled, up to ``max_reset_seconds``.
+    """
+
+    def __init__(self, failure_threshold=5, reset_seconds=30.0, max_reset_seconds=600.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.max_reset_seconds = max_reset_seconds
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._trips = 0
+        self._opened_at = 0.0
+        self._open_for = reset_seconds
+        self._probing = False
+        self.stats = {"opened": 0, "rejected": 0, "failures": 0, "successes": 0}
+
+    def allow(self):
+        """Return True if a call may go ahead; in half-open state only one probe at a time does."""
+        with self._lock:
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self._open_for:
+                    self.stats["rejected"] += 1
+                    return False
+                self._state = HALF_OPEN
+                logging.info("Sheets circuit half-open, sending a probe request")
+            if self._state == HALF_OPEN:
+                if self._probing:
+                    self.stats["rejected"] += 1
+                    return False
+                self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.stats["successes"] += 1
+            self._failures = 0
+            self._probing = False
+            if self._state != CLOSED:
+                logging.warning("Sheets circuit closed after a successful probe")
+                self._state = CLOSED
+                self._trips = 0
+                self._open_for = self.reset_seconds
+
+    def record_failure(self):
+        with self._lock:
+            self.stats["failures"] += 1
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._trip()
+
+    def release(self):
+        """End a call whose outcome says nothing about Google's health (e.g. a 400)."""
+        with self._lock:
+            self._probing = False
+
+    def _trip(self):
+        # Caller holds self._lock
+        self._open_for = min(self.reset_seconds * (2 ** self._trips), self.max_reset_seconds)
+        self._trips += 1
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._probing = False
+        self._failures = 0
+        self.stats["opened"] += 1
+        logging.error("Sheets circuit opened for %.0fs after repeated failures", self._open_for)
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self._open_for:
+                return HALF_OPEN
+            return self._state
+
+    def snapshot(self):
+        state = self.state
+        with self._lock:
+            retry_in = None
+            if state == OPEN:
+                retry_in = round(max(0.0, self._open_for - (time.monotonic() - self._opened_at)), 1)
+            return dict(self.stats, state=state, consecutive_failures=self._failures, retry_in_seconds=retry_in)
+
+
+class AdaptiveRateLimiter:
+    """Token bucket whose refill rate adapts to Google's 429 responses (AIMD).
+
+    Each Sheets request takes a token; callers wait up to ``max_wait`` seconds
+    for one and get ``RateLimitTimeout`` otherwise. A 429 halves the rate (not
+    below ``min_rate``, and at most once per second so a burst of concurrent
+    429s counts as one signal) and honours Retry-After; every success adds
+    ``increase_step`` requests/second back, up to ``max_rate``.
+    """
+
+    def __init__(self, max_rate=5.0, burst=20, min_rate=0.5, increase_step=0.1, max_wait=2.0):
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate)
+        self.burst = burst
+        self.increase_step = increase_step
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._rate = max_rate
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        self.stats = {"acquired": 0, "waited": 0, "timeouts": 0, "throttled": 0}
+
+    def _refill(self, now):
+        # Caller holds self._lock
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def acquire(self, count=1):
+        """Take ``count`` tokens at once (for requests that must not be refused halfway)."""
+        count = min(count, self.burst)
+        deadline = time.monotonic() + self.max_wait
+        waited = False
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._blocked_until and self._tokens >= count:
+                    self._tokens -= count
+                    self.stats["acquired"] += count
+                    if waited:
+                        self.stats["waited"] += 1
+                    return
+                delay = max(self._blocked_until - now, (count - self._tokens) / self._rate)
+                if now + delay > deadline:
+                    self.stats["timeouts"] += 1
+                    raise RateLimitTimeout(f"No Sheets request slot within {self.max_wait}s")
+            waited = True
+            time.sleep(delay)
+
+    def throttled(self, retry_after=None):
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_decrease >= 1.0:
+                self._rate = max(self.min_rate, self._rate / 2)
+                self._last_decrease = now
+            self._tokens = min(self._tokens, 0.0)
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+            self.stats["throttled"] += 1
+        logging.warning("Sheets API throttled; request rate lowered to %.2f/s", self._rate)
+
+    def succeeded(self):
+        with self._lock:
+            if self._rate < self.max_rate:
+                self._rate = min(self.max_rate, self._rate + self.increase_step)
+
+    def snapshot(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            return dict(self.stats, rate_per_second=round(self._rate, 3), max_rate_per_second=self.max_rate,
+                        tokens=round(self._tokens, 2))
+
+
+def parse_retry_after(value):
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
@@ -1,52 +1,167 @@
 import requests
-from config import SLACK_WEBHOOK_URL
+import threading
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config import SLACK_WEBHOOK_URL, SLACK_POOL_SIZE, SLACK_MAX_RETRIES, SLACK_DIGEST_SECONDS
+from slack_templates import templates
 import logging
 
-def send_slack_alert(caller_id, time_of_call, sheet_link, campaign_name="Unknown", call_type="Unknown"):
-    try:
-        # Determine emoji and styling based on call type
-        if call_type == "0819 Call":
-            emoji = "🎯"
-            call_type_text = f"*{call_type}*"
-        elif call_type == "No Value":
-            emoji = "📞"
-            call_type_text = f"*{call_type}*"
-        else:
-            emoji = "📱"
-            call_type_text = f"*{call_type}*"
-        
-        message = {
-            "blocks": [
-                {
-                    "type": "section",
-                    "text": {
-                        "type": "mrkdwn",
-                        "text": f"{emoji} *New {call_type_text} Logged*\n\n• *Caller ID:* `{caller_id}`\n• *Time:* `{time_of_call}`\n• *Campaign:* `{campaign_name}`\n• *Type:* {call_type_text}"
-                    }
+# Slack caps a section's text at 3000 characters, so digests are split into
+# sections of at most this many alert lines
+DIGEST_LINES_PER_SECTION = 15
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+def _build_session():
+    # One keep-alive session for the whole process so alerts reuse the
+    # TCP/TLS connection to hooks.slack.com instead of handshaking every time
+    session = requests.Session()
+    retries = Retry(
+        total=SLACK_MAX_RETRIES,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["POST"]),
+        respect_retry_after_header=True
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=SLACK_POOL_SIZE, max_retries=retries)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_session = _build_session()
+
+
+def _call_type_style(call_type):
+    # Determine emoji and styling based on call type
+    if call_type == "0819 Call":
+        emoji = "🎯"
+    elif call_type == "No Value":
+        emoji = "📞"
+    else:
+        emoji = "📱"
+    return emoji, f"*{call_type}*"
+
+
+def _sheet_button(sheet_link):
+    return {
+        "type": "actions",
+        "elements": [
+            {
+                "type": "button",
+                "text": {
+                    "type": "plain_text",
+                    "text": "📊 View Google Sheet"
                 },
-                {
-                    "type": "actions",
-                    "elements": [
-                        {
-                            "type": "button",
-                            "text": {
-                                "type": "plain_text",
-                                "text": "📊 View Google Sheet"
-                            },
-                            "url": sheet_link,
-                            "style": "primary"
-                        }
-                    ]
-                }
-            ]
+                "url": sheet_link,
+                "style": "primary"
+            }
+        ]
+    }
+
+
+def render_alert_message(caller_id, time_of_call, sheet_link, campaign_name="Unknown", call_type="Unknown"):
+    """JSON payload bytes for one alert, rendered from the call type's precompiled template."""
+    return templates.render(call_type, caller_id, time_of_call, campaign_name, sheet_link)
+
+
+def build_digest_message(alerts):
+    """Merge several alerts into one Block Kit message."""
+    lines = []
+    for caller_id, time_of_call, _, campaign_name, call_type in alerts:
+        emoji, call_type_text = _call_type_style(call_type)
+        lines.append(f"{emoji} {call_type_text} • `{caller_id}` • `{time_of_call}` • `{campaign_name}`")
+
+    blocks = [
+        {
+            "type": "section",
+            "text": {"type": "mrkdwn", "text": f"🔔 *{len(alerts)} New Calls Logged*"}
         }
-        
-        response = requests.post(SLACK_WEBHOOK_URL, json=message, timeout=10)
+    ]
+    for start in range(0, len(lines), DIGEST_LINES_PER_SECTION):
+        blocks.append({
+            "type": "section",
+            "text": {"type": "mrkdwn", "text": "\n".join(lines[start:start + DIGEST_LINES_PER_SECTION])}
+        })
+    blocks.append(_sheet_button(alerts[-1][2]))
+    return {"blocks": blocks}
+
+
+def post_to_slack(message):
+    """Post a Block Kit message given as a dict or as already serialized JSON bytes."""
+    if isinstance(message, bytes):
+        response = _session.post(SLACK_WEBHOOK_URL, data=message, headers=JSON_HEADERS, timeout=10)
+    else:
+        response = _session.post(SLACK_WEBHOOK_URL, json=message, timeout=10)
+    response.raise_for_status()
+
+
+def probe_slack():
+    """Check that the Slack webhook is reachable and still exists; raises if not.
+
+    Posts an empty payload, which Slack rejects with 400 without posting
+    anything. A 400 therefore means the webhook is live, while 403/404/410
+    mean it was revoked or deleted. Uses a plain request so retries do not
+    hide an outage.
+    """
+    if not SLACK_WEBHOOK_URL:
+        raise RuntimeError("SLACK_WEBHOOK_URL is not set")
+    response = requests.post(SLACK_WEBHOOK_URL, json={}, timeout=5)
+    if response.status_code != 400:
         response.raise_for_status()
-        
+
+
+class SlackDigest:
+    """Buffers alerts and posts everything received within a window as one message."""
+
+    def __init__(self, window_seconds):
+        self.window_seconds = window_seconds
+        self._alerts = []
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def add(self, alert):
+        with self._lock:
+            self._alerts.append(alert)
+            if self._timer is None:
+                self._timer = threading.Timer(self.window_seconds, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            alerts, self._alerts = self._alerts, []
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = None
+        if not alerts:
+            return True
+        try:
+            if len(alerts) == 1:
+                post_to_slack(render_alert_message(*alerts[0]))
+            else:
+                post_to_slack(build_digest_message(alerts))
+            logging.info(f"Successfully sent Slack digest with {len(alerts)} alerts")
+            return True
+        except Exception as e:
+            logging.error(f"Error sending Slack digest of {len(alerts)} alerts: {str(e)}")
+            return False
+
+
+digest = SlackDigest(SLACK_DIGEST_SECONDS) if SLACK_DIGEST_SECONDS > 0 else None
+
+
+def send_slack_alert(caller_id, time_of_call, sheet_link, campaign_name="Unknown", call_type="Unknown"):
+    if digest is not None:
+        digest.add((caller_id, time_of_call, sheet_link, campaign_name, call_type))
+        return True
+
+    try:
+        post_to_slack(render_alert_message(caller_id, time_of_call, sheet_link, campaign_name, call_type))
+
         logging.info(f"Successfully sent Slack notification for {call_type.lower()} from caller {caller_id}")
         return True
-        
+
     except Exception as e:
         logging.error(f"Error sending Slack notification: {str(e)}")
         return False
@@ -0,0 +1,119 @@
+import json
+import logging
+import re
+from json.encoder import encode_basestring
+
+from config import SLACK_TEMPLATES_FILE
+
+# Fields spliced into a template; anything else in braces is left as written
+FIELDS = ("caller_id", "time", "campaign", "call_type", "sheet_link")
+_PLACEHOLDER = re.compile(r"\{(" + "|".join(FIELDS) + r")\}")
+DEFAULT_KEY = "*"
+
+
+def _alert_template(emoji, call_type_text):
+    return {
+        "blocks": [
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": f"{emoji} *New {call_type_text} Logged*\n\n• *Caller ID:* `{{caller_id}}`\n• *Time:* `{{time}}`\n• *Campaign:* `{{campaign}}`\n• *Type:* {call_type_text}"
+                }
+            },
+            {
+                "type": "actions",
+                "elements": [
+                    {
+                        "type": "button",
+                        "text": {
+                            "type": "plain_text",
+                            "text": "📊 View Google Sheet"
+                        },
+                        "url": "{sheet_link}",
+                        "style": "primary"
+                    }
+                ]
+            }
+        ]
+    }
+
+
+def default_templates():
+    """The original alert layout, with its emoji fixed per known call type."""
+    return {
+        "0819 Call": _alert_template("🎯", "*0819 Call*"),
+        "No Value": _alert_template("📞", "*No Value*"),
+        DEFAULT_KEY: _alert_template("📱", "*{call_type}*"),
+    }
+
+
+def _escape(value):
+    # The JSON string body without its quotes, so it can sit inside a template string
+    return encode_basestring(value if isinstance(value, str) else str(value))[1:-1]
+
+
+class CompiledTemplate:
+    """A Slack message serialized once, split around its placeholders.
+
+    Rendering joins the literal JSON chunks with the JSON-escaped field
+    values, so a caller ID or campaign name containing quotes, backslashes
+    or newlines still yields a valid payload.
+    """
+
+    def __init__(self, message):
+        serialized = json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+        pieces = _PLACEHOLDER.split(serialized)
+        # split() alternates literal text and captured field names
+        self._literals = pieces[0::2]
+        self._fields = pieces[1::2]
+
+    def render(self, values):
+        literals = self._literals
+        parts = [literals[0]]
+        for i, field in enumerate(self._fields):
+            parts.append(_escape(values[field]))
+            parts.append(literals[i + 1])
+        return "".join(parts).encode("utf-8")
+
+
+class SlackTemplates:
+    """Alert templates keyed by call type, compiled at startup.
+
+    ``templates`` maps a call type to a Block Kit message whose strings may
+    contain {caller_id}, {time}, {campaign}, {call_type} and {sheet_link};
+    call types without their own entry use the ``"*"`` template, which
+    defaults to the built-in layout.
+    """
+
+    def __init__(self, templates=None, source=None):
+        merged = default_templates()
+        if templates:
+            merged.update(templates)
+        self.source = source
+        self._compiled = {call_type: CompiledTemplate(message) for call_type, message in merged.items()}
+        self._default = self._compiled[DEFAULT_KEY]
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as f:
+            templates = json.load(f)["templates"]
+        logging.info(f"Loaded Slack templates for {len(templates)} call types from {path}")
+        return cls(templates, source=path)
+
+    def render(self, call_type, caller_id, time_of_call, campaign_name, sheet_link):
+        """Return the JSON payload bytes for one alert."""
+        template = self._compiled.get(call_type, self._default)
+        return template.render({
+            "caller_id": caller_id,
+            "time": time_of_call,
+            "campaign": campaign_name,
+            "call_type": call_type,
+            "sheet_link": sheet_link,
+        })
+
+    def summary(self):
+        return {"source": self.source or "defaults", "call_types": sorted(self._compiled)}
+
+
+templates = SlackTemplates.from_file(SLACK_TEMPLATES_FILE) if SLACK_TEMPLATES_FILE else SlackTemplates()
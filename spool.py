@@ -0,0 +1,287 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: segments are shared between processes through flock, which it lacks
+    fcntl = None
+
+SEGMENT_SUFFIX = ".seg"
+ACK_SUFFIX = ".ack"
+# Whether this platform can run the spool
+SPOOL_SUPPORTED = fcntl is not None
+
+
+class _Segment:
+    """One append-only segment file plus the ack file recording its delivered records."""
+
+    def __init__(self, directory, name, handle):
+        self.name = name
+        self.path = os.path.join(directory, name)
+        self.ack_path = self.path[:-len(SEGMENT_SUFFIX)] + ACK_SUFFIX
+        self.handle = handle
+        self.ack_handle = None
+        self.count = 0
+        self.size = 0
+        self.outstanding = set()
+
+    def write_ack(self, index):
+        if self.ack_handle is None:
+            self.ack_handle = open(self.ack_path, "a")
+        self.ack_handle.write(f"{index}\n")
+        self.ack_handle.flush()
+
+    def close(self):
+        if self.ack_handle is not None:
+            self.ack_handle.close()
+        self.handle.close()
+
+    def remove(self):
+        for path in (self.path, self.ack_path):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        self.close()
+
+
+class CallSpool:
+    """Append-only local spool that keeps every qualifying call until Sheets has it.
+
+    Calls are written as JSON lines to segment files before delivery is
+    attempted. Concurrent appends share one fsync (group commit): the first
+    writer to reach the disk flushes everything written so far and the others
+    find their record already durable. Delivered records are noted in a
+    per-segment ack file, and a segment is deleted once every record in it
+    has been acked and it is no longer being written to.
+
+    Calls whose delivery failed, and every unacked call found on disk at
+    startup, are replayed by a background thread in batches of
+    ``replay_batch`` through ``handler(calls)``, which should write them in
+    bulk and return True/False for the whole batch or a list with one flag
+    per call.
+
+    Each process writes its own segments and holds an exclusive ``flock`` on
+    them, so several gunicorn workers can share one directory; segments left
+    by a process that died are adopted by whichever worker locks them first.
+    Acks are flushed but not fsynced, so a power loss can replay (and
+    duplicate) a few already delivered rows, but never loses one.
+    """
+
+    def __init__(self, directory, handler, segment_max_bytes=4 * 1024 * 1024,
+                 replay_batch=500, retry_seconds=30.0):
+        if not SPOOL_SUPPORTED:
+            raise RuntimeError("The call spool needs fcntl file locks, which this platform lacks")
+        self.directory = directory
+        self.handler = handler
+        self.segment_max_bytes = segment_max_bytes
+        self.replay_batch = replay_batch
+        self.retry_seconds = retry_seconds
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._segments = {}
+        self._current = None
+        self._synced_index = -1
+        self._pending = OrderedDict()
+        self._sequence = 0
+        self.stats = {"appended": 0, "fsyncs": 0, "acked": 0, "replayed": 0,
+                      "replay_batches": 0, "replay_failures": 0, "adopted_segments": 0, "compacted_segments": 0}
+        os.makedirs(directory, exist_ok=True)
+        self._adopt_orphans()
+        self._open_segment()
+
+    def _open_segment(self):
+        # Create under a temporary name and lock before renaming, so other
+        # processes never see an unlocked live segment
+        self._sequence += 1
+        name = f"{time.time_ns()}-{os.getpid()}-{self._sequence:04d}{SEGMENT_SUFFIX}"
+        temp_path = os.path.join(self.directory, name + ".tmp")
+        handle = open(temp_path, "xb")
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        os.rename(temp_path, os.path.join(self.directory, name))
+        segment = _Segment(self.directory, name, handle)
+        self._segments[name] = segment
+        self._current = segment
+        self._synced_index = -1
+
+    def _adopt_orphans(self):
+        """Take over unlocked segments left behind by dead processes and queue their unacked calls."""
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(SEGMENT_SUFFIX) or name in self._segments:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                handle = open(path, "rb+")
+            except FileNotFoundError:
+                continue
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                handle.close()
+                continue
+            try:
+                if os.fstat(handle.fileno()).st_ino != os.stat(path).st_ino:
+                    raise FileNotFoundError(path)
+            except FileNotFoundError:
+                # The owner compacted it between our listing and our lock
+                handle.close()
+                continue
+
+            segment = _Segment(self.directory, name, handle)
+            acked = set()
+            if os.path.exists(segment.ack_path):
+                with open(segment.ack_path) as f:
+                    acked = {int(line) for line in f if line.strip().isdigit()}
+            records = []
+            for line in handle:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn final line from a crash mid-write was never acknowledged to Ringba
+                    logging.warning("Skipping unreadable record in spool segment %s", name)
+                    continue
+                if record["i"] not in acked:
+                    records.append(record)
+            if not records:
+                segment.remove()
+                self.stats["compacted_segments"] += 1
+                continue
+            self._segments[name] = segment
+            for record in records:
+                segment.outstanding.add(record["i"])
+                self._pending[(name, record["i"])] = record["call"]
+            self.stats["adopted_segments"] += 1
+            logging.warning("Adopted spool segment %s with %d undelivered calls", name, len(records))
+
+    def append(self, call):
+        """Durably record ``call`` and return a token for ``ack``/``defer``."""
+        with self._lock:
+            segment = self._current
+            index = segment.count
+            line = json.dumps({"i": index, "call": call}) + "\n"
+            data = line.encode("utf-8")
+            segment.handle.write(data)
+            segment.handle.flush()
+            segment.count += 1
+            segment.size += len(data)
+            segment.outstanding.add(index)
+            self.stats["appended"] += 1
+            rotate = segment.size >= self.segment_max_bytes
+        self._sync(segment, index)
+        if rotate:
+            self._rotate(segment)
+        return segment.name, index
+
+    def _sync(self, segment, index):
+        with self._sync_lock:
+            if segment is not self._current or self._synced_index >= index:
+                # Rotation fsyncs a segment before retiring it
+                return
+            with self._lock:
+                synced_up_to = segment.count - 1
+            os.fsync(segment.handle.fileno())
+            self._synced_index = synced_up_to
+            self.stats["fsyncs"] += 1
+
+    def _rotate(self, segment):
+        with self._sync_lock, self._lock:
+            if segment is not self._current:
+                return
+            os.fsync(segment.handle.fileno())
+            self.stats["fsyncs"] += 1
+            self._open_segment()
+            self._compact(segment)
+
+    def _compact(self, segment):
+        # Caller holds self._lock
+        if segment is self._current or segment.outstanding:
+            return
+        del self._segments[segment.name]
+        segment.remove()
+        self.stats["compacted_segments"] += 1
+
+    def ack(self, token):
+        """Mark a spooled call as written to the sheet."""
+        name, index = token
+        with self._lock:
+            segment = self._segments.get(name)
+            if segment is None or index not in segment.outstanding:
+                return
+            segment.outstanding.discard(index)
+            segment.write_ack(index)
+            self._pending.pop(token, None)
+            self.stats["acked"] += 1
+            self._compact(segment)
+
+    def defer(self, token, call):
+        """Hand a call whose live delivery failed to the replay thread."""
+        with self._lock:
+            self._pending[token] = call
+
+    def replay_once(self):
+        """Deliver up to ``replay_batch`` pending calls in bulk; returns True if all of them were delivered."""
+        with self._lock:
+            batch = []
+            for token, call in self._pending.items():
+                batch.append((token, call))
+                if len(batch) >= self.replay_batch:
+                    break
+        if not batch:
+            return False
+        try:
+            results = self.handler([call for _, call in batch])
+        except Exception as e:
+            logging.exception("Spool replay failed: %s", e)
+            results = False
+        if isinstance(results, bool):
+            results = [results] * len(batch)
+        delivered = [token for (token, _), success in zip(batch, results) if success]
+        for token in delivered:
+            self.ack(token)
+        self.stats["replayed"] += len(delivered)
+        if delivered:
+            self.stats["replay_batches"] += 1
+            logging.info("Replayed %d spooled calls", len(delivered))
+        if len(delivered) < len(batch):
+            self.stats["replay_failures"] += 1
+            logging.warning("Spool replay of %d calls failed; retrying in %ss",
+                            len(batch) - len(delivered), self.retry_seconds)
+            return False
+        return True
+
+    def _run(self):
+        while not self._stopping.is_set():
+            if not self.replay_once():
+                self._stopping.wait(self.retry_seconds)
+                if not self._stopping.is_set():
+                    with self._lock:
+                        self._adopt_orphans()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="call-spool", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        with self._sync_lock, self._lock:
+            for segment in list(self._segments.values()):
+                if not segment.outstanding:
+                    segment.remove()
+                else:
+                    os.fsync(segment.handle.fileno())
+                    segment.close()
+            self._segments.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, pending_replay=len(self._pending), segments=len(self._segments),
+                        outstanding=sum(len(s.outstanding) for s in self._segments.values()))
@@ -0,0 +1,33 @@
+from archiver import SheetArchiver, rows_to_archive
+
+FORMULA_ROW = ["", "", "", "=IF(A2=\"\",\"\",1)", "", ""]
+
+
+def _calls(*dates):
+    return [[f"{date} 10:00:00 EDT", f"caller {index}", "No Value"] for index, date in enumerate(dates)]
+
+
+def test_size_limit_counts_column_a_only():
+    rows = _calls("2025-01-01", "2025-01-02", "2025-01-03") + [FORMULA_ROW] * 7
+    assert rows_to_archive(rows, max_rows=5) == 0
+    assert rows_to_archive(rows, max_rows=2) == 1
+
+
+def test_age_cutoff_stops_before_formula_only_rows():
+    rows = _calls("2025-01-01", "2025-01-02", "2025-01-03") + [FORMULA_ROW] * 7
+    assert rows_to_archive(rows, cutoff_date="2025-02-01") == 3
+
+
+def test_blank_rows_inside_the_prefix_go_with_it():
+    rows = _calls("2025-01-01") + [[]] + _calls("2025-01-03", "2025-03-01")
+    assert rows_to_archive(rows, cutoff_date="2025-02-01") == 3
+
+
+def test_csv_archive_reads_back_what_it_wrote(tmp_path):
+    archiver = SheetArchiver(destination="csv", archive_dir=str(tmp_path), lock_file=str(tmp_path / "lock"))
+    rows = [row + ["", "", ""] for row in _calls("2025-01-01", "2025-01-02", "2025-02-01")]
+    assert archiver._write_csv("sheet", "Sheet1", rows)
+    january = archiver.location("sheet", "Sheet1", rows[0])
+    assert january == archiver.location("sheet", "Sheet1", rows[1]) != archiver.location("sheet", "Sheet1", rows[2])
+    assert list(archiver.read_archived("sheet", january)) == rows[:2]
+    assert list(archiver.read_archived("sheet", str(tmp_path / "missing.csv.gz"))) == []
@@ -0,0 +1,22 @@
+from config import RINGBA_0819_TARGET_ID, RINGBA_FILTERS
+from filter_rules import FilterEngine, compile_rules, default_rules
+
+CAMPAIGN = RINGBA_FILTERS["campaign_name"]
+
+
+def test_default_rules_match_the_original_filter():
+    engine = FilterEngine()
+    assert engine.classify(CAMPAIGN, "", 100) == "No Value"
+    assert engine.classify(CAMPAIGN, None) == "No Value"
+    assert engine.classify(CAMPAIGN, RINGBA_0819_TARGET_ID, 30) == "0819 Call"
+    assert engine.classify(CAMPAIGN, RINGBA_0819_TARGET_ID, 31) is None
+    assert engine.classify(CAMPAIGN, RINGBA_0819_TARGET_ID) is None
+    assert engine.classify(CAMPAIGN, RINGBA_FILTERS["target_name"]) is None
+    assert engine.classify("Other campaign", "") is None
+
+
+def test_target_name_rule_is_opt_in():
+    rules = default_rules(match_target_name=True)
+    index = compile_rules(rules)
+    assert RINGBA_FILTERS["target_name"].strip() in index[CAMPAIGN]
+    assert len(rules) == len(default_rules()) + 1
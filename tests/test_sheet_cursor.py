@@ -0,0 +1,167 @@
+import threading
+
+import pytest
+
+from sheet_cursor import RowCursor, fcntl, rows_lock_file
+
+HEADERS = ["Time of call", "Caller ID", "Call Type", "Agent Name", "Status", "Notes"]
+
+
+class FakeSheet:
+    """Column A of a worksheet, enough for RowCursor."""
+
+    def __init__(self, filled_rows=0):
+        self.column_a = [HEADERS[0]] + [f"call {row}" for row in range(2, filled_rows + 2)]
+
+    def row_values(self, row):
+        return list(HEADERS) if row == 1 else []
+
+    def col_values(self, col):
+        return list(self.column_a)
+
+    def get(self, a1_range):
+        start, end = (int(part[1:]) for part in a1_range.split(":"))
+        return [[self.column_a[row - 1]] if row <= len(self.column_a) else [] for row in range(start, end + 1)]
+
+    def delete_rows(self, start, end):
+        del self.column_a[start - 1:end]
+
+    def clear(self):
+        self.column_a = []
+
+    def append_row(self, values):
+        self.column_a.append(values[0])
+
+    def write(self, row, value):
+        self.column_a.extend([""] * (row - len(self.column_a)))
+        self.column_a[row - 1] = value
+
+
+def test_resync_skips_rows_reserved_by_writes_in_flight():
+    sheet = FakeSheet()
+    cursor = RowCursor(sheet, HEADERS)
+    first = cursor.reserve()
+    # Another thread's write failed before the first one was written
+    cursor.invalidate()
+    second = cursor.reserve()
+    assert (first, second) == (2, 3)
+
+
+def test_resync_interval_skips_rows_reserved_by_writes_in_flight():
+    sheet = FakeSheet(filled_rows=3)
+    cursor = RowCursor(sheet, HEADERS, resync_interval=0)
+    assert [cursor.reserve(2), cursor.reserve(), cursor.reserve()] == [5, 7, 8]
+
+
+def test_rows_are_reused_once_no_write_is_in_flight():
+    sheet = FakeSheet()
+    cursor = RowCursor(sheet, HEADERS)
+    cursor.release(cursor.reserve())
+    # The write failed, so row 2 is still free
+    cursor.invalidate()
+    assert cursor.reserve() == 2
+
+
+def test_invalidate_during_guard_read_then_conflict():
+    sheet = FakeSheet()
+    cursor = RowCursor(sheet, HEADERS)
+    assert cursor.reserve() == 2
+    # Another worker wrote row 3, and a failed write invalidates the cursor mid guard read
+    sheet.write(3, "other")
+    guard_read = sheet.get
+    sheet.get = lambda a1_range: (cursor.invalidate(), guard_read(a1_range))[1]
+    assert cursor.reserve() == 4
+    cursor.release(2)
+    cursor.release(4)
+    assert cursor.snapshot()["conflicts"] == 1
+
+
+def test_failed_conflict_resync_releases_the_reservation():
+    sheet = FakeSheet()
+    cursor = RowCursor(sheet, HEADERS)
+    cursor.release(cursor.reserve())
+    # Another worker took the next row, and the re-sync it triggers fails
+    sheet.write(3, "other")
+
+    def unavailable():
+        raise ConnectionError("Sheets unavailable")
+
+    sheet.col_values = lambda col: unavailable()
+    try:
+        cursor.reserve()
+    except ConnectionError:
+        pass
+    # Nothing is in flight, so exclusive() must not wait
+    with cursor.exclusive():
+        pass
+
+
+def test_failed_header_read_never_clears_the_sheet():
+    from sheets_guard import RateLimitTimeout
+
+    sheet = FakeSheet(filled_rows=5)
+
+    def rate_limited(row):
+        raise RateLimitTimeout("No Sheets request slot")
+
+    sheet.row_values = rate_limited
+    cursor = RowCursor(sheet, HEADERS)
+    try:
+        cursor.reserve()
+    except RateLimitTimeout:
+        pass
+    assert len(sheet.column_a) == 6
+    # Headers are checked again on the next attempt
+    sheet.row_values = lambda row: list(HEADERS)
+    assert cursor.reserve() == 7
+
+
+def test_rows_deleted_by_another_process_trigger_a_resync():
+    sheet = FakeSheet()
+    server, archiver = RowCursor(sheet, HEADERS), RowCursor(sheet, HEADERS)
+    for _ in range(3):
+        row = server.reserve()
+        sheet.write(row, f"call {row}")
+        server.release(row)
+    # The archiver in another process deletes the two oldest rows
+    with archiver.exclusive():
+        sheet.delete_rows(2, 3)
+    row = server.reserve()
+    assert row == 3
+    assert server.snapshot()["gaps"] == 1
+
+
+def test_rows_in_flight_above_are_not_a_gap():
+    sheet = FakeSheet(filled_rows=2)
+    cursor = RowCursor(sheet, HEADERS)
+    first = cursor.reserve()
+    second = cursor.reserve()
+    assert (first, second) == (4, 5)
+    assert cursor.snapshot()["gaps"] == 0
+
+
+@pytest.mark.skipif(fcntl is None, reason="no file locks on this platform")
+def test_exclusive_holds_off_writers_sharing_the_lock_file(tmp_path):
+    sheet = FakeSheet(filled_rows=4)
+    lock_file = rows_lock_file(str(tmp_path), "sheet", "Sheet1")
+    # Separate cursors on one lock file behave like cursors in separate processes
+    server, archiver = RowCursor(sheet, HEADERS, lock_file=lock_file), RowCursor(sheet, HEADERS, lock_file=lock_file)
+    server.release(server.reserve())
+    reserved = []
+    with archiver.exclusive():
+        writer = threading.Thread(target=lambda: reserved.append(server.reserve()))
+        writer.start()
+        writer.join(0.3)
+        assert reserved == []
+        sheet.delete_rows(2, 3)
+    writer.join(5)
+    assert reserved == [4]
+
+
+def test_rebind_keeps_rows_reserved_by_writes_in_flight():
+    sheet = FakeSheet(filled_rows=1)
+    cursor = RowCursor(sheet, HEADERS)
+    first = cursor.reserve()
+    # The cache was invalidated (e.g. after a 404 on another shard) and the tab re-opened
+    cursor.rebind(sheet)
+    assert (first, cursor.reserve()) == (3, 4)
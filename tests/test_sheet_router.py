@@ -0,0 +1,29 @@
+import pytest
+
+from sheet_router import SheetRouter, check_tab_template
+
+
+def test_valid_templates_pass_through():
+    assert check_tab_template("Calls {date}") == "Calls {date}"
+    assert check_tab_template("Sheet1") == "Sheet1"
+
+
+def test_unknown_placeholder_in_default_tab_fails_at_init():
+    with pytest.raises(ValueError, match="Calls {day}"):
+        SheetRouter(default_sheet_id="sheet", default_tab="Calls {day}")
+
+
+def test_unknown_placeholder_in_route_fails_at_init():
+    with pytest.raises(ValueError):
+        SheetRouter([{"campaign": "A", "tab": "{campaign} {week}"}], default_sheet_id="sheet", default_tab="Sheet1")
+
+
+def test_malformed_template_fails_at_init():
+    with pytest.raises(ValueError):
+        SheetRouter(default_sheet_id="sheet", default_tab="Calls {date")
+
+
+def test_route_formats_template():
+    router = SheetRouter([{"campaign": "A", "tab": "{campaign} {month}"}], default_sheet_id="sheet", default_tab="Sheet1")
+    assert router.route("A", "Inbound", "2024-03-05 10:00:00 EST") == ("sheet", "A 2024-03")
+    assert router.route("B", "Inbound", "2024-03-05 10:00:00 EST") == ("sheet", "Sheet1")
@@ -0,0 +1,104 @@
+import os
+
+import pytest
+
+from spool import ACK_SUFFIX, SEGMENT_SUFFIX, SPOOL_SUPPORTED, CallSpool
+
+pytestmark = pytest.mark.skipif(not SPOOL_SUPPORTED, reason="the spool needs fcntl")
+
+
+def _segments(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX))
+
+
+def _call(index):
+    return {"time_of_call": "2024-07-01 10:00:00 EDT", "caller_id": f"caller {index}", "call_type": "No Value"}
+
+
+def test_acked_segment_is_compacted_after_rotation(tmp_path):
+    spool = CallSpool(str(tmp_path), lambda calls: True, segment_max_bytes=1)
+    first = spool.append(_call(0))
+    second = spool.append(_call(1))
+    # Every append fills a one-byte segment, so each call lands in its own file
+    assert first[0] != second[0]
+    assert len(_segments(tmp_path)) == 3
+
+    spool.ack(first)
+    assert first[0] not in _segments(tmp_path)
+    assert not os.path.exists(tmp_path / (first[0][:-len(SEGMENT_SUFFIX)] + ACK_SUFFIX))
+    assert second[0] in _segments(tmp_path)
+    assert spool.snapshot()["compacted_segments"] == 1
+
+    spool.ack(second)
+    spool.ack(second)
+    assert spool.snapshot()["acked"] == 2
+    assert spool.snapshot()["outstanding"] == 0
+    spool.stop()
+    assert _segments(tmp_path) == []
+
+
+def test_current_segment_is_kept_until_stop(tmp_path):
+    spool = CallSpool(str(tmp_path), lambda calls: True)
+    token = spool.append(_call(0))
+    spool.ack(token)
+    # Still open for appends, so acking everything in it must not delete it
+    assert _segments(tmp_path) == [token[0]]
+    spool.stop()
+    assert _segments(tmp_path) == []
+
+
+def test_orphan_segment_is_adopted_and_replayed(tmp_path):
+    crashed = CallSpool(str(tmp_path), lambda calls: True)
+    delivered = crashed.append(_call(0))
+    crashed.append(_call(1))
+    crashed.append(_call(2))
+    crashed.ack(delivered)
+    # Closing with outstanding calls leaves the segment and its ack file behind, unlocked
+    crashed.stop()
+    assert len(_segments(tmp_path)) == 1
+
+    replayed = []
+    spool = CallSpool(str(tmp_path), lambda calls: replayed.extend(calls) or True)
+    snapshot = spool.snapshot()
+    assert snapshot["adopted_segments"] == 1
+    assert snapshot["pending_replay"] == 2
+
+    assert spool.replay_once() is True
+    assert [call["caller_id"] for call in replayed] == ["caller 1", "caller 2"]
+    assert spool.snapshot()["outstanding"] == 0
+    # The adopted segment is compacted once its last call is acked
+    assert len(_segments(tmp_path)) == 1
+    spool.stop()
+    assert os.listdir(tmp_path) == []
+
+
+def test_failed_replay_keeps_calls_pending(tmp_path):
+    results = [False, [True, False], True]
+    batches = []
+
+    def handler(calls):
+        batches.append(len(calls))
+        return results[len(batches) - 1]
+
+    spool = CallSpool(str(tmp_path), handler, retry_seconds=0)
+    tokens = [spool.append(_call(index)) for index in range(2)]
+    for index, token in enumerate(tokens):
+        spool.defer(token, _call(index))
+
+    assert spool.replay_once() is False
+    assert spool.replay_once() is False
+    assert spool.snapshot()["pending_replay"] == 1
+    assert spool.replay_once() is True
+    assert batches == [2, 2, 1]
+    assert spool.snapshot()["replay_failures"] == 2
+    spool.stop()
+
+
+def test_segment_locked_by_a_live_spool_is_not_adopted(tmp_path):
+    owner = CallSpool(str(tmp_path), lambda calls: True)
+    owner.append(_call(0))
+    other = CallSpool(str(tmp_path), lambda calls: True)
+    assert other.snapshot()["adopted_segments"] == 0
+    assert other.snapshot()["pending_replay"] == 0
+    other.stop()
+    owner.stop()
@@ -0,0 +1,25 @@
+import datetime
+
+import timeutil
+from timeutil import normalize_time, parse_timestamp
+
+
+def test_naive_iso_timestamp_uses_naive_zone():
+    moment = parse_timestamp("2024-07-01T10:00:00")
+    assert moment.tzinfo is timeutil.NAIVE_ZONE
+    assert moment.replace(tzinfo=None) == datetime.datetime(2024, 7, 1, 10, 0, 0)
+
+
+def test_naive_fallback_format_uses_naive_zone():
+    moment = parse_timestamp("07/01/2024 10:00 AM")
+    assert moment.tzinfo is timeutil.NAIVE_ZONE
+
+
+def test_explicit_offsets_are_kept():
+    assert parse_timestamp("2024-07-01T14:00:00+00:00").utcoffset() == datetime.timedelta(0)
+    assert parse_timestamp("2024-07-01 10:00:00 AM EDT").utcoffset() == datetime.timedelta(hours=-4)
+
+
+def test_naive_time_in_call_zone_is_not_shifted(monkeypatch):
+    monkeypatch.setattr(timeutil, "NAIVE_ZONE", timeutil.ZONE)
+    assert normalize_time("2024-07-01 10:00:00").startswith("2024-07-01 10:00:00")
@@ -0,0 +1,85 @@
+import datetime
+import re
+from zoneinfo import ZoneInfo
+
+from config import CALL_TIMEZONE, NAIVE_TIMESTAMP_TIMEZONE
+
+# Looked up once; ZoneInfo applies the right EST/EDT offset for each moment
+ZONE = ZoneInfo(CALL_TIMEZONE)
+# Zone for timestamps with no offset or zone name (default: CALL_TIMEZONE)
+NAIVE_ZONE = ZoneInfo(NAIVE_TIMESTAMP_TIMEZONE)
+# The one format times of call are written in: sorts as text within a day and
+# keeps the YYYY-MM-DD prefix the router and archiver read dates from
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S %Z"
+
+_EPOCH = re.compile(r"^\d{9,13}(\.\d+)?$")
+# Zone abbreviations seen on older rows and in exports, as fixed UTC offsets
+_ABBREVIATIONS = {"UTC": 0, "GMT": 0, "Z": 0, "EST": -5, "EDT": -4, "CST": -6, "CDT": -5, "PST": -8, "PDT": -7}
+# Formats tried after ISO 8601, oldest handler output first
+_FALLBACK_FORMATS = (
+    "%Y-%m-%d %I:%M:%S %p",
+    "%Y-%m-%d %H:%M:%S",
+    "%m/%d/%Y %I:%M:%S %p",
+    "%m/%d/%Y %I:%M %p",
+    "%m/%d/%Y %H:%M:%S",
+    "%m/%d/%Y %H:%M",
+)
+
+
+def _from_epoch(value):
+    seconds = float(value)
+    if seconds > 1e11:
+        # Milliseconds
+        seconds /= 1000
+    return datetime.datetime.fromtimestamp(seconds, datetime.UTC)
+
+
+def _parse_fallback(text):
+    tzinfo = NAIVE_ZONE
+    head, _, tail = text.rpartition(" ")
+    if head and tail.upper() in _ABBREVIATIONS:
+        text = head
+        tzinfo = datetime.timezone(datetime.timedelta(hours=_ABBREVIATIONS[tail.upper()]))
+    for pattern in _FALLBACK_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, pattern).replace(tzinfo=tzinfo)
+        except ValueError:
+            continue
+    return None
+
+
+def parse_timestamp(value):
+    """Parse an ISO 8601 string, epoch seconds/milliseconds or a known text format.
+
+    Returns an aware datetime, or None when the value is not recognized.
+    Times without an offset or zone name are taken as NAIVE_TIMESTAMP_TIMEZONE.
+    """
+    if value is None or value == "" or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return _from_epoch(value)
+    text = str(value).strip()
+    if _EPOCH.match(text):
+        return _from_epoch(text)
+    try:
+        moment = datetime.datetime.fromisoformat(text)
+    except ValueError:
+        return _parse_fallback(text)
+    return moment if moment.tzinfo is not None else moment.replace(tzinfo=NAIVE_ZONE)
+
+
+def now_local():
+    return datetime.datetime.now(ZONE)
+
+
+def format_local(moment):
+    """Format an aware datetime as local time in TIME_FORMAT."""
+    return moment.astimezone(ZONE).strftime(TIME_FORMAT)
+
+
+def normalize_time(value):
+    """Convert a timestamp to TIME_FORMAT; unrecognized values are returned unchanged."""
+    moment = parse_timestamp(value)
+    if moment is None:
+        return value
+    return format_local(moment)
@@ -0,0 +1,114 @@
+"""
+Request steps shared by the Flask (app_factory.py) and ASGI (asgi_app.py)
+servers.
+
+admit_call() takes a raw webhook body through parsing, the call filter and
+the idempotency check. Either it answers the request itself (empty body,
+bad JSON, URL verification, filtered call, duplicate), or it hands back an
+AdmittedCall for the server to deliver in its own way. settle_call() then
+records the delivery's answer in the idempotency cache.
+"""
+
+import logging
+
+from call_record import EXPECTED_FORMAT, parse_call, resolve_time_of_call
+from filter_rules import classify_call
+from idempotency import IN_PROGRESS, idempotency_key
+from logging_setup import should_log_body
+from metrics import stage_duration, webhook_requests
+
+
+class AdmittedCall:
+    """A parsed call that passed the filter and still has to be delivered."""
+
+    __slots__ = ("record", "call_type", "time_of_call", "key")
+
+    def __init__(self, record, call_type, time_of_call, key):
+        self.record = record
+        self.call_type = call_type
+        self.time_of_call = time_of_call
+        self.key = key
+
+
+def admit_call(raw_data, idempotency_cache=None, call_store=None):
+    """Return (call, None) for a call to deliver, or (None, (body, status)) to answer right away."""
+    if len(raw_data) == 0:
+        webhook_requests.inc("invalid")
+        logging.warning("Request has no data - empty body. This might be a Ringba configuration issue.")
+        return None, ({
+            "status": "received",
+            "message": "Empty request received - check Ringba webhook configuration",
+            "expected_format": EXPECTED_FORMAT
+        }, 200)
+
+    # Log a sample of raw bodies; the listener thread decodes them
+    if should_log_body():
+        logging.info("Raw data (%d bytes)", len(raw_data), extra={"raw_body": raw_data})
+
+    # Parse the body exactly once, whatever the Content-Type says
+    try:
+        with stage_duration.time("parse"):
+            record = parse_call(raw_data)
+    except UnicodeDecodeError as e:
+        webhook_requests.inc("invalid")
+        logging.error(f"Could not decode raw data: {str(e)}")
+        return None, ({"error": "Invalid request encoding"}, 400)
+    except ValueError as e:
+        webhook_requests.inc("invalid")
+        logging.error("Could not parse JSON: %s", e, extra={"raw_body": raw_data})
+        return None, ({"error": "Invalid JSON data"}, 400)
+
+    if record is None:
+        webhook_requests.inc("invalid")
+        logging.error("No JSON data received")
+        return None, ({"error": "No JSON data received"}, 400)
+
+    # Handle Slack URL verification challenge
+    if record.type == "url_verification" and record.challenge:
+        return None, ({"challenge": record.challenge}, 200)
+
+    logging.debug("Parsed data: %r, endCallSource='%s'", record, record.end_call_source)
+
+    # Check if this call matches our filter and determine its call type
+    with stage_duration.time("filter"):
+        call_type = classify_call(record.campaign_name, record.target_name, record.call_length)
+    if call_type is None:
+        webhook_requests.inc("filtered")
+        if call_store is not None:
+            call_store.record("filtered", record.campaign_name, caller_id=record.caller_id,
+                              target_name=record.target_name, call_id=record.call_id)
+        logging.info("Call filtered out: campaignName=%s, targetName=%s", record.campaign_name, record.target_name,
+                     extra={"outcome": "filtered"})
+        return None, ({"status": "filtered", "message": "Call does not match filter criteria"}, 200)
+
+    logging.info("Processing %s call: callerId=%s, callLength=%ss", call_type, record.caller_id,
+                 record.call_length, extra={"call": record, "call_type": call_type})
+
+    # Process the call - use Ringba's timestamp if available, otherwise use current local time
+    time_of_call = resolve_time_of_call(record)
+
+    # Answer Ringba retries of a call we already handled straight from the cache
+    key = idempotency_key(record) if idempotency_cache is not None else None
+    if key is not None:
+        cached = idempotency_cache.begin(key)
+        if cached is not None:
+            webhook_requests.inc("duplicate")
+        if cached is IN_PROGRESS:
+            logging.info("Duplicate webhook for %s while still processing", key, extra={"outcome": "duplicate"})
+            return None, ({"status": "in_progress", "message": "Call is already being processed"}, 409)
+        if cached is not None:
+            logging.info("Duplicate webhook for %s answered from cache", key, extra={"outcome": "duplicate"})
+            return None, cached
+
+    return AdmittedCall(record, call_type, time_of_call, key), None
+
+
+def settle_call(idempotency_cache, call, body, status):
+    """Remember the answer for Ringba retries, or forget the key if delivery failed (status None)."""
+    if call.key is None:
+        return
+    # Only remember answers Ringba should not retry
+    if status is not None and status < 500:
+        idempotency_cache.complete(call.key, body, status)
+    else:
+        idempotency_cache.discard(call.key)